@@ -16,13 +16,18 @@ synthesis tools.
 
 import os
 import itertools
+import collections
 import tempfile
 import shutil
 import inspect
 import textwrap
 import subprocess
-from chips.compiler.exceptions import C2CHIPError
-from chips.compiler.python_model import StopSim
+import numpy
+from chips.compiler.exceptions import C2CHIPError, Deadlock
+from chips.compiler.python_model import StopSim, print_report, float_bits
+from chips.compiler.verilog_area import shared_floating_point_ports
+from chips.compiler.verilog_area import arbitration_latency
+from chips.compiler.verilog_area import floating_point_units
 from chips_c import bits_to_float, float_to_bits, bits_to_double, double_to_bits, join_words, high_word, low_word
 import chips.compiler.compiler
 
@@ -221,6 +226,73 @@ class Chip:
         while len(response) < 1000:
             mychip.simulation_step()
 
+    By default, the simulation executes one instruction in each clock cycle.
+    The generated hardware takes longer to execute some instructions, for
+    example divides, loads, taken branches and floating point operations. If
+    a component is given the `cycle_accurate` option, each instruction takes
+    the same number of clock cycles as it does in the generated Verilog, so
+    that `time`, and the values returned by `timer_low`, match the hardware.
+    Together with the `speed` option, the timing of the speed optimised
+    design is modelled, including instructions which share a clock cycle. The
+    time taken by floating point operations depends on the data, a typical
+    figure is used.
+
+    .. code-block:: python
+
+        Component("my_component.c", options=["cycle_accurate"])
+
+    A taken branch normally costs two extra clock cycles while the pipeline
+    refills. With the `branch_prediction` option, gotos, calls and branches
+    back to an earlier instruction, such as the end of a loop, are followed
+    as soon as they are fetched, and only branches which go the other way
+    cost extra clock cycles.
+
+    .. code-block:: python
+
+        Component("my_component.c", options=["branch_prediction"])
+
+    The integer multiplier and dividers are selected with the `multiplier`
+    (partial or dsp), `divider` (radix2, radix4 or radix16) and
+    `long_multiplier` (macro or native) options, see c2verilog. A cycle
+    accurate simulation takes the same number of clock cycles as the chosen
+    implementation.
+
+    .. code-block:: python
+
+        Component("my_component.c", options=["multiplier=dsp", "divider=radix4"])
+
+    When Verilog is generated, a component is implemented as a small processor
+    which executes the program from an instruction ROM. With the `speed`
+    option, the program is translated into a state machine instead, which
+    takes fewer clock cycles but more logic. The ports are the same, so
+    components using either implementation can be mixed in a chip.
+
+    .. code-block:: python
+
+        Component("my_component.c", options=["speed"])
+
+    For large programs, the `readmemh` option writes the contents of the
+    instruction ROM and the data memory to `.hex` files, loaded using
+    `$readmemh`, rather than into the Verilog itself. The `listing` option
+    writes the instructions, with their source lines, to a `.lst` file.
+
+    .. code-block:: python
+
+        Component("my_component.c", options=["readmemh", "listing"])
+
+    To find the bottleneck in a pipeline, create the chip with
+    `statistics=True`. The simulation then counts, for each wire, the cycles
+    in which data was transferred and in which one end waited for the other,
+    and for each instance, the cycles spent running and blocked. Statistics
+    are off by default, because they slow the simulation down.
+
+    .. code-block:: python
+
+        mychip = Chip("my_chip", statistics=True)
+        ...
+        mychip.simulation_run()
+        mychip.report_statistics()
+
     Code Generation
     ---------------
 
@@ -233,6 +305,21 @@ class Chip:
 
         mychip.generate_verilog()
 
+    Each component normally has its own floating point cores. When many
+    components make occasional use of floating point, area can be saved by
+    creating the chip with `shared_fpu=True`. The chip then contains one of
+    each core, granted to the components in turn. In a cycle accurate
+    simulation, the time spent waiting for a core is modelled, and
+    `report_pool_statistics` shows how busy each core was.
+
+    .. code-block:: python
+
+        mychip = Chip("my_chip", shared_fpu=True)
+        ...
+        mychip.simulation_run()
+        mychip.report_pool_statistics()
+        mychip.generate_verilog()
+
     You can also generate a matching testbench using the `generate_testbench`
     method. You can also specify the simulation run time in clock cycles.
 
@@ -255,7 +342,8 @@ class Chip:
 
     """
 
-    def __init__(self, name):
+    def __init__(self, name, behavioural_models=True, statistics=False,
+                 shared_fpu=False):
         """
 
         Synopsis:
@@ -263,7 +351,8 @@ class Chip:
             .. code-block:: python
 
                from chips.api.api import Chip
-               Chip(name)
+               Chip(name, behavioural_models=True, statistics=False,
+                    shared_fpu=False)
 
         Description:
 
@@ -273,6 +362,17 @@ class Chip:
 
           name: The name of the chip
 
+          behavioural_models: (optional) When true, components which have a
+          Python model use it in simulation, otherwise the C code is
+          simulated
+
+          statistics: (optional) When true, the simulation counts the
+          handshakes on each wire, and the cycles each instance spends
+          running and blocked, see `get_statistics`
+
+          shared_fpu: (optional) When true, the components share one of each
+          floating point core, see `generate_verilog`
+
         Returns:
 
             A `Chip` instance.
@@ -280,6 +380,11 @@ class Chip:
         """
 
         self.name = name
+        self.behavioural_models = behavioural_models
+        self.statistics = statistics
+        self.shared_fpu = shared_fpu
+        self.pool = None
+        self.report_sink = print_report
         self.instances = []
         self.wires = []
         self.inputs = {}
@@ -288,22 +393,37 @@ class Chip:
         self.sn = 0
         _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
 
-    def generate_verilog(self):
+    def generate_verilog(self, shared_fpu=None):
         """
 
         Synopsis:
 
             .. code-block:: python
 
-               chip.generate_verilog(name)
+               chip.generate_verilog(shared_fpu=None)
 
         Description:
 
             Generate synthesisable Verilog output.
 
+            Normally, each component has its own floating point adder,
+            multiplier, divider and conversion cores. When shared_fpu is
+            true, the chip has a pool containing one of each core, and a
+            round robin arbiter grants each core to one component at a time.
+            A component holds a core from the moment it presents the
+            operands, until it has accepted the result. This saves area when
+            many components make occasional use of floating point, at the
+            cost of `arbitration_latency` extra clock cycles for each
+            operation, and a wait when the core is in use.
+
+            The cycle accurate simulation of a `Chip` created with
+            shared_fpu=True also models the pool, see `get_pool_statistics`.
+
         Arguments:
 
-            None
+            shared_fpu: (optional) When true, the components share a pool of
+            floating point cores. Defaults to the shared_fpu argument of the
+            `Chip`.
 
         Returns:
 
@@ -311,8 +431,19 @@ class Chip:
 
         """
 
+        if shared_fpu is None:
+            shared_fpu = self.shared_fpu
+
+        shared_units = {}
         for component in self.components.values():
-            component.generate_verilog()
+            shared_units[component.component_name] = (
+                component.generate_verilog(shared_fpu))
+
+        # the components using each floating point core
+        pools = {}
+        for instance in self.instances:
+            for unit in shared_units[instance.component_name]:
+                pools.setdefault(unit, []).append(id(instance))
 
         for i in self.wires:
             if i.source is None:
@@ -347,17 +478,22 @@ class Chip:
         output_file.write("  input  rst;\n")
         output_file.write("  output  exception;\n")
         for i in self.inputs.values():
-            output_file.write("  input  [31:0] %s;\n" % i.name)
+            output_file.write("  input  [%u:0] %s;\n" % (i.width - 1, i.name))
             output_file.write("  input  %s_stb;\n" % i.name)
             output_file.write("  output %s_ack;\n" % i.name)
         for i in self.outputs.values():
-            output_file.write("  output [31:0] %s;\n" % i.name)
+            output_file.write("  output [%u:0] %s;\n" % (i.width - 1, i.name))
             output_file.write("  output %s_stb;\n" % i.name)
             output_file.write("  input  %s_ack;\n" % i.name)
         for i in self.wires:
-            output_file.write("  wire   [31:0] %s;\n" % i.name)
+            output_file.write("  wire   [%u:0] %s;\n" % (i.width - 1, i.name))
             output_file.write("  wire   %s_stb;\n" % i.name)
             output_file.write("  wire   %s_ack;\n" % i.name)
+        for i in self.wires:
+            if i.depth:
+                _generate_fifo(output_file, i)
+        for unit, clients in sorted(pools.items()):
+            _generate_pool(output_file, unit, clients)
         for instance in self.instances:
             output_file.write("  wire   exception_%s;\n" % (id(instance)))
         for instance in self.instances:
@@ -373,9 +509,17 @@ class Chip:
                 ports.append(".input_%s_stb(%s_stb)" % (name, i.name))
                 ports.append(".input_%s_ack(%s_ack)" % (name, i.name))
             for name, i in instance.outputs.iteritems():
-                ports.append(".output_%s(%s)" % (name, i.name))
-                ports.append(".output_%s_stb(%s_stb)" % (name, i.name))
-                ports.append(".output_%s_ack(%s_ack)" % (name, i.name))
+                source = i.name
+                if isinstance(i, Wire) and i.depth:
+                    source = i.name + "_in"
+                ports.append(".output_%s(%s)" % (name, source))
+                ports.append(".output_%s_stb(%s_stb)" % (name, source))
+                ports.append(".output_%s_ack(%s_ack)" % (name, source))
+            for unit in shared_units[instance.component_name]:
+                inports, outports = shared_floating_point_ports([unit])
+                for port, size in inports + outports:
+                    ports.append(".%s(%s)" % (
+                        port, _pool_client(port, unit, id(instance))))
             output_file.write(",\n    ".join(ports))
             output_file.write(");\n")
         output_file.write("  assign exception = %s;\n" % (
@@ -413,11 +557,11 @@ class Chip:
         output_file.write("  reg  clk;\n")
         output_file.write("  reg  rst;\n")
         for i in self.inputs.values():
-            output_file.write("  wire  [31:0] %s;\n" % i.name)
+            output_file.write("  wire  [%u:0] %s;\n" % (i.width - 1, i.name))
             output_file.write("  wire  %s_stb;\n" % i.name)
             output_file.write("  wire  %s_ack;\n" % i.name)
         for i in self.outputs.values():
-            output_file.write("  wire  [31:0] %s;\n" % i.name)
+            output_file.write("  wire  [%u:0] %s;\n" % (i.width - 1, i.name))
             output_file.write("  wire  %s_stb;\n" % i.name)
             output_file.write("  wire  %s_ack;\n" % i.name)
 
@@ -515,8 +659,16 @@ class Chip:
         """
 
         self.time = 0
+        self.blocked_time = 0
+        self.suspended = False
+        self.pool = None
+        if self.shared_fpu:
+            self.pool = _FloatingPointPool()
 
         for instance in self.instances:
+            instance.model.name = _instance_name(instance)
+            instance.model.report_sink = self.report_sink
+            instance.model.pool = self.pool
             instance.model.simulation_reset()
 
         for wire in self.wires:
@@ -534,7 +686,74 @@ class Chip:
             output.ack = False
             output.simulation_reset()
 
-    def simulation_step(self):
+        if self.statistics:
+            self.reset_statistics()
+
+    def reset_statistics(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
+
+        for instance in self.instances:
+            instance.statistics = dict.fromkeys(
+                ["running", "read", "write", "wait", "finished"], 0)
+
+        # a buffered wire has a handshake at each end of the FIFO
+        self.ports = []
+        for wire in self.wires:
+            self.ports.append(wire)
+            if wire.depth:
+                self.ports.append(wire.source_port)
+        self.ports.extend(self.inputs.values())
+        self.ports.extend(self.outputs.values())
+        for port in self.ports:
+            port.statistics = dict.fromkeys(
+                ["transfers", "stb_no_ack", "ack_no_stb", "idle"], 0)
+
+    def set_report_sink(self, sink):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               chip.set_report_sink(sink)
+
+        Description:
+
+            Choose what happens to the values reported by components using
+            the `report` built-in function. By
+            default, each report is printed to the console, which can limit
+            the speed of a simulation with many reports.
+
+            The sink is called with the time, the instance name, the file and
+            line of the report, the type reported and the value. Pass a
+            `ReportBuffer` to collect the reports, or None to ignore them.
+
+            .. code-block:: python
+
+                reports = ReportBuffer()
+                mychip.set_report_sink(reports)
+                mychip.simulation_reset()
+                mychip.simulation_run()
+                print reports.value
+
+            The sink is used from the next `simulation_reset`.
+
+        Arguments:
+
+          sink: A function, or None
+
+        Returns:
+
+            None
+
+        """
+
+        self.report_sink = sink
+
+    def simulation_step(self, detect_deadlock=False):
         """
 
         Synopsis:
@@ -547,9 +766,14 @@ class Chip:
 
             Run the simulation for one cycle.
 
+            If every process is waiting to transfer data, and none of them
+            can, the processes are left waiting, unless `detect_deadlock` is
+            True, when a `Deadlock` exception is raised.
+
         Arguments:
 
-            None
+          detect_deadlock: (optional) raise a `Deadlock` exception if no
+          process can continue
 
         Returns:
 
@@ -558,27 +782,132 @@ class Chip:
         """
 
         AllDone = True
+        AllBlocked = True
         for instance in self.instances:
             try:
                 instance.model.simulation_step()
                 AllDone = False
+                AllBlocked = AllBlocked and instance.model.blocked
+                if self.statistics:
+                    instance.statistics[instance.model.activity()] += 1
             except StopSim:
-                pass
+                if self.statistics:
+                    instance.statistics["finished"] += 1
 
         if AllDone:
+            self.simulation_stop()
             raise StopSim
 
+        # When an input has reached the end of its data, stop once every
+        # process has finished, or has been waiting to transfer data for long
+        # enough to complete a handshake.
+        if AllBlocked and any(i.exhausted for i in self.inputs.values()) and (
+                not self.waiting_for_host()):
+            self.blocked_time += 1
+            if self.blocked_time > 2:
+                self.simulation_stop()
+                raise StopSim
+
+        # Otherwise, if no data moves while every process is waiting to
+        # transfer data, none of them can ever continue, unless a QueueInput
+        # or QueueOutput is waiting for the program running the simulation.
+        elif AllBlocked and not self.transferring():
+            self.blocked_time += 1
+            if self.blocked_time > 2:
+                if self.waiting_for_host():
+                    self.blocked_time = 0
+                    self.suspended = True
+                elif detect_deadlock:
+                    self.simulation_stop()
+                    raise Deadlock(self.time, self.get_blocked())
+        else:
+            self.blocked_time = 0
+
         for input_ in self.inputs.values():
             input_.simulation_step()
 
         for output in self.outputs.values():
             output.simulation_step()
 
+        if self.statistics:
+            for port in self.ports:
+                if port.src_rdy and port.dst_rdy:
+                    port.statistics["transfers"] += 1
+                elif port.src_rdy:
+                    port.statistics["stb_no_ack"] += 1
+                elif port.dst_rdy:
+                    port.statistics["ack_no_stb"] += 1
+                else:
+                    port.statistics["idle"] += 1
+
         for i in self.inputs.values() + self.outputs.values() + self.wires:
             i.simulation_update()
 
         self.time += 1
 
+    def simulation_stop(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Let the outputs finish writing their data when the simulation stops.
+        """
+
+        for output in self.outputs.values():
+            output.simulation_stop()
+
+    def transferring(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        True if data is transferred by any wire, input or output this cycle.
+        """
+
+        for port in self.inputs.values() + self.outputs.values() + self.wires:
+            if port.src_rdy and port.dst_rdy:
+                return True
+            if getattr(port, "depth", 0) and port.source_port.src_rdy and (
+                    port.source_port.dst_rdy):
+                return True
+        return False
+
+    def waiting_for_host(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        True if a QueueInput is empty, or a QueueOutput is full.
+        """
+
+        for input_ in self.inputs.values():
+            if getattr(input_, "starved", False):
+                return True
+        for output in self.outputs.values():
+            if getattr(output, "full", False):
+                return True
+        return False
+
+    def get_blocked(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Describe each blocked instance, and the wire it is waiting for.
+        """
+
+        blocked = []
+        for instance in self.instances:
+            port = instance.model.get_blocked_port()
+            if port is None:
+                continue
+            wire = getattr(port, "wire", port)
+            description = "%s %s (%s), created at line %s in file %s" % (
+                {"read": "reading from", "write": "writing to"}[
+                    instance.model.activity()],
+                _port_name(port),
+                _port_connects(port),
+                wire.lineno,
+                wire.filename)
+            blocked.append((
+                _instance_name(instance),
+                instance.model.get_file(),
+                instance.model.get_line(),
+                description))
+        return blocked
+
     def simulation_run(self):
         """
 
@@ -590,7 +919,14 @@ class Chip:
 
         Description:
 
-            Run the simulation until all processes terminate.
+            Run the simulation until all processes terminate, or until an
+            input reaches the end of its data and every process is waiting
+            to transfer data.
+
+            If every process is waiting to transfer data, and none of them
+            can, a `Deadlock` exception is raised. The exception describes
+            the line each process is blocked at, and the wire it is waiting
+            for.
 
         Arguments:
 
@@ -605,130 +941,130 @@ class Chip:
         # if all instances have reached the end of execution then stop
         try:
             while True:
-                self.simulation_step()
+                self.simulation_step(detect_deadlock=True)
         except StopSim:
             return
 
-    def cosim(self):
+    def simulation_batches(self, cycles=1000):
         """
 
         Synopsis:
 
             .. code-block:: python
 
-               chip.generate_testbench(stop_clocks=None)
+               for batch in chip.simulation_batches(cycles=1000):
+                   ...
 
         Description:
 
-            Generate a Verilog testbench.
+            Run the simulation in batches of clock cycles, returning control
+            to the caller after each batch. This allows the simulation to
+            share a thread with other work, for example an event loop which
+            feeds a `QueueInput`, and drains a `QueueOutput`.
+
+            A batch ends early if every process is waiting for an empty
+            `QueueInput` or a full `QueueOutput`, so the caller should put
+            more data in, or take data out, before the next batch. Each
+            clock cycle is simulated exactly as by `simulation_step`, and a
+            `Deadlock` exception is raised if no process can continue.
+
+            .. code-block:: python
+
+                for batch in mychip.simulation_batches(1000):
+                    while len(results):
+                        send(results.get())
+                    samples.extend(receive())
+
+            The iteration ends when the simulation stops.
 
         Arguments:
 
-            stop_clocks: The number of clock cycles for the simulation to run.
+          cycles: (optional) The largest number of clock cycles in each batch
 
         Returns:
 
-            None
+            An iterator giving the number of clock cycles run in each batch.
 
         """
 
-        output_file = open(self.name + "_wrap.v", "w")
-        output_file.write("module %s_wrap;\n" % self.name)
-        output_file.write("  integer file_count;\n")
-        output_file.write("  integer control_out;\n")
-        output_file.write("  integer control_in;\n")
-        output_file.write("  reg  clk;\n")
-        output_file.write("  reg  rst;\n")
-        for i in self.inputs.values():
-            output_file.write("  reg  [31:0] %s;\n" % i.name)
-            output_file.write("  reg  %s_stb;\n" % i.name)
-            output_file.write("  wire %s_ack;\n" % i.name)
-        for i in self.outputs.values():
-            output_file.write("  wire [31:0] %s;\n" % i.name)
-            output_file.write("  wire %s_stb;\n" % i.name)
-            output_file.write("  reg  %s_ack;\n" % i.name)
-
-        output_file.write("  \n  initial\n")
-        output_file.write("  begin\n")
-        output_file.write("    control_out = $fopenw(\"control_out\");\n")
-        output_file.write("    control_in = $fopenr(\"control_in\");\n")
-        output_file.write("    rst <= 1'b1;\n")
-        output_file.write("    #50 rst <= 1'b0;\n")
-        output_file.write("  end\n\n")
+        while True:
+            start = self.time
+            try:
+                self.suspended = False
+                while self.time - start < cycles and not self.suspended:
+                    self.simulation_step(detect_deadlock=True)
+            except StopSim:
+                if self.time > start:
+                    yield self.time - start
+                return
+            yield self.time - start
 
-        output_file.write("  \n  initial\n")
-        output_file.write("  begin\n")
-        output_file.write("    clk <= 1'b0;\n")
-        output_file.write("    while (1) begin\n")
-        output_file.write("      #5 clk <= ~clk;\n")
-        output_file.write("    end\n")
-        output_file.write("  end\n\n")
+    def report_fifos(self):
+        """
 
-        output_file.write("  \n  always @ (posedge clk)\n")
-        output_file.write("  begin\n")
-        output_file.write("    if (!rst) begin\n")
+        Synopsis:
 
-        for i in self.inputs.values():
-            output_file.write("      file_count = $fscanf(control_in, \"%%x\", %s);\n"%i.name)
-            output_file.write("      file_count = $fscanf(control_in, \"%%x\", %s_stb);\n"%i.name)
+            .. code-block:: python
 
-        for i in self.outputs.values():
-            output_file.write("      file_count = $fscanf(control_in, \"%%x\", %s_ack);\n"%i.name)
+               chip.report_fifos()
 
-        for i in self.inputs.values():
-            output_file.write("      $fwrite(control_out, \"%%x\\n\", %s_ack);\n"%i.name)
+        Description:
 
-        for i in self.outputs.values():
-            output_file.write("      $fwrite(control_out, \"%%x\\n\", %s_stb);\n"%i.name)
-            output_file.write("      $fwrite(control_out, \"%%x\\n\", %s);\n"%i.name)
+            Print the largest number of items held by each buffered `Wire`
+            during the simulation. A FIFO which became full may have stalled
+            its source.
 
-        output_file.write("    end\n")
+        Arguments:
 
-        output_file.write("  end\n\n")
+            None
 
+        Returns:
 
-        output_file.write("  %s uut(\n    " % (self.name))
-        ports = []
-        ports.append(".clk(clk)")
-        ports.append(".rst(rst)")
-        for i in self.inputs.values():
-            ports.append(".%s(%s)" % (i.name, i.name))
-            ports.append(".%s_stb(%s_stb)" % (i.name, i.name))
-            ports.append(".%s_ack(%s_ack)" % (i.name, i.name))
-        for i in self.outputs.values():
-            ports.append(".%s(%s)" % (i.name, i.name))
-            ports.append(".%s_stb(%s_stb)" % (i.name, i.name))
-            ports.append(".%s_ack(%s_ack)" % (i.name, i.name))
-        output_file.write(",\n    ".join(ports))
-        output_file.write(");\n")
-        output_file.write("endmodule\n")
-        output_file.close()
+            None
 
-        #Compile files using iverilog        
-        files = ["%s.v" % i.component_name for i in self.instances]
-        files.append(self.name + ".v")
-        files.append(self.name + "_wrap.v")
-        files.append("chips_lib.v")
-        files = " ".join(files)
-        os.system("iverilog -o %s %s" % (self.name + "_wrap", files))
+        """
 
-        self.cosim = subprocess.Popen(["vvp", "./%s_wrap"%self.name])
-        self.control_in = open("control_in", 'w')
-        self.control_out = open("control_out")
-        
+        print "FIFO Usage"
+        print "=========="
+        print
+        print "%-30s %8s %10s %s" % ("wire", "depth", "high water", "notes")
+        for wire in self.wires:
+            if not wire.depth:
+                continue
+            notes = ["created at line %s in %s" % (wire.lineno, wire.filename)]
+            if wire.high_water == wire.depth:
+                notes.append("became full")
+            print "%-30s %8u %10u %s" % (
+                wire.name,
+                wire.depth,
+                wire.high_water,
+                ", ".join(notes))
+        print
 
-    def cosim_step(self):
+    def get_statistics(self):
         """
 
         Synopsis:
 
             .. code-block:: python
 
-               chip.cosim_step()
+               chip.get_statistics()
 
         Description:
 
-            Run cosim for one cycle.
+            Get the statistics collected during the simulation of a `Chip`
+            created with `statistics=True`.
+
+            For each wire, input and output, the number of cycles in which a
+            word was transferred, the source was waiting for the sink
+            (stb_no_ack), the sink was waiting for the source (ack_no_stb)
+            and neither end was ready. A buffered wire has a second entry,
+            with the suffix "_in", for the source end of the FIFO.
+
+            For each instance, the number of cycles spent running, blocked on
+            a read or a write, in wait_clocks, and finished. An instance
+            which is often blocked on a write has a slow sink, an instance
+            which is rarely blocked is likely to be the bottleneck.
 
         Arguments:
 
@@ -736,61 +1072,617 @@ class Chip:
 
         Returns:
 
-            None
+            A dictionary with the keys "time", "ports" and "instances". The
+            ports and instances are dictionaries of counts, keyed by wire
+            name and by instance name.
 
         """
 
-        for i in self.inputs.values():
-            self.control_in.write(hex(i.q)[2:] + "\n")
-            self.control_in.flush()
-            print "a"
-            self.control_in.write(str(int(i.src_rdy)) + "\n")
-            self.control_in.flush()
-            print "b"
+        if not self.statistics:
+            raise C2CHIPError(
+                "%s was not created with statistics=True" % self.name,
+                self.filename,
+                self.lineno)
 
-        for i in self.outputs.values():
-            self.control_in.write(str(int(i.dst_rdy)) + "\n")
-            self.control_in.flush()
-            print "c"
+        ports = {}
+        for port in self.ports:
+            ports[_port_name(port)] = dict(port.statistics)
 
-        for i in self.inputs.values():
-            i.dst_rdy = self.control_out.readline()
-            print "d"
+        instances = {}
+        for instance in self.instances:
+            instances[_instance_name(instance)] = dict(instance.statistics)
 
-        for i in self.outputs.values():
-            i.src_rdy = bool(self.control_out.readline())
-            print "e"
-            try:
-                i.q = int(self.control_out.readline(), 16)
-                print i.q
-            except ValueError:
-                i.q = 0
-                print "uninitialised"
+        return {"time": self.time, "ports": ports, "instances": instances}
 
-        for i in self.inputs.values() + self.outputs.values():
-            i.simulation_step()
-        for i in self.inputs.values() + self.outputs.values():
-            i.simulation_update()
+    def statistics_table(self):
+        """
 
-        self.time += 1
+        Synopsis:
 
+            .. code-block:: python
 
-class Component:
+               chip.statistics_table()
 
-    """
+        Description:
 
-    Component
-    ---------
+            Format the statistics returned by `get_statistics` as a table.
 
-    The Component class defines a new type of component.
+        Arguments:
 
-    Components are written in C. You can supply the C code as a file name, or
-    directly as a string:
+            None
 
-    .. code-block:: python
+        Returns:
 
-        #Call an external C file
-        my_component = Component(C_file="adder.c")
+            A string.
+
+        """
+
+        statistics = self.get_statistics()
+        time = max(statistics["time"], 1)
+
+        lines = []
+        lines.append("%-30s %10s %10s %10s %10s %s" % (
+            "wire", "transfers", "stb no ack", "ack no stb", "idle",
+            "connects"))
+        for port in self.ports:
+            counts = port.statistics
+            lines.append("%-30s %10u %10u %10u %10u %s" % (
+                _port_name(port),
+                counts["transfers"],
+                counts["stb_no_ack"],
+                counts["ack_no_stb"],
+                counts["idle"],
+                _port_connects(port)))
+        lines.append("")
+
+        lines.append("%-30s %10s %10s %10s %10s %10s" % (
+            "instance", "running", "read", "write", "wait", "finished"))
+        for instance in self.instances:
+            counts = instance.statistics
+            lines.append("%-30s %9.1f%% %9.1f%% %9.1f%% %9.1f%% %9.1f%%" % (
+                (_instance_name(instance),) + tuple(
+                    100.0 * counts[i] / time for i in
+                    ["running", "read", "write", "wait", "finished"])))
+
+        return "\n".join(lines)
+
+    def report_statistics(self):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               chip.report_statistics()
+
+        Description:
+
+            Print the statistics returned by `get_statistics` as a table.
+
+        Arguments:
+
+            None
+
+        Returns:
+
+            None
+
+        """
+
+        print "Statistics after %u cycles" % self.time
+        print "=========================="
+        print
+        print self.statistics_table()
+        print
+
+    def get_pool_statistics(self):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               chip.get_pool_statistics()
+
+        Description:
+
+            Get the use of the shared floating point cores during the cycle
+            accurate simulation of a `Chip` created with shared_fpu=True.
+
+            For each core, the number of operations, the number of cycles it
+            was in use, the number of cycles components spent waiting for
+            another component to finish with it, and the fraction of the
+            simulation for which it was in use. A core with a high
+            utilisation, or a long wait, may be worth duplicating.
+
+            Components must be compiled with the cycle_accurate option for
+            their use of the pool to be simulated.
+
+        Arguments:
+
+            None
+
+        Returns:
+
+            A dictionary of counts keyed by core name.
+
+        """
+
+        if not self.shared_fpu:
+            raise C2CHIPError(
+                "%s was not created with shared_fpu=True" % self.name,
+                self.filename,
+                self.lineno)
+
+        time = max(self.time, 1)
+        pool = {}
+        if self.pool is not None:
+            for unit, counts in self.pool.statistics.iteritems():
+                pool[unit] = dict(counts)
+                pool[unit]["utilisation"] = min(
+                    1.0, float(counts["busy"]) / time)
+        return pool
+
+    def report_pool_statistics(self):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               chip.report_pool_statistics()
+
+        Description:
+
+            Print the statistics returned by `get_pool_statistics` as a
+            table.
+
+        Arguments:
+
+            None
+
+        Returns:
+
+            None
+
+        """
+
+        pool = self.get_pool_statistics()
+        print "Floating Point Pool after %u cycles" % self.time
+        print "==================================="
+        print
+        print "%-20s %10s %10s %10s %11s" % (
+            "core", "operations", "busy", "waiting", "utilisation")
+        for unit, counts in sorted(pool.items()):
+            print "%-20s %10u %10u %10u %10.1f%%" % (
+                unit,
+                counts["operations"],
+                counts["busy"],
+                counts["waiting"],
+                100.0 * counts["utilisation"])
+        print
+
+    def cosim(self):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               chip.generate_testbench(stop_clocks=None)
+
+        Description:
+
+            Generate a Verilog testbench.
+
+        Arguments:
+
+            stop_clocks: The number of clock cycles for the simulation to run.
+
+        Returns:
+
+            None
+
+        """
+
+        output_file = open(self.name + "_wrap.v", "w")
+        output_file.write("module %s_wrap;\n" % self.name)
+        output_file.write("  integer file_count;\n")
+        output_file.write("  integer control_out;\n")
+        output_file.write("  integer control_in;\n")
+        output_file.write("  reg  clk;\n")
+        output_file.write("  reg  rst;\n")
+        for i in self.inputs.values():
+            output_file.write("  reg  [31:0] %s;\n" % i.name)
+            output_file.write("  reg  %s_stb;\n" % i.name)
+            output_file.write("  wire %s_ack;\n" % i.name)
+        for i in self.outputs.values():
+            output_file.write("  wire [31:0] %s;\n" % i.name)
+            output_file.write("  wire %s_stb;\n" % i.name)
+            output_file.write("  reg  %s_ack;\n" % i.name)
+
+        output_file.write("  \n  initial\n")
+        output_file.write("  begin\n")
+        output_file.write("    control_out = $fopenw(\"control_out\");\n")
+        output_file.write("    control_in = $fopenr(\"control_in\");\n")
+        output_file.write("    rst <= 1'b1;\n")
+        output_file.write("    #50 rst <= 1'b0;\n")
+        output_file.write("  end\n\n")
+
+        output_file.write("  \n  initial\n")
+        output_file.write("  begin\n")
+        output_file.write("    clk <= 1'b0;\n")
+        output_file.write("    while (1) begin\n")
+        output_file.write("      #5 clk <= ~clk;\n")
+        output_file.write("    end\n")
+        output_file.write("  end\n\n")
+
+        output_file.write("  \n  always @ (posedge clk)\n")
+        output_file.write("  begin\n")
+        output_file.write("    if (!rst) begin\n")
+
+        for i in self.inputs.values():
+            output_file.write("      file_count = $fscanf(control_in, \"%%x\", %s);\n"%i.name)
+            output_file.write("      file_count = $fscanf(control_in, \"%%x\", %s_stb);\n"%i.name)
+
+        for i in self.outputs.values():
+            output_file.write("      file_count = $fscanf(control_in, \"%%x\", %s_ack);\n"%i.name)
+
+        for i in self.inputs.values():
+            output_file.write("      $fwrite(control_out, \"%%x\\n\", %s_ack);\n"%i.name)
+
+        for i in self.outputs.values():
+            output_file.write("      $fwrite(control_out, \"%%x\\n\", %s_stb);\n"%i.name)
+            output_file.write("      $fwrite(control_out, \"%%x\\n\", %s);\n"%i.name)
+
+        output_file.write("    end\n")
+
+        output_file.write("  end\n\n")
+
+
+        output_file.write("  %s uut(\n    " % (self.name))
+        ports = []
+        ports.append(".clk(clk)")
+        ports.append(".rst(rst)")
+        for i in self.inputs.values():
+            ports.append(".%s(%s)" % (i.name, i.name))
+            ports.append(".%s_stb(%s_stb)" % (i.name, i.name))
+            ports.append(".%s_ack(%s_ack)" % (i.name, i.name))
+        for i in self.outputs.values():
+            ports.append(".%s(%s)" % (i.name, i.name))
+            ports.append(".%s_stb(%s_stb)" % (i.name, i.name))
+            ports.append(".%s_ack(%s_ack)" % (i.name, i.name))
+        output_file.write(",\n    ".join(ports))
+        output_file.write(");\n")
+        output_file.write("endmodule\n")
+        output_file.close()
+
+        #Compile files using iverilog        
+        files = ["%s.v" % i.component_name for i in self.instances]
+        files.append(self.name + ".v")
+        files.append(self.name + "_wrap.v")
+        files.append("chips_lib.v")
+        files = " ".join(files)
+        os.system("iverilog -o %s %s" % (self.name + "_wrap", files))
+
+        self.cosim = subprocess.Popen(["vvp", "./%s_wrap"%self.name])
+        self.control_in = open("control_in", 'w')
+        self.control_out = open("control_out")
+        
+
+    def cosim_step(self):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               chip.cosim_step()
+
+        Description:
+
+            Run cosim for one cycle.
+
+        Arguments:
+
+            None
+
+        Returns:
+
+            None
+
+        """
+
+        for i in self.inputs.values():
+            self.control_in.write(hex(i.q)[2:] + "\n")
+            self.control_in.flush()
+            print "a"
+            self.control_in.write(str(int(i.src_rdy)) + "\n")
+            self.control_in.flush()
+            print "b"
+
+        for i in self.outputs.values():
+            self.control_in.write(str(int(i.dst_rdy)) + "\n")
+            self.control_in.flush()
+            print "c"
+
+        for i in self.inputs.values():
+            i.dst_rdy = self.control_out.readline()
+            print "d"
+
+        for i in self.outputs.values():
+            i.src_rdy = bool(self.control_out.readline())
+            print "e"
+            try:
+                i.q = int(self.control_out.readline(), 16)
+                print i.q
+            except ValueError:
+                i.q = 0
+                print "uninitialised"
+
+        for i in self.inputs.values() + self.outputs.values():
+            i.simulation_step()
+        for i in self.inputs.values() + self.outputs.values():
+            i.simulation_update()
+
+        self.time += 1
+
+
+def _instance_name(instance):
+    """The name of an instance in the generated Verilog"""
+
+    return "%s_%s" % (instance.component_name, id(instance))
+
+
+def _port_name(port):
+    """The name of a wire, input or output in the generated Verilog"""
+
+    if isinstance(port, _WireSource):
+        return port.name + "_in"
+    return port.name
+
+
+def _port_connects(port):
+    """Describe the instances connected by a wire, input or output"""
+
+    if isinstance(port, _WireSource):
+        port = port.wire
+    source = getattr(port, "source", None)
+    sink = getattr(port, "sink", None)
+    return "%s -> %s" % (
+        "input" if source is None else source.component_name,
+        "output" if sink is None else sink.component_name)
+
+
+def _generate_fifo(output_file, wire):
+    """Write the Verilog FIFO of a buffered wire
+
+    The source writes to the wire name with an _in suffix, the sink reads
+    from the wire name. A word can be read on the clock after it is written.
+    """
+
+    name = wire.name
+    count_bits = len(bin(wire.depth)) - 2
+    address_bits = max(1, len(bin(wire.depth - 1)) - 2)
+    output_file.write("  wire   [%u:0] %s_in;\n" % (wire.width - 1, name))
+    output_file.write("  wire   %s_in_stb;\n" % name)
+    output_file.write("  wire   %s_in_ack;\n" % name)
+    output_file.write("  reg    [%u:0] %s_memory [%u:0];\n" % (
+        wire.width - 1, name, wire.depth - 1))
+    output_file.write("  reg    [%u:0] %s_count;\n" % (count_bits - 1, name))
+    output_file.write("  reg    [%u:0] %s_read_address;\n" % (
+        address_bits - 1, name))
+    output_file.write("  reg    [%u:0] %s_write_address;\n" % (
+        address_bits - 1, name))
+    output_file.write("  assign %s_in_ack = %s_count != %u;\n" % (
+        name, name, wire.depth))
+    output_file.write("  assign %s_stb = %s_count != 0;\n" % (name, name))
+    output_file.write("  assign %s = %s_memory[%s_read_address];\n" % (
+        name, name, name))
+    output_file.write("  always @(posedge clk)\n")
+    output_file.write("  begin\n")
+    output_file.write("    if (%s_in_stb && %s_in_ack) begin\n" % (name, name))
+    output_file.write("      %s_memory[%s_write_address] <= %s_in;\n" % (
+        name, name, name))
+    output_file.write("      if (%s_write_address == %u) begin\n" % (
+        name, wire.depth - 1))
+    output_file.write("        %s_write_address <= 0;\n" % name)
+    output_file.write("      end else begin\n")
+    output_file.write("        %s_write_address <= %s_write_address + 1;\n" % (
+        name, name))
+    output_file.write("      end\n")
+    output_file.write("    end\n")
+    output_file.write("    if (%s_stb && %s_ack) begin\n" % (name, name))
+    output_file.write("      if (%s_read_address == %u) begin\n" % (
+        name, wire.depth - 1))
+    output_file.write("        %s_read_address <= 0;\n" % name)
+    output_file.write("      end else begin\n")
+    output_file.write("        %s_read_address <= %s_read_address + 1;\n" % (
+        name, name))
+    output_file.write("      end\n")
+    output_file.write("    end\n")
+    output_file.write(
+        "    if ((%s_in_stb && %s_in_ack) && !(%s_stb && %s_ack)) begin\n" % (
+            name, name, name, name))
+    output_file.write("      %s_count <= %s_count + 1;\n" % (name, name))
+    output_file.write(
+        "    end else if (!(%s_in_stb && %s_in_ack) && (%s_stb && %s_ack)) begin\n" % (
+            name, name, name, name))
+    output_file.write("      %s_count <= %s_count - 1;\n" % (name, name))
+    output_file.write("    end\n")
+    output_file.write("    if (rst == 1'b1) begin\n")
+    output_file.write("      %s_count <= 0;\n" % name)
+    output_file.write("      %s_read_address <= 0;\n" % name)
+    output_file.write("      %s_write_address <= 0;\n" % name)
+    output_file.write("    end\n")
+    output_file.write("  end\n")
+
+
+def _pool_client(port, unit, client):
+    """The wire connecting a component to a shared floating point core"""
+
+    return "%s_%s%s" % (unit, client, port[len(unit):])
+
+
+def _generate_pool(output_file, unit, clients):
+    """Write a shared floating point core, and its round robin arbiter
+
+    When the core is free, it is granted to the next client, after the last
+    owner, to present its first operand. The owner keeps the core until it
+    has accepted the result.
+    """
+
+    inports, outports = shared_floating_point_ports([unit])
+    if unit in floating_point_units:
+        # conversion
+        operands, result = ["in"], "out"
+    else:
+        operands, result = ["a", "b"], "z"
+    request = "%s_%s_stb" % (unit, operands[0])
+    done = "%s_pool_%s_stb && %s_pool_%s_ack" % (unit, result, unit, result)
+    owner_bits = max(1, len(bin(len(clients) - 1)) - 2)
+
+    for client in clients + ["pool"]:
+        for port, size in inports + outports:
+            if size == 1:
+                output_file.write("  wire   %s;\n" % (
+                    _pool_client(port, unit, client)))
+            else:
+                output_file.write("  wire   [%u:0] %s;\n" % (
+                    size - 1, _pool_client(port, unit, client)))
+    output_file.write("  reg    [%u:0] %s_owner;\n" % (owner_bits - 1, unit))
+    output_file.write("  reg    %s_busy;\n" % unit)
+
+    def owned(port):
+        """The signal driven by the owner"""
+
+        selected = _pool_client(port, unit, clients[0])
+        for index, client in enumerate(clients[1:], 1):
+            selected = "%s_owner == %u ? %s : %s" % (
+                unit, index, _pool_client(port, unit, client), selected)
+        return selected
+
+    # signals from the owner to the core
+    for port, size in outports:
+        if port.endswith("_stb") or port.endswith("_ack"):
+            output_file.write("  assign %s = %s_busy && (%s);\n" % (
+                _pool_client(port, unit, "pool"), unit, owned(port)))
+        else:
+            output_file.write("  assign %s = %s;\n" % (
+                _pool_client(port, unit, "pool"), owned(port)))
+
+    # signals from the core to the owner
+    for index, client in enumerate(clients):
+        for port, size in inports:
+            if port.endswith("_stb") or port.endswith("_ack"):
+                output_file.write(
+                    "  assign %s = %s_busy && %s_owner == %u && %s;\n" % (
+                        _pool_client(port, unit, client),
+                        unit,
+                        unit,
+                        index,
+                        _pool_client(port, unit, "pool")))
+            else:
+                output_file.write("  assign %s = %s;\n" % (
+                    _pool_client(port, unit, client),
+                    _pool_client(port, unit, "pool")))
+
+    output_file.write("  always @(posedge clk)\n")
+    output_file.write("  begin\n")
+    output_file.write("    if (%s_busy) begin\n" % unit)
+    output_file.write("      if (%s) begin\n" % done)
+    output_file.write("        %s_busy <= 0;\n" % unit)
+    output_file.write("      end\n")
+    output_file.write("    end else begin\n")
+    output_file.write("      case (%s_owner)\n" % unit)
+    for owner in range(len(clients)):
+        output_file.write("        %u:\n" % owner)
+        output_file.write("        begin\n")
+        keyword = "if"
+        for offset in range(1, len(clients) + 1):
+            index = (owner + offset) % len(clients)
+            output_file.write("          %s (%s) begin\n" % (
+                keyword, _pool_client(request, unit, clients[index])))
+            output_file.write("            %s_owner <= %u;\n" % (unit, index))
+            output_file.write("            %s_busy <= 1;\n" % unit)
+            output_file.write("          end")
+            keyword = " else if"
+        output_file.write("\n")
+        output_file.write("        end\n")
+    output_file.write("      endcase\n")
+    output_file.write("    end\n")
+    output_file.write("    if (rst == 1'b1) begin\n")
+    output_file.write("      %s_owner <= 0;\n" % unit)
+    output_file.write("      %s_busy <= 0;\n" % unit)
+    output_file.write("    end\n")
+    output_file.write("  end\n")
+
+    def core(port):
+        """The signal connected to the core"""
+
+        return _pool_client("%s_%s" % (unit, port), unit, "pool")
+
+    output_file.write("  %s %s_pool_inst(\n" % (unit, unit))
+    output_file.write("    .clk(clk),\n")
+    output_file.write("    .rst(rst),\n")
+    output_file.write("    .input_a(%s),\n" % core(operands[0]))
+    output_file.write("    .input_a_stb(%s_stb),\n" % core(operands[0]))
+    output_file.write("    .input_a_ack(%s_ack),\n" % core(operands[0]))
+    if len(operands) == 2:
+        output_file.write("    .input_b(%s),\n" % core(operands[1]))
+        output_file.write("    .input_b_stb(%s_stb),\n" % core(operands[1]))
+        output_file.write("    .input_b_ack(%s_ack),\n" % core(operands[1]))
+    output_file.write("    .output_z(%s),\n" % core(result))
+    output_file.write("    .output_z_stb(%s_stb),\n" % core(result))
+    output_file.write("    .output_z_ack(%s_ack)\n" % core(result))
+    output_file.write("  );\n")
+
+
+class _FloatingPointPool:
+
+    """
+    The floating point cores shared by the components of a chip in a cycle
+    accurate simulation. You don't normally need to create them directly, use
+    the shared_fpu argument of Chip.
+    """
+
+    def __init__(self):
+        self.free = {}
+        self.statistics = {}
+
+    def request(self, unit, clock, cycles):
+        """Use a core for a number of cycles
+
+        Returns the number of extra cycles taken waiting for the core to be
+        granted.
+        """
+
+        start = max(clock, self.free.get(unit, 0)) + arbitration_latency
+        self.free[unit] = start + cycles
+        counts = self.statistics.setdefault(
+            unit, dict.fromkeys(["operations", "busy", "waiting"], 0))
+        counts["operations"] += 1
+        counts["busy"] += cycles
+        counts["waiting"] += start - clock - arbitration_latency
+        return start - clock
+
+
+class Component:
+
+    """
+
+    Component
+    ---------
+
+    The Component class defines a new type of component.
+
+    Components are written in C. You can supply the C code as a file name, or
+    directly as a string:
+
+    .. code-block:: python
+
+        #Call an external C file
+        my_component = Component(C_file="adder.c")
 
         #Supply C code directly
         my_component = Adder(C_file=\"\"\"
@@ -804,271 +1696,1304 @@ class Component:
             }
         \"\"\", inline=True)
 
-    Once you have defined a component you can use the __call__ method to create
-    an instance of the component::
+    Once you have defined a component you can use the __call__ method to create
+    an instance of the component::
+
+        ...
+
+        adder_1 = Adder(
+            chip,
+            inputs = {"in1":a, "in2":b},
+            outputs = {"out":z},
+            parameters = {}
+        )
+
+    Instances
+    ---------
+
+    You can make many instances of a component by "calling" the component. Each
+    time you make an instance, you must specify the `Chip` it belongs to, and
+    connect up the inputs and outputs of the `Component`.
+
+    Behavioural Models
+    ------------------
+
+    Simulating C code is much slower than running Python. A component can be
+    given a Python model, which is used in simulation in place of the C code.
+    The C code is still used to generate Verilog. The model is a generator
+    function, which is called with the parameters of the instance. The
+    generator yields a request for each action, and is sent the result:
+
+    + ("read", port, type_) reads a value of type_ from an input.
+    + ("write", port, value, type_) writes a value of type_ to an output.
+    + ("ready", port) checks whether an input has data available.
+    + ("output_ready", port) checks whether an output can accept data.
+    + ("wait", clocks) waits for a number of clock cycles.
+
+    .. code-block:: python
+
+        def adder_model(parameters):
+            while True:
+                a = yield ("read", "in1", "int")
+                b = yield ("read", "in2", "int")
+                yield ("write", "out", a + b, "int")
+
+        adder = Component(C_file="adder.c", model=adder_model)
+
+    Reads and writes handshake with the wires in the same way as the C code.
+    The model must produce the same data as the C code, but need not take the
+    same number of clock cycles.
+
+    A generator can only make one request in each clock. A component which
+    transfers data through several ports in the same clock, such as a
+    pipelined core, can instead be modelled by a function which is called with
+    the parameters, inputs and outputs of the instance, and returns an object
+    with the same methods as a `_BehaviouralModel`. The object drives the
+    handshakes of the wires itself, and is stepped once in each clock.
+
+    """
+
+    def __init__(self, C_file, options={}, inline=False, model=None):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               from chips.api.api import VerilogComponent
+               VerilogComponent(chip, C_file, V_file, options={}, inline=False)
+
+        Description:
+
+            Create a component using C.
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          C_file: A string containing either the filename of the C code, or the
+          C code itself. Filenames are relative to the directory containing the
+          Python module that instances the component
+
+          options: Compile options
+
+          inline: When true treat C_file as the source code,
+          otherwise treat them as filenames
+
+          model: (optional) A generator function, or a function returning a
+          simulation model, used in simulation in place of the C code
+
+        Returns:
+
+          A component.
+
+        """
+
+        if inline:
+            self.tempdir = tempfile.mkdtemp()
+            self.C_file = os.path.join(self.tempdir, "inline_c_file.c")
+            f = open(self.C_file, "w")
+            f.write(textwrap.dedent(C_file).strip())
+            f.close()
+        else:
+            caller = inspect.stack()[1]
+            caller_module = inspect.getmodule(caller[0])
+            caller_location = os.path.dirname(caller_module.__file__)
+            self.C_file = os.path.join(caller_location, C_file)
+
+        self.options = options
+        self.model = model
+
+    def __del__(self):
+        if hasattr(self, "tempdir"):
+            shutil.rmtree(self.tempdir)
+
+    def __call__(self, chip, inputs, outputs,
+                 parameters={}, debug=False, profile=False):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               component_instance(chip, inputs, output, parameters={}, debug=False,
+               profile=False)
+
+        Description:
+
+            Instance a component.
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          inputs: A dictionary of `Wire` or `Input` mappings.
+
+          outputs: A dictionary of `Wire` or `Output` mappings.
+
+          parameters: An optional dictionary of parameters to substitute into
+          the C code.
+
+          debug: (optional) enable debug mode.
+
+          profile: (optional) Boolean enable profiling.
+
+        Returns:
+
+            A component instance.
+
+        """
+
+        return _Instance(
+            self,
+            chip,
+            parameters,
+            inputs,
+            outputs,
+            debug,
+            profile
+        )
+
+
+class _Instance:
+
+    """
+    This class represents a component instance. You don't normally need to
+    create them directly, use the Component.__call__ method.
+    """
+
+    def __init__(self, component, chip, parameters,
+                 inputs, outputs, debug=False, profile=False):
+        self.chip = chip
+        self.parameters = parameters
+        self.inputs = inputs
+        self.outputs = outputs
+        self.component = component
+        self.chip.instances.append(self)
+        self.debug = debug
+        self.profile = profile
+        self.sn = chip.sn
+        chip.sn += 1
+        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+
+        behavioural = chip.behavioural_models or self.component.C_file is None
+        # the source of a buffered wire writes into its FIFO
+        model_outputs = {}
+        for name, output in outputs.iteritems():
+            if isinstance(output, Wire) and output.depth:
+                output = output.source_port
+            model_outputs[name] = output
+
+        if self.component.model is not None and behavioural:
+
+            # use the python model, the ports are those used by the model
+            if inspect.isgeneratorfunction(self.component.model):
+                self.model = _BehaviouralModel(
+                    self.component.model,
+                    parameters,
+                    inputs,
+                    model_outputs
+                )
+            else:
+                self.model = self.component.model(
+                    parameters,
+                    inputs,
+                    model_outputs
+                )
+            component_inputs = inputs.keys()
+            component_outputs = outputs.keys()
+            component_name = "main_%u" % self.sn
+
+        else:
+
+            # generate a python simulation model of the instance
+            ret = chips.compiler.compiler.compile_python_model(
+                self.component.C_file,
+                self.component.options,
+                parameters,
+                inputs,
+                model_outputs,
+                self.debug,
+                self.profile,
+                self.sn
+            )
+
+            self.model, component_inputs, component_outputs, component_name = ret
+
+        self.component_name = component_name
+        if component_name not in chip.components:
+            chip.components[component_name] = self
+
+        # check that correct number of wires have been passed in
+        if len(component_inputs) != len(self.inputs):
+            for i in component_inputs:
+                print "component inputs:"
+            for i in self.inputs:
+                print "instance inputs:"
+            raise C2CHIPError(
+                "Instance %s does not have the right number or inputs" % (
+                    component_name))
+
+        if len(component_outputs) != len(self.outputs):
+            raise C2CHIPError(
+                "Instance %s does not have the right number or outputs" % (
+                    component_name))
+
+        # check for multiple sources or sinks
+        for i in inputs.values():
+            if i.sink is not None:
+                raise C2CHIPError(
+                    "%s already has a sink" % i.name, i.filename, i.lineno)
+            i.sink = self
+
+        for i in outputs.values():
+            if i.source is not None:
+                raise C2CHIPError(
+                    "%s has already has a source" % (
+                        i.name,
+                        i.filename,
+                        i.lineno))
+            i.source = self
+
+        for i in inputs.keys():
+            if i not in component_inputs:
+                raise C2CHIPError("%s is not an input of component %s" %
+                                  (i, component_name), i.filename, i.lineno)
+
+        for i in outputs.keys():
+            if i not in component_outputs:
+                raise C2CHIPError("%s is not an output of component %s" %
+                                  (i, component_name), i.filename, i.lineno)
+
+    def generate_verilog(self, shared_fpu=False):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+
+        Returns the floating point cores which the instance shares with the
+        rest of the chip.
+        """
+
+        options = self.component.options
+        if shared_fpu:
+            options = dict(
+                chips.compiler.compiler.parse_options(options),
+                shared_fpu=True)
+
+        name, inputs, outputs, documentation, shared_units = (
+            chips.compiler.compiler.comp_shared(
+                self.component.C_file,
+                options,
+                self.parameters,
+                self.sn
+            ))
+        return shared_units
+
+
+class _BehaviouralModel:
+
+    """
+    This class simulates a component using a Python generator. You don't
+    normally need to create them directly, use the model argument of
+    Component.
+    """
+
+    def __init__(self, process, parameters, inputs, outputs):
+        self.process = process
+        self.parameters = parameters
+        self.inputs = inputs
+        self.outputs = outputs
+        self.max_stack = 0
+
+    def simulation_reset(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
+
+        self.generator = self.process(self.parameters)
+        self.words = []
+        self.timer = 0
+        self.blocked = False
+        self.op = None
+        self.request = None
+        self.next_request(None)
+
+    def next_request(self, result):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Send the result of a request to the generator and get the next one.
+        """
+
+        self.words = []
+        try:
+            self.request = self.generator.send(result)
+        except StopIteration:
+            self.request = None
+
+    def get_file(self):
+        """The python file containing the model"""
+
+        return self.process.func_code.co_filename
+
+    def get_line(self):
+        """The line the model is currently waiting at"""
+
+        frame = self.generator.gi_frame
+        if frame is None:
+            return self.process.func_code.co_firstlineno
+        return frame.f_lineno
+
+    def simulation_step(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_step() instead
+        """
+
+        self.blocked = False
+        if self.request is None:
+            raise StopSim
+
+        op = self.op = self.request[0]
+        if op == "read":
+            _, port, type_ = self.request
+            input_ = self.inputs[port]
+            if input_.src_rdy and input_.dst_rdy:
+                if _wide(input_, type_):
+                    self.words.extend(
+                        [low_word(input_.q), high_word(input_.q)])
+                else:
+                    self.words.append(input_.q)
+                input_.next_dst_rdy = False
+                if len(self.words) == _words_per_item(type_):
+                    self.next_request(_from_words(self.words, type_))
+            else:
+                input_.next_dst_rdy = True
+                self.blocked = True
+
+        elif op == "write":
+            _, port, value, type_ = self.request
+            output = self.outputs[port]
+            if not self.words:
+                self.words = _to_words(value, type_)
+                if _wide(output, type_):
+                    self.words = [join_words(self.words[1], self.words[0])]
+            if output.src_rdy and output.dst_rdy:
+                output.next_src_rdy = False
+                self.words.pop(0)
+                if not self.words:
+                    self.next_request(None)
+            else:
+                output.q = self.words[0]
+                output.next_src_rdy = True
+                self.blocked = True
+
+        elif op == "ready":
+            self.next_request(self.inputs[self.request[1]].src_rdy)
+
+        elif op == "output_ready":
+            self.next_request(self.outputs[self.request[1]].dst_rdy)
+
+        elif op == "wait":
+            self.timer += 1
+            if self.timer >= self.request[1]:
+                self.timer = 0
+                self.next_request(None)
+
+        else:
+            raise C2CHIPError("Unknown model request %s" % op)
+
+    def get_blocked_port(self):
+        """The input or output the model is blocked on, or None"""
+
+        if not self.blocked:
+            return None
+        if self.op == "read":
+            return self.inputs[self.request[1]]
+        return self.outputs[self.request[1]]
+
+    def activity(self):
+        """What the model did in the last step, see Chip.get_statistics"""
+
+        if self.blocked:
+            return self.op
+        if self.op == "wait":
+            return "wait"
+        return "running"
+
+
+def _wide(port, type_):
+    """True if a value of type_ is transferred in one word on port"""
+
+    return port.width == 64 and type_ in ["long", "double"]
+
+
+def _words_per_item(type_):
+    """The number of 32 bit words used to transfer a value of type_"""
+
+    if type_ in ["long", "double"]:
+        return 2
+    return 1
+
+
+def _to_words(value, type_):
+    """Convert a value to a list of 32 bit words, low word first"""
+
+    if type_ == "int":
+        return [int(value) & 0xffffffff]
+    elif type_ == "long":
+        value = int(value) & 0xffffffffffffffff
+        return [low_word(value), high_word(value)]
+    elif type_ == "float":
+        return [float_bits(value)]
+    elif type_ == "double":
+        bits = double_to_bits(value)
+        return [low_word(bits), high_word(bits)]
+    raise C2CHIPError("Unknown type %s" % type_)
+
+
+def _from_words(words, type_):
+    """Convert a list of 32 bit words, low word first, to a value"""
+
+    if type_ == "int":
+        value = words[0] & 0xffffffff
+        if value & 0x80000000:
+            value -= 0x100000000
+        return value
+    elif type_ == "long":
+        value = join_words(words[1], words[0])
+        if value & 0x8000000000000000:
+            value -= 0x10000000000000000
+        return value
+    elif type_ == "float":
+        return bits_to_float(words[0])
+    elif type_ == "double":
+        return bits_to_double(join_words(words[1], words[0]))
+    raise C2CHIPError("Unknown type %s" % type_)
+
+
+def _check_width(port):
+    """Check that a Wire, Input or Output has a supported width"""
+
+    if port.width not in [32, 64]:
+        raise C2CHIPError(
+            "%s must be 32 or 64 bits wide" % port.name,
+            port.filename,
+            port.lineno)
+
+
+def _update_q(port):
+    """Move the data staged in next_q to the output of a Wire or Output
+
+    A process streaming a block offers the next word in the clock that the
+    last is accepted, so the word can't be seen until the following clock.
+    """
+
+    if port.next_q is not None:
+        port.q = port.next_q
+        port.next_q = None
+
+
+class Wire:
+
+    """
+
+    Wire
+    ----
+
+    A `Wire` is a point to point connection, a stream, that connects an output
+    from one component to the input of another. A `Wire` can only have one
+    source of data, and one data sink. When you create a `Wire`, you must tell
+    it which `Chip` it belongs to:
+
+    .. code-block:: python
+
+        wire_a = Wire(mychip)
+        wire_b = Wire(mychip)
+
+    Wires are 32 bits wide by default. A 64 bit wire transfers a long or
+    double in a single handshake, rather than as two 32 bit words. Components
+    declare 64 bit ports using `input("name", 64)` and `output("name", 64)`,
+    and use `fgetc64` and `fputc64` to transfer data:
+
+    .. code-block:: python
+
+        wire_c = Wire(mychip, width=64)
+
+    A `Wire` has no storage, so the source and the sink wait for each other
+    on every transfer. A buffered wire holds up to `depth` items in a FIFO,
+    so that the source can run ahead of the sink. The FIFO is included in the
+    generated Verilog. After a simulation, `high_water` gives the largest
+    number of items held, use `Chip.report_fifos` to find FIFOs which are
+    too small:
+
+    .. code-block:: python
+
+        wire_d = Wire(mychip, depth=16)
+
+    """
+
+    def __init__(self, chip, width=32, depth=0):
+        """
+        Synopsis:
+
+            .. code-block:: python
+
+                from chips.api.api import Wire
+                Wire(chip, width=32, depth=0)
+
+        Description:
+
+            Create a Wire within a chip.
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          width: (optional) The width of the wire in bits, 32 or 64
+
+          depth: (optional) The number of items the wire can buffer
+
+        Returns:
+
+            A Wire object.
+
+        """
+
+        self.chip = chip
+        chip.wires.append(self)
+        self.width = width
+        self.depth = depth
+        self.source = None
+        self.sink = None
+        self.name = "wire_" + str(id(self))
+        self.src_rdy = False
+        self.dst_rdy = False
+        self.next_src_rdy = False
+        self.next_dst_rdy = False
+        self.next_q = None
+        self.high_water = 0
+        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        _check_width(self)
+        if depth < 0 or int(depth) != depth:
+            raise C2CHIPError(
+                "%s depth must be a positive integer" % self.name,
+                self.filename,
+                self.lineno)
+
+        # the source of a buffered wire writes into the FIFO through its own
+        # handshake, the sink reads from the Wire itself
+        if depth:
+            self.source_port = _WireSource(self)
+
+    def simulation_reset(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
+
+        self.q = False
+        self.next_q = None
+        if self.depth:
+            self.buffer = collections.deque()
+            self.high_water = 0
+            self.src_rdy = False
+            self.source_port.simulation_reset()
+
+    def simulation_update(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_update() instead
+        """
+
+        if self.depth:
+            self.update_buffer()
+            return
+
+        self.src_rdy = self.next_src_rdy
+        self.dst_rdy = self.next_dst_rdy
+        _update_q(self)
+
+    def update_buffer(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Complete any transfers into or out of the FIFO.
+        """
+
+        source_port = self.source_port
+        if source_port.src_rdy and source_port.dst_rdy:
+            self.buffer.append(source_port.q)
+            self.high_water = max(self.high_water, len(self.buffer))
+        if self.src_rdy and self.dst_rdy:
+            self.buffer.popleft()
+
+        _update_q(source_port)
+        source_port.src_rdy = source_port.next_src_rdy
+        source_port.dst_rdy = len(self.buffer) < self.depth
+        self.dst_rdy = self.next_dst_rdy
+        self.src_rdy = bool(self.buffer)
+        if self.buffer:
+            self.q = self.buffer[0]
+
+
+class _WireSource:
+
+    """
+    This class is the end of a buffered `Wire` connected to its source. You
+    don't normally need to create them directly, use the depth argument of
+    Wire.
+    """
+
+    def __init__(self, wire):
+        self.wire = wire
+        self.name = wire.name
+        self.width = wire.width
+
+    def simulation_reset(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
+
+        self.q = False
+        self.next_q = None
+        self.src_rdy = False
+        self.dst_rdy = True
+        self.next_src_rdy = False
+
+
+class Input:
+
+    """
+
+    Input
+    -----
+
+    An `Input` takes data from outside the `Chip`, and feeds it into the input
+    of a `Component`. When you create an `Input`, you need to specify the
+    `Chip` it belongs to, and the name it will be given.
+
+    .. code-block:: python
+
+        input_a = Input(mychip, "A")
+        input_b = Input(mychip, "B")
+        input_c = Input(mychip, "C")
+        input_d = Input(mychip, "D")
+
+    In simulation, the Input calls the `data_source` member function, to model
+    an input in simulation, subclass the Input and override the `data_source`
+    method:
+
+    .. code-block:: python
+
+        from chips.api.api import Input
+
+        stimulus = iter([1, 2, 3, 4, 5])
+
+        class MyInput(Input):
+
+            def data_source(self):
+                return next(stimulus)
+
+    When `data_source` raises `StopIteration`, the input has reached the end
+    of its data. `Chip.simulation_run` stops when every component has either
+    finished, or is waiting to transfer data.
+
+    """
+
+    def __init__(self, chip, name, width=32):
+        """
+        Synopsis:
+
+            .. code-block:: python
+
+                from chips.api.api import Input
+                Input(chip, name, width=32)
+
+        Description:
+
+            Create an `Input` within a `Chip`.
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          name: The name of the input (used in verilog code)
+
+          width: (optional) The width of the input in bits, 32 or 64
+
+        Returns:
+
+            An `Input` instance.
+
+        """
+
+        self.chip = chip
+        chip.inputs[name] = self
+        self.sink = None
+        self.name = name
+        self.width = width
+        self.src_rdy = True
+        self.dst_rdy = False
+        self.next_dst_rdy = False
+        self.exhausted = False
+        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        _check_width(self)
+
+    def simulation_reset(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
+
+        self.src_rdy = True
+        self.exhausted = False
+        self.next_data()
+
+    def simulation_step(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_step() instead
+        """
+
+        self.update_data = self.src_rdy and self.dst_rdy
+
+    def simulation_update(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_update() instead
+        """
+
+        self.dst_rdy = self.next_dst_rdy
+        if self.update_data:
+            self.next_data()
+
+    def next_data(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        A data_source may raise StopIteration at the end of its data, no more
+        data is offered to the component.
+        """
+
+        try:
+            self.q = self.data_source()
+        except StopIteration:
+            self.src_rdy = False
+            self.exhausted = True
+
+    def data_source(self):
+        """Override this function in your application"""
+
+        pass
+
+
+class Output:
+
+    """
+
+    Output
+    ------
+
+    An `Output` takes data from a `Component` output, and sends it outside the
+    `Chip`. When you create an `Output` you must tell it which `Chip` it belongs
+    to, and the name it will be given.
+
+    In simulation, the `Output` calls the `data_source` member function, to model
+    an output in simulation, subclass the Output and override the `data_sink`
+    method:
+
+    .. code-block:: python
+
+        from chips.api.api import Output
+
+        class MyOutput(Output):
+
+            def data_sink(self, data):
+                print data
+
+    """
+
+    def __init__(self, chip, name, width=32):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+                from chips.api.api import Output
+                Output(chip, name, width=32)
+
+        Description:
+
+            Create an `Output` within a `Chip` .
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          name: The name of the output (used in Verilog code)
+
+          width: (optional) The width of the output in bits, 32 or 64
+
+        Returns:
+
+            An `Output` instance.
+
+        """
+
+        self.chip = chip
+        chip.outputs[name] = self
+        self.source = None
+        self.name = name
+        self.width = width
+        self.src_rdy = False
+        self.dst_rdy = True
+        self.next_src_rdy = False
+        self.next_q = None
+        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        _check_width(self)
+
+    def simulation_reset(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
+
+        pass
+
+    def simulation_step(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_step() instead
+        """
+
+        if self.src_rdy and self.dst_rdy:
+            self.data_sink(self.q)
+
+    def simulation_stop(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Called when the simulation stops.
+        """
 
+        pass
+
+    def simulation_update(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_update() instead
+        """
+
+        self.src_rdy = self.next_src_rdy
+        _update_q(self)
+
+    def data_sink(data):
+        """override this function in your application"""
+
+        pass
+
+
+class Stimulus(Input):
+
+    """
+
+    Stimulus
+    --------
+
+    Stimulus is a subclass of Input. A Stimulus input provides a convenient
+    means to supply data to the Chips simulation using any python sequence
+    object for example a, list, an iterator or a generator.
+
+    .. code-block:: python
+
+        from chips.api.api import Sequence
+
+        mychip = Chip("a chip")
         ...
 
-        adder_1 = Adder(
-            chip,
-            inputs = {"in1":a, "in2":b},
-            outputs = {"out":z},
-            parameters = {}
-        )
+        Sequence(mychip, "counter", "int", range(1, 100))
 
-    Instances
-    ---------
+        mychip.simulation_reset()
+        mychip.simulation_run()
 
-    You can make many instances of a component by "calling" the component. Each
-    time you make an instance, you must specify the `Chip` it belongs to, and
-    connect up the inputs and outputs of the `Component`.
+    By default, the sequence is repeated. If `cycle` is False, the input
+    reaches the end of its data after the last item.
+
+    On a 64 bit input, each long or double is supplied in a single transfer.
+
+    Large data sets can be supplied as NumPy arrays, or as raw binary files
+    which are memory mapped rather than read into memory. The data is used
+    directly, floating point values are reinterpreted as their bit patterns
+    without converting each item.
+
+    .. code-block:: python
+
+        Stimulus.from_array(mychip, "samples", "float", numpy_array)
+        Stimulus.from_file(mychip, "samples", "double", "samples.bin",
+                           cycle=False)
 
     """
 
-    def __init__(self, C_file, options={}, inline=False):
-        """
+    # numpy representation of each type, stored little endian so that
+    # 64 bit values can be viewed as low, high word pairs
+    dtypes = {
+        "int": "<i4",
+        "long": "<i8",
+        "float": "<f4",
+        "double": "<f8",
+    }
 
+    def __init__(self, chip, name, type_, sequence, cycle=True, width=32):
+        """
         Synopsis:
 
             .. code-block:: python
 
-               from chips.api.api import VerilogComponent
-               VerilogComponent(chip, C_file, V_file, options={}, inline=False)
+                from chips.api.api import Stimulus
+                Stimulus(chip, name, type_, sequence, cycle=True, width=32)
 
         Description:
 
-            Create a component using C.
+            Create a `Stimulus` input within a `Chip`.
 
         Arguments:
 
           chip: The chip to which the input belongs
 
-          C_file: A string containing either the filename of the C code, or the
-          C code itself. Filenames are relative to the directory containing the
-          Python module that instances the component
+          name: The name of the output (used in Verilog code)
 
-          options: Compile options
+          type_: The data type of the stimulus, "int", "long", "float"
+          or "double"
 
-          inline: When true treat C_file as the source code,
-          otherwise treat them as filenames
+          sequence: A sequence object for example a list or an generator function
+
+          cycle: When true, repeat the sequence, otherwise the input reaches
+          the end of its data after the last item
+
+          width: (optional) The width of the input in bits, 32 or 64
 
         Returns:
 
-          A component.
+            A `Stimulus` instance.
 
         """
 
-        if inline:
-            self.tempdir = tempfile.mkdtemp()
-            self.C_file = os.path.join(self.tempdir, "inline_c_file.c")
-            f = open(self.C_file, "w")
-            f.write(textwrap.dedent(C_file).strip())
-            f.close()
-        else:
-            caller = inspect.stack()[1]
-            caller_module = inspect.getmodule(caller[0])
-            caller_location = os.path.dirname(caller_module.__file__)
-            self.C_file = os.path.join(caller_location, C_file)
+        Input.__init__(self, chip, name, width)
+        self.sequence = sequence
+        self.type_ = type_
+        self.cycle = cycle
+        self.wide = width == 64 and type_ in ["long", "double"]
+        self.words = None
+        self.high_word = False
+        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
 
-        self.options = options
+    @classmethod
+    def from_array(cls, chip, name, type_, array, cycle=True, width=32):
+        """
+        Synopsis:
 
-    def __del__(self):
-        if hasattr(self, "tempdir"):
-            shutil.rmtree(self.tempdir)
+            .. code-block:: python
+
+                from chips.api.api import Stimulus
+                Stimulus.from_array(chip, name, type_, array, cycle=True,
+                                    width=32)
+
+        Description:
+
+            Create a `Stimulus` input from a NumPy array. The array is not
+            copied if it is contiguous and already has the right type.
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          name: The name of the output (used in Verilog code)
+
+          type_: The data type of the stimulus, "int", "long", "float"
+          or "double"
+
+          array: A NumPy array, or anything which can be converted to one
+
+          cycle: When true, repeat the data, otherwise the input reaches
+          the end of its data after the last item
+
+          width: (optional) The width of the input in bits, 32 or 64
+
+        Returns:
+
+            A `Stimulus` instance.
 
-    def __call__(self, chip, inputs, outputs,
-                 parameters={}, debug=False, profile=False):
         """
 
+        array = numpy.ascontiguousarray(array, dtype=cls.dtypes[type_])
+        stimulus = cls(chip, name, type_, array.ravel(), cycle, width)
+        stimulus.words = stimulus.sequence.view(stimulus.word_dtype())
+        _, stimulus.filename, stimulus.lineno, _, _, _ = inspect.stack()[1]
+        return stimulus
+
+    @classmethod
+    def from_file(cls, chip, name, type_, filename, cycle=True, width=32):
+        """
         Synopsis:
 
             .. code-block:: python
 
-               component_instance(chip, inputs, output, parameters={}, debug=False,
-               profile=False)
+                from chips.api.api import Stimulus
+                Stimulus.from_file(chip, name, type_, filename, cycle=True,
+                                   width=32)
 
         Description:
 
-            Instance a component.
+            Create a `Stimulus` input from a binary file. The file is memory
+            mapped, so it need not fit in memory.
 
         Arguments:
 
           chip: The chip to which the input belongs
 
-          inputs: A dictionary of `Wire` or `Input` mappings.
+          name: The name of the output (used in Verilog code)
 
-          outputs: A dictionary of `Wire` or `Output` mappings.
+          type_: The data type of the stimulus, "int", "long", "float"
+          or "double", the file holds raw little endian values of this type
 
-          parameters: An optional dictionary of parameters to substitute into
-          the C code.
+          filename: The name of the file
 
-          debug: (optional) enable debug mode.
+          cycle: When true, repeat the data, otherwise the input reaches
+          the end of its data after the last item
 
-          profile: (optional) Boolean enable profiling.
+          width: (optional) The width of the input in bits, 32 or 64
 
         Returns:
 
-            A component instance.
+            A `Stimulus` instance.
 
         """
 
-        return _Instance(
-            self,
-            chip,
-            parameters,
-            inputs,
-            outputs,
-            debug,
-            profile
-        )
+        array = numpy.memmap(filename, dtype=cls.dtypes[type_], mode="r")
+        stimulus = cls(chip, name, type_, array, cycle, width)
+        stimulus.words = array.view(stimulus.word_dtype())
+        _, stimulus.filename, stimulus.lineno, _, _, _ = inspect.stack()[1]
+        return stimulus
 
+    def word_dtype(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        The numpy type of each word transferred.
+        """
 
-class _Instance:
+        if self.wide:
+            return "<u8"
+        return "<u4"
 
-    """
-    This class represents a component instance. You don't normally need to
-    create them directly, use the Component.__call__ method.
-    """
+    def simulation_reset(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_reset() instead
+        """
 
-    def __init__(self, component, chip, parameters,
-                 inputs, outputs, debug=False, profile=False):
-        self.chip = chip
-        self.parameters = parameters
-        self.inputs = inputs
-        self.outputs = outputs
-        self.component = component
-        self.chip.instances.append(self)
-        self.debug = debug
-        self.profile = profile
-        self.sn = chip.sn
-        chip.sn += 1
-        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        if self.cycle:
+            self.iterator = itertools.cycle(iter(self.sequence))
+        else:
+            self.iterator = iter(self.sequence)
+        self.index = 0
+        self.high_word = False
+        Input.simulation_reset(self)
 
-        # generate a python simulation model of the instance
-        ret = chips.compiler.compiler.compile_python_model(
-            self.component.C_file,
-            self.component.options,
-            parameters,
-            inputs,
-            outputs,
-            self.debug,
-            self.profile,
-            self.sn
-        )
+    def data_source(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        """
+
+        if self.words is not None:
+
+            # arrays are already held as words, low word first
+            if self.index == len(self.words):
+                if not self.cycle or not len(self.words):
+                    raise StopIteration
+                self.index = 0
+            word = int(self.words[self.index])
+            self.index += 1
+            return word
+
+        elif self.type_ == "int":
+            return next(self.iterator)
+
+        elif self.type_ == "long":
+
+            if self.wide:
+                return next(self.iterator) & 0xffffffffffffffff
+            elif self.high_word:
+                self.high_word = not self.high_word
+                word = self.high
+                return word
+            else:
+                self.high_word = not self.high_word
+                long_word = next(self.iterator)
+                self.high = high_word(long_word)
+                low = low_word(long_word)
+                return low
+
+        elif self.type_ == "float":
+
+            return float_to_bits(next(self.iterator))
+
+        elif self.type_ == "double":
+
+            if self.wide:
+                return double_to_bits(next(self.iterator))
+            elif self.high_word:
+                self.high_word = not self.high_word
+                word = self.high
+                return word
+            else:
+                self.high_word = not self.high_word
+                long_word = double_to_bits(next(self.iterator))
+                self.high = high_word(long_word)
+                low = low_word(long_word)
+                return low
+
+    def __iter__(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        __iter__() provides an iterator like interface so that you can use
+        functions like iter(), next() or iterate through with a for loop.
+        """
+
+        return iter(self.sequence)
+
+    def __len__(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        __len__() allows the len() function to be used.
+        """
 
-        self.model, component_inputs, component_outputs, component_name = ret
+        return len(self.sequence)
 
-        self.component_name = component_name
-        if component_name not in chip.components:
-            chip.components[component_name] = self
 
-        # check that correct number of wires have been passed in
-        if len(component_inputs) != len(self.inputs):
-            for i in component_inputs:
-                print "component inputs:"
-            for i in self.inputs:
-                print "instance inputs:"
-            raise C2CHIPError(
-                "Instance %s does not have the right number or inputs" % (
-                    component_name))
+class Response(Output):
 
-        if len(component_outputs) != len(self.outputs):
-            raise C2CHIPError(
-                "Instance %s does not have the right number or outputs" % (
-                    component_name))
+    """
 
-        # check for multiple sources or sinks
-        for i in inputs.values():
-            if i.sink is not None:
-                raise C2CHIPError(
-                    "%s already has a sink" % i.name, i.filename, i.lineno)
-            i.sink = self
+    Response
+    --------
 
-        for i in outputs.values():
-            if i.source is not None:
-                raise C2CHIPError(
-                    "%s has already has a source" % (
-                        i.name,
-                        i.filename,
-                        i.lineno))
-            i.source = self
+    Response is a subclass of Output. A Response output provides a convenient
+    means to extract data to the Chips simulation. A response behaves as a
+    Python iterator.
 
-        for i in inputs.keys():
-            if i not in component_inputs:
-                raise C2CHIPError("%s is not an input of component %s" %
-                                  (i, component_name), i.filename, i.lineno)
+    .. code-block:: python
 
-        for i in outputs.keys():
-            if i not in component_outputs:
-                raise C2CHIPError("%s is not an output of component %s" %
-                                  (i, component_name), i.filename, i.lineno)
+        from chips.api.api import Response
 
-    def generate_verilog(self):
-        """
-        This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_reset() instead
-        """
+        mychip = Chip("a chip")
+        ...
 
-        chips.compiler.compiler.comp(
-            self.component.C_file,
-            self.component.options,
-            self.parameters,
-            self.sn
-        )
+        sinx = Response(mychip, "sinx", "int")
 
+        mychip.simulation_reset()
+        mychip.simulation_run()
 
-class Wire:
+        plot(sinx)
 
-    """
+    The data, and the time at which each item arrived, are stored in NumPy
+    arrays, which can be accessed without copying using the `values` and
+    `times` attributes. The `int` and `long` values are the unsigned bit
+    patterns received, use `view(numpy.int32)` or `view(numpy.int64)` for
+    signed values.
 
-    Wire
-    ----
+    .. code-block:: python
 
-    A `Wire` is a point to point connection, a stream, that connects an output
-    from one component to the input of another. A `Wire` can only have one
-    source of data, and one data sink. When you create a `Wire`, you must tell
-    it which `Chip` it belongs to:
+        samples = sinx.values
+        arrival_times = sinx.times
+
+    Long simulations can produce more data than will fit in memory. A
+    `Response` can instead keep only the most recent data, stream the data to
+    a binary file, or pass each item to a function without storing it:
 
     .. code-block:: python
 
-        wire_a = Wire(mychip)
-        wire_b = Wire(mychip)
+        #keep the last 1000 items
+        Response(mychip, "sinx", "float", history=1000)
+
+        #write raw little endian floats to a file
+        Response(mychip, "sinx", "float", filename="sinx.bin")
+
+        #call a function with each item
+        Response(mychip, "sinx", "float", callback=my_function)
+
+    In these modes, `count` gives the total number of items received.
+
+    On a 64 bit output, each long or double is received in a single transfer.
 
     """
 
-    def __init__(self, chip):
+    # values are stored as 32 bit words, and viewed as values of each type
+    dtypes = {
+        "int": "<u4",
+        "long": "<u8",
+        "float": "<f4",
+        "double": "<f8",
+    }
+
+    # number of items buffered before writing to a file
+    file_buffer_size = 65536
+
+    def __init__(self, chip, name, type_, history=None, filename=None,
+                 callback=None, width=32):
         """
         Synopsis:
 
             .. code-block:: python
 
-                from chips.api.api import Wire
-                Wire(chip)
+                from chips.api.api import Response
+                Response(chip, name, type_, history=None, filename=None,
+                         callback=None, width=32)
 
         Description:
 
-            Create a Wire within a chip.
+            Create a `Response` within a `Chip`
 
         Arguments:
 
           chip: The chip to which the input belongs
 
+          name: The name of the output (used in Verilog code)
+
+          type_: The data type of the stimulus, "int", "long", "float"
+          or "double"
+
+          history: (optional) only keep the last history items
+
+          filename: (optional) write the data to a binary file instead of
+          storing it
+
+          callback: (optional) call a function with each item instead of
+          storing it
+
+          width: (optional) The width of the output in bits, 32 or 64
+
         Returns:
 
-            A Wire object.
+            A `Response` instance.
 
         """
 
-        self.chip = chip
-        chip.wires.append(self)
-        self.source = None
-        self.sink = None
-        self.name = "wire_" + str(id(self))
-        self.src_rdy = False
-        self.dst_rdy = False
-        self.next_src_rdy = False
-        self.next_dst_rdy = False
+        Output.__init__(self, chip, name, width)
+        self.type_ = type_
+        self.wide = width == 64 and type_ in ["long", "double"]
+        self.high_word = False
+        self.history = history
+        self.file_name = filename
+        self.callback = callback
         _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        if [history, filename, callback].count(None) < 2:
+            raise C2CHIPError(
+                "A Response can only use one of history, filename or callback",
+                self.filename, self.lineno)
+        if type_ in ["long", "double"]:
+            self.words_per_item = 2
+        else:
+            self.words_per_item = 1
 
     def simulation_reset(self):
         """
@@ -1076,197 +3001,322 @@ class Wire:
         Use Chip.simulation_reset() instead
         """
 
-        self.q = False
+        if self.history is not None:
+            capacity = self.history
+        elif self.file_name is not None:
+            capacity = self.file_buffer_size
+        else:
+            capacity = 1024
+        self.words = numpy.zeros(capacity * self.words_per_item, "<u4")
+        self.time_stamps = numpy.zeros(capacity, "<u8")
+        self.count = 0
+        self.buffered = 0
+        if self.file_name is not None:
+            self.simulation_stop()
+            self.file_ = open(self.file_name, "wb")
+        Output.simulation_reset(self)
+        self.high_word = False
 
-    def simulation_update(self):
+    def data_sink(self, value):
         """
         This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_update() instead
         """
 
-        self.src_rdy = self.next_src_rdy
-        self.dst_rdy = self.next_dst_rdy
+        if self.wide:
+            self.low = low_word(value)
+            value = high_word(value)
+        elif self.words_per_item == 2:
+            self.high_word = not self.high_word
+            if self.high_word:
+                self.low = value
+                return
 
+        if self.callback is not None:
+            self.callback(self.convert(value))
+            self.count += 1
+            return
 
-class Input:
+        capacity = len(self.time_stamps)
+        if self.history is not None:
+            index = self.count % capacity
+        elif self.file_name is not None:
+            index = self.buffered
+        else:
+            index = self.count
+            if index == capacity:
+                self.words = numpy.resize(self.words, 2 * len(self.words))
+                self.time_stamps = numpy.resize(
+                    self.time_stamps, 2 * capacity)
+
+        if self.words_per_item == 2:
+            self.words[2 * index] = self.low
+            self.words[2 * index + 1] = value
+        else:
+            self.words[index] = value
+        self.time_stamps[index] = self.chip.time
+        self.count += 1
 
-    """
+        if self.file_name is not None:
+            self.buffered += 1
+            if self.buffered == capacity:
+                self.flush()
 
-    Input
-    -----
+    def convert(self, value):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        """
 
-    An `Input` takes data from outside the `Chip`, and feeds it into the input
-    of a `Component`. When you create an `Input`, you need to specify the
-    `Chip` it belongs to, and the name it will be given.
+        if self.type_ == "int":
+            return value
+        elif self.type_ == "long":
+            return join_words(value, self.low)
+        elif self.type_ == "float":
+            return bits_to_float(value)
+        elif self.type_ == "double":
+            return bits_to_double(join_words(value, self.low))
 
-    .. code-block:: python
+    def flush(self):
+        """
+        Synopsis:
 
-        input_a = Input(mychip, "A")
-        input_b = Input(mychip, "B")
-        input_c = Input(mychip, "C")
-        input_d = Input(mychip, "D")
+            .. code-block:: python
 
-    In simulation, the Input calls the `data_source` member function, to model
-    an input in simulation, subclass the Input and override the `data_source`
-    method:
+               response.flush()
 
-    .. code-block:: python
+        Description:
 
-        from chips.api.api import Input
+            Write any buffered data to the file.
 
-        stimulus = iter([1, 2, 3, 4, 5])
+        Arguments:
 
-        class MyInput(Input):
+            None
 
-            def data_source(self):
-                return next(stimulus)
+        Returns:
 
-    """
+            None
+
+        """
 
-    def __init__(self, chip, name):
+        if self.file_name is not None and not self.file_.closed:
+            self.words[:self.buffered * self.words_per_item].tofile(
+                self.file_)
+            self.file_.flush()
+            self.buffered = 0
+
+    def simulation_stop(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Write any buffered data, and close the file.
+        """
+
+        if getattr(self, "file_", None) is not None:
+            self.flush()
+            self.file_.close()
+
+    def stored(self, array, items_per_entry):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        Return the stored part of an array, oldest first.
+        """
+
+        capacity = len(self.time_stamps)
+        if self.history is not None and self.count > capacity:
+            start = (self.count % capacity) * items_per_entry
+            return numpy.concatenate((array[start:], array[:start]))
+        return array[:min(self.count, capacity) * items_per_entry]
+
+    @property
+    def values(self):
         """
         Synopsis:
 
             .. code-block:: python
 
-                from chips.api.api import Input
-                Input(chip, name)
+               response.values
 
         Description:
 
-            Create an `Input` within a `Chip`.
+            Get the data received as a NumPy array. Data in memory is not
+            copied, unless the history has wrapped around. Data written to a
+            file is memory mapped.
 
         Arguments:
 
-          chip: The chip to which the input belongs
-
-          name: The name of the input (used in verilog code)
+            None
 
         Returns:
 
-            An `Input` instance.
+            A NumPy array.
 
         """
 
-        self.chip = chip
-        chip.inputs[name] = self
-        self.sink = None
-        self.name = name
-        self.src_rdy = True
-        self.dst_rdy = False
-        self.next_dst_rdy = False
-        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        dtype = self.dtypes[self.type_]
+        if self.callback is not None:
+            return numpy.zeros(0, dtype)
+        elif self.file_name is not None:
+            self.flush()
+            if not self.count:
+                return numpy.zeros(0, dtype)
+            return numpy.memmap(self.file_name, dtype=dtype, mode="r")
+        return self.stored(self.words, self.words_per_item).view(dtype)
 
-    def simulation_reset(self):
+    @property
+    def times(self):
         """
-        This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_reset() instead
+        Synopsis:
+
+            .. code-block:: python
+
+               response.times
+
+        Description:
+
+            Get the simulation time at which each item was received as a NumPy
+            array. Times are not kept when the data is written to a file, or
+            passed to a callback.
+
+        Arguments:
+
+            None
+
+        Returns:
+
+            A NumPy array.
+
         """
 
-        self.src_rdy = True
-        self.q = self.data_source()
+        if self.callback is not None or self.file_name is not None:
+            return numpy.zeros(0, "<u8")
+        return self.stored(self.time_stamps, 1)
 
-    def simulation_step(self):
+    def __iter__(self):
         """
         This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_step() instead
+        __iter__() provides an iterator like interface so that you can use
+        functions like iter(), next() or iterate through with a for loop.
         """
 
-        self.update_data = self.src_rdy and self.dst_rdy
+        return iter(self.values.tolist())
 
-    def simulation_update(self):
+    def __len__(self):
         """
         This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_update() instead
+        __len__() allows the len() function to be used.
         """
 
-        self.dst_rdy = self.next_dst_rdy
-        if self.update_data:
-            self.q = self.data_source()
-
-    def data_source(self):
-        """Override this function in your application"""
-
-        pass
+        if self.callback is not None:
+            return 0
+        elif self.history is not None:
+            return min(self.count, self.history)
+        return self.count
 
 
-class Output:
+class QueueInput(Input):
 
     """
 
-    Output
-    ------
-
-    An `Output` takes data from a `Component` output, and sends it outside the
-    `Chip`. When you create an `Output` you must tell it which `Chip` it belongs
-    to, and the name it will be given.
+    QueueInput
+    ----------
 
-    In simulation, the `Output` calls the `data_source` member function, to model
-    an output in simulation, subclass the Output and override the `data_sink`
-    method:
+    QueueInput is a subclass of Input. A QueueInput is fed with data by the
+    program running the simulation, while the simulation runs. This allows a
+    simulation to be driven by data which arrives from elsewhere, for example
+    a socket or a message queue.
 
     .. code-block:: python
 
-        from chips.api.api import Output
+        from chips.api.api import QueueInput
 
-        class MyOutput(Output):
+        mychip = Chip("a chip")
+        ...
 
-            def data_sink(self, data):
-                print data
+        samples = QueueInput(mychip, "samples", "int")
+        samples.put(1)
+        samples.extend([2, 3, 4])
+
+    While the queue is empty, no data is offered to the component, which
+    waits for the next item. Call `close` after the last item, the input then
+    reaches the end of its data once the queue is empty.
+
+    Items put before `Chip.simulation_reset` is called are kept.
 
     """
 
-    def __init__(self, chip, name):
+    def __init__(self, chip, name, type_, width=32):
         """
-
         Synopsis:
 
             .. code-block:: python
 
-                from chips.api.api import Output
-                Output(chip, name)
+                from chips.api.api import QueueInput
+                QueueInput(chip, name, type_, width=32)
 
         Description:
 
-            Create an `Output` within a `Chip` .
+            Create a `QueueInput` within a `Chip`.
 
         Arguments:
 
           chip: The chip to which the input belongs
 
-          name: The name of the output (used in Verilog code)
+          name: The name of the input (used in Verilog code)
+
+          type_: The data type of the input, "int", "long", "float" or
+          "double"
+
+          width: (optional) The width of the input in bits, 32 or 64
 
         Returns:
 
-            An `Output` instance.
+            A `QueueInput` instance.
+
+        """
+
+        self.type_ = type_
+        self.queue = collections.deque()
+        self.closed = False
+        self.starved = False
+        Input.__init__(self, chip, name, width)
+        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+
+    def put(self, value):
+        """Add a value to the end of the queue"""
+
+        if self.closed:
+            raise C2CHIPError(
+                "%s has been closed" % self.name, self.filename, self.lineno)
+        words = _to_words(value, self.type_)
+        if _wide(self, self.type_):
+            words = [join_words(words[1], words[0])]
+        self.queue.extend(words)
 
-        """
+    def extend(self, values):
+        """Add each value in a sequence to the end of the queue"""
 
-        self.chip = chip
-        chip.outputs[name] = self
-        self.source = None
-        self.name = name
-        self.src_rdy = False
-        self.dst_rdy = True
-        self.next_src_rdy = False
-        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        for value in values:
+            self.put(value)
 
-    def simulation_reset(self):
-        """
-        This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_reset() instead
-        """
+    def close(self):
+        """No more values will be added to the queue"""
 
-        pass
+        self.closed = True
 
-    def simulation_step(self):
+    def next_data(self):
         """
         This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_step() instead
         """
 
-        if self.src_rdy and self.dst_rdy:
-            self.data_sink(self.q)
+        if self.queue:
+            self.q = self.queue.popleft()
+            self.src_rdy = True
+            self.starved = False
+        elif self.closed:
+            self.src_rdy = False
+            self.starved = False
+            self.exhausted = True
+        else:
+            self.src_rdy = False
+            self.starved = True
 
     def simulation_update(self):
         """
@@ -1274,73 +3324,85 @@ class Output:
         Use Chip.simulation_update() instead
         """
 
-        self.src_rdy = self.next_src_rdy
+        Input.simulation_update(self)
+        if self.starved and (self.queue or self.closed):
+            self.next_data()
 
-    def data_sink(data):
-        """override this function in your application"""
+    def __len__(self):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        __len__() gives the number of words waiting in the queue.
+        """
 
-        pass
+        return len(self.queue)
 
 
-class Stimulus(Input):
+class QueueOutput(Output):
 
     """
 
-    Stimulus
-    --------
+    QueueOutput
+    -----------
 
-    Stimulus is a subclass of Input. A Stimulus input provides a convenient
-    means to supply data to the Chips simulation using any python sequence
-    object for example a, list, an iterator or a generator.
+    QueueOutput is a subclass of Output. The program running the simulation
+    takes data from a QueueOutput while the simulation runs, for example to
+    send it to a socket or a message queue.
 
     .. code-block:: python
 
-        from chips.api.api import Sequence
+        from chips.api.api import QueueOutput
 
         mychip = Chip("a chip")
         ...
 
-        Sequence(mychip, "counter", "int", range(1, 100))
+        results = QueueOutput(mychip, "results", "int", capacity=64)
+        ...
+        while results:
+            send(results.get())
 
-        mychip.simulation_reset()
-        mychip.simulation_run()
+    If a capacity is given, the output stops accepting data from the
+    component while the queue is full.
 
     """
 
-    def __init__(self, chip, name, type_, sequence):
+    def __init__(self, chip, name, type_, capacity=None, width=32):
         """
         Synopsis:
 
             .. code-block:: python
 
-                from chips.api.api import Stimulus
-                Stimulus(chip, name, type_, sequence)
+                from chips.api.api import QueueOutput
+                QueueOutput(chip, name, type_, capacity=None, width=32)
 
         Description:
 
-            Create a `Stimulus` input within a `Chip`.
+            Create a `QueueOutput` within a `Chip`.
 
         Arguments:
 
-          chip: The chip to which the input belongs
+          chip: The chip to which the output belongs
 
           name: The name of the output (used in Verilog code)
 
-          type_: The data type of the stimulus, "int", "long", "float"
-          or "double"
+          type_: The data type of the output, "int", "long", "float" or
+          "double"
 
-          sequence: A sequence object for example a list or an generator function
+          capacity: (optional) The largest number of items held in the queue,
+          None for no limit
+
+          width: (optional) The width of the output in bits, 32 or 64
 
         Returns:
 
-            A `Stimulus` instance.
+            A `QueueOutput` instance.
 
         """
 
-        Input.__init__(self, chip, name)
-        self.sequence = sequence
+        Output.__init__(self, chip, name, width)
         self.type_ = type_
-        self.high_word = False
+        self.capacity = capacity
+        self.queue = collections.deque()
+        self.words = []
         _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
 
     def simulation_reset(self):
@@ -1349,188 +3411,158 @@ class Stimulus(Input):
         Use Chip.simulation_reset() instead
         """
 
-        self.iterator = itertools.cycle(iter(self.sequence))
-        self.high_word = False
-        Input.simulation_reset(self)
+        self.queue.clear()
+        self.words = []
+        self.dst_rdy = True
 
-    def data_source(self):
+    def simulation_update(self):
         """
         This is a private function, you shouldn't need to call this directly.
+        Use Chip.simulation_update() instead
         """
 
-        if self.type_ == "int":
-            return next(self.iterator)
-
-        elif self.type_ == "long":
-
-            if self.high_word:
-                self.high_word = not self.high_word
-                word = self.high
-                return word
-            else:
-                self.high_word = not self.high_word
-                long_word = next(self.iterator)
-                self.high = high_word(long_word)
-                low = low_word(long_word)
-                return low
+        Output.simulation_update(self)
+        self.dst_rdy = not self.full
 
-        elif self.type_ == "float":
+    def data_sink(self, value):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        """
 
-            return float_to_bits(next(self.iterator))
+        if _wide(self, self.type_):
+            self.words = [low_word(value), high_word(value)]
+        else:
+            self.words.append(value)
+        if len(self.words) == _words_per_item(self.type_):
+            self.queue.append(_from_words(self.words, self.type_))
+            self.words = []
 
-        elif self.type_ == "double":
+    @property
+    def full(self):
+        """True if the queue holds capacity items"""
 
-            if self.high_word:
-                self.high_word = not self.high_word
-                word = self.high
-                return word
-            else:
-                self.high_word = not self.high_word
-                long_word = double_to_bits(next(self.iterator))
-                self.high = high_word(long_word)
-                low = low_word(long_word)
-                return low
+        return self.capacity is not None and len(self.queue) >= self.capacity
 
-    def __iter__(self):
-        """
-        This is a private function, you shouldn't need to call this directly.
-        __iter__() provides an iterator like interface so that you can use
-        functions like iter(), next() or iterate through with a for loop.
-        """
+    def get(self):
+        """Remove and return the oldest item in the queue"""
 
-        return iter(self.sequence)
+        return self.queue.popleft()
 
     def __len__(self):
         """
         This is a private function, you shouldn't need to call this directly.
-        __len__() allows the len() function to be used.
+        __len__() gives the number of items waiting in the queue.
         """
 
-        return len(self.sequence)
+        return len(self.queue)
 
 
-class Response(Output):
+class ReportBuffer:
 
     """
 
-    Response
-    --------
+    ReportBuffer
+    ------------
 
-    Response is a subclass of Output. A Response output provides a convenient
-    means to extract data to the Chips simulation. A response behaves as a
-    Python iterator.
+    A ReportBuffer collects the values reported by components during a
+    simulation, see `Chip.set_report_sink`. The reports are stored in
+    columns, each a list with one entry per report: `time`, `instance`,
+    `file`, `line`, `type_` and `value`.
 
     .. code-block:: python
 
-        from chips.api.api import Response
-
-        mychip = Chip("a chip")
-        ...
-
-        sinx = Response(mychip, "sinx", "int")
+        from chips.api.api import ReportBuffer
 
+        reports = ReportBuffer()
+        mychip.set_report_sink(reports)
         mychip.simulation_reset()
         mychip.simulation_run()
+        assert reports.value == [1, 2, 3]
 
-        plot(sinx)
+    A ReportBuffer can also pass each report on to another sink, for example
+    to print the reports as they are collected:
+
+    .. code-block:: python
+
+        from chips.compiler.python_model import print_report
+
+        reports = ReportBuffer(print_report)
 
     """
 
-    def __init__(self, chip, name, type_):
+    def __init__(self, sink=None):
         """
         Synopsis:
 
             .. code-block:: python
 
-                from chips.api.api import Response
-                Response(chip, name, type_)
+                from chips.api.api import ReportBuffer
+                ReportBuffer(sink=None)
 
         Description:
 
-            Create a `Response` within a `Chip`
+            Create an empty `ReportBuffer`.
 
         Arguments:
 
-          chip: The chip to which the input belongs
-
-          name: The name of the output (used in Verilog code)
-
-          type_: The data type of the stimulus, "int", "long", "float"
-          or "double"
+          sink: (optional) Another sink, called with each report
 
         Returns:
 
-            A `Response` instance.
+            A `ReportBuffer` instance.
 
         """
 
-        Output.__init__(self, chip, name)
-        self.type_ = type_
-        self.high_word = False
-        _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
+        self.sink = sink
+        self.clear()
 
-    def simulation_reset(self):
-        """
-        This is a private function, you shouldn't need to call this directly.
-        Use Chip.simulation_reset() instead
-        """
+    def clear(self):
+        """Remove all the reports"""
 
-        self.l = []
-        self.times = []
-        Output.simulation_reset(self)
-        self.high_word = False
+        self.time = []
+        self.instance = []
+        self.file = []
+        self.line = []
+        self.type_ = []
+        self.value = []
 
-    def data_sink(self, value):
+    def __call__(self, time, instance, filename, lineno, type_, value):
         """
         This is a private function, you shouldn't need to call this directly.
+        Store a report.
         """
 
-        if self.type_ == "int":
-
-            self.l.append(value)
-            self.times.append(self.chip.time)
-
-        elif self.type_ == "long":
-
-            if self.high_word:
-                self.high_word = not self.high_word
-                self.l.append(join_words(value, self.low))
-                self.times.append(self.chip.time)
-            else:
-                self.high_word = not self.high_word
-                self.low = value
-
-        elif self.type_ == "float":
-
-            self.l.append(bits_to_float(value))
-            self.times.append(self.chip.time)
-
-        elif self.type_ == "double":
-
-            if self.high_word:
-                self.high_word = not self.high_word
-                self.l.append(bits_to_double(join_words(value, self.low)))
-                self.times.append(self.chip.time)
-            else:
-                self.high_word = not self.high_word
-                self.low = value
+        self.time.append(time)
+        self.instance.append(instance)
+        self.file.append(filename)
+        self.line.append(lineno)
+        self.type_.append(type_)
+        self.value.append(value)
+        if self.sink is not None:
+            self.sink(time, instance, filename, lineno, type_, value)
 
     def __iter__(self):
         """
         This is a private function, you shouldn't need to call this directly.
-        __iter__() provides an iterator like interface so that you can use
-        functions like iter(), next() or iterate through with a for loop.
+        Iterate over the reports as (time, instance, file, line, type_,
+        value) tuples.
         """
 
-        return iter(self.l)
+        return itertools.izip(
+            self.time,
+            self.instance,
+            self.file,
+            self.line,
+            self.type_,
+            self.value)
 
     def __len__(self):
         """
         This is a private function, you shouldn't need to call this directly.
-        __len__() allows the len() function to be used.
+        __len__() gives the number of reports.
         """
 
-        return len(self.l)
+        return len(self.value)
 
 
 class VerilogComponent(Component):
@@ -1552,8 +3584,8 @@ class VerilogComponent(Component):
 
     """
 
-    def __init__(self, C_file, V_file, options={}, inline=False):
-        Component.__init__(self, C_file, options, inline)
+    def __init__(self, C_file, V_file, options={}, inline=False, model=None):
+        Component.__init__(self, C_file, options, inline, model)
 
         """
 
@@ -1585,6 +3617,9 @@ class VerilogComponent(Component):
           inline: When true treat C_file and V_file as the source code,
           otherwise treat them as filenames
 
+          model: (optional) A generator function, or a function returning a
+          simulation model, used in simulation in place of the C code
+
         Returns:
 
             A `VerilogComponent` .
@@ -1661,7 +3696,7 @@ class _Verilog_Instance(_Instance):
             self, component, chip, parameters, inputs, outputs, debug, profile)
         _, self.filename, self.lineno, _, _, _ = inspect.stack()[1]
 
-    def generate_verilog(self):
+    def generate_verilog(self, shared_fpu=False):
         """
         This is a private function, you shouldn't need to call this directly.
         """
@@ -1671,3 +3706,155 @@ class _Verilog_Instance(_Instance):
         f1.write(f.read().format(name=self.component_name))
         f.close()
         f1.close()
+        return []
+
+
+class PythonComponent:
+
+    """
+
+    PythonComponent
+    ---------------
+
+    A PythonComponent is a component written entirely in Python. This is
+    useful for parts of a testbench, such as channel models, golden reference
+    models or stubs for parts of a design that have not been written yet. A
+    Python model simulates much faster than C code.
+
+    The model is a generator function, which is called with the parameters
+    of the instance, and yields read, write and wait requests in the same way
+    as the behavioural model of a `Component`:
+
+    .. code-block:: python
+
+        def scaler(parameters):
+            while True:
+                data = yield ("read", "in", "float")
+                yield ("wait", parameters["latency"])
+                yield ("write", "out", data * parameters["gain"], "float")
+
+        scaler_component = PythonComponent(scaler)
+        scaler_component(
+            chip,
+            inputs = {"in":a},
+            outputs = {"out":z},
+            parameters = {"gain":0.5, "latency":10}
+        )
+
+    The ports of each instance are those passed to it. A PythonComponent can
+    only be simulated, unless Verilog is supplied for synthesis using the
+    V_file argument, as for a `VerilogComponent`.
+
+    """
+
+    def __init__(self, model, V_file=None, inline=False):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               from chips.api.api import PythonComponent
+               PythonComponent(model, V_file=None, inline=False)
+
+        Description:
+
+            Create a `PythonComponent`.
+
+        Arguments:
+
+          model: A generator function used to simulate the component.
+
+          V_file: (optional) A string containing either the filename of the
+          Verilog code, or the Verilog code itself. Filenames are relative to
+          the directory containing the Python module instancing the component.
+
+          inline: When true treat V_file as the source code, otherwise treat
+          it as a filename
+
+        Returns:
+
+            A `PythonComponent`.
+
+        """
+
+        self.model = model
+        self.C_file = None
+        self.V_file = None
+        self.options = {}
+
+        if V_file is None:
+            pass
+        elif inline:
+            self.tempdir = tempfile.mkdtemp()
+            self.V_file = os.path.join(self.tempdir, "inline_v_file.v")
+            f = open(self.V_file, "w")
+            f.write(textwrap.dedent(V_file).strip())
+            f.close()
+        else:
+            caller = inspect.stack()[1]
+            caller_module = inspect.getmodule(caller[0])
+            caller_location = os.path.dirname(caller_module.__file__)
+            self.V_file = os.path.join(caller_location, V_file)
+
+    def __del__(self):
+        if hasattr(self, "tempdir"):
+            shutil.rmtree(self.tempdir)
+
+    def __call__(self, chip, inputs, outputs, parameters={}):
+        """
+
+        Synopsis:
+
+            .. code-block:: python
+
+               component_instance(chip, inputs, output, parameters={})
+
+        Description:
+
+            Create an instance of a `PythonComponent`, connect inputs and
+            outputs.
+
+        Arguments:
+
+          chip: The chip to which the input belongs
+
+          inputs: A dictionary of `Wire` or `Input` mappings.
+
+          outputs: A dictionary of `Wire` or `Output` mappings.
+
+          parameters: An optional dictionary of parameters passed to the
+          model.
+
+        Returns:
+
+            A python component instance.
+
+        """
+
+        return _Python_Instance(
+            self,
+            chip,
+            parameters,
+            inputs,
+            outputs
+        )
+
+
+class _Python_Instance(_Verilog_Instance):
+
+    """This class represents a component instance. You don't normally need to
+    create them directly, use the PythonComponent.__call__ method."""
+
+    def generate_verilog(self, shared_fpu=False):
+        """
+        This is a private function, you shouldn't need to call this directly.
+        """
+
+        if self.component.V_file is None:
+            raise C2CHIPError(
+                "%s is a PythonComponent with no V_file, it can't be "
+                "converted to Verilog" % self.component_name,
+                self.filename,
+                self.lineno)
+        return _Verilog_Instance.generate_verilog(self)
@@ -20,16 +20,20 @@ class Allocator:
         self.handle = 0
         self.input_names = {}
         self.output_names = {}
+        self.input_widths = {}
+        self.output_widths = {}
 
-    def new_input(self, name):
+    def new_input(self, name, width=32):
         handle = self.handle
         self.handle += 1
         self.input_names[handle] = name
+        self.input_widths[name] = width
         return handle
 
-    def new_output(self, name):
+    def new_output(self, name, width=32):
         handle = self.handle
         self.handle += 1
         self.output_names[handle] = name
+        self.output_widths[name] = width
         return handle
 
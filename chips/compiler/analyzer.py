@@ -0,0 +1,472 @@
+"""
+Static analysis of the instruction stream.
+
+Estimate the stack usage and execution time of each function, using the
+clock cycle latencies of the area optimised (verilog_area) implementation.
+"""
+
+__author__ = "Jon Dawson"
+__copyright__ = "Copyright (C) 2015, Jonathan P Dawson"
+__version__ = "0.1"
+
+from chips.compiler.exceptions import C2CHIPError
+from chips.compiler.register_map import tos, frame
+from chips.compiler.verilog_area import instruction_latency, branch_penalty
+from chips.compiler.verilog_area import stream_operations, block_operations
+from chips.compiler.verilog_area import block_stream_operations
+from chips.compiler.verilog_area import predict_taken
+
+conditional_branches = ["jmp_if_false", "jmp_if_true"]
+
+
+class Routine:
+
+    """A function (or shared macro) found in the instruction stream"""
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+        self.instructions = []
+        self.labels = {}
+        self.loop_bounds = {}
+        self.calls = []
+        self.stack = 0
+        self.cycles = 0
+        self.wcet = 0
+        self.recursive = False
+        self.unbounded_loops = []
+        self.unbounded_blocks = []
+        self.blocking = False
+
+
+def split_routines(instructions):
+    """Split the instruction stream into routines
+
+    The instructions before the first function are the start up code, which
+    initialises globals, calls main and stops.
+    """
+
+    start = Routine("<start>", instructions[0]["trace"])
+    routines = {"<start>": start}
+    routine = start
+    pending = []
+    for instruction in instructions:
+        if instruction["op"] == "label":
+            label = instruction["label"]
+            if label.startswith("function_") or label.startswith(
+                    "macro_routine_"):
+                routine = Routine(label, instruction["trace"])
+                routine.label = label
+                routines[label] = routine
+                continue
+
+            # labels refer to the next real instruction
+            pending.append(instruction)
+            continue
+
+        # name functions after the first statement found in their body
+        if routine.name.startswith("function_"):
+            function = getattr(instruction["trace"], "function", None)
+            if "function_%s" % id(function) == routine.name:
+                routine.name = function.name
+
+        for label in pending:
+            routine.labels[label["label"]] = len(routine.instructions)
+            if "loop_bound" in label:
+                routine.loop_bounds[len(routine.instructions)] = label[
+                    "loop_bound"]
+        pending = []
+        routine.instructions.append(instruction)
+
+    for label in pending:
+        routine.labels[label["label"]] = len(routine.instructions)
+
+    return routines
+
+
+def successors(routine, i):
+    """The instructions which may follow instruction i
+
+    Returns a list of (instruction, taken) tuples, taken is true if the
+    pipeline is flushed on the way.
+    """
+
+    instruction = routine.instructions[i]
+    op = instruction["op"]
+    if op in ["return", "stop"]:
+        return []
+    elif op == "goto":
+        return [(routine.labels[instruction["label"]], True)]
+    elif op in conditional_branches:
+        return [(i + 1, False), (routine.labels[instruction["label"]], True)]
+    else:
+        return [(i + 1, False)]
+
+
+def stack_offsets(routine):
+    """Calculate the stack pointer, relative to the frame, at each instruction
+
+    Returns the largest offset used, and the offset at each call.
+    """
+
+    offsets = {0: 0}
+    pending = [0]
+    largest = 0
+    while pending:
+        i = pending.pop()
+        if i >= len(routine.instructions):
+            continue
+        instruction = routine.instructions[i]
+        offset = offsets[i]
+        if instruction.get("z") == tos and (
+                instruction["op"] not in block_operations):
+            if instruction["op"] == "addl" and instruction["a"] == tos:
+                offset += instruction["literal"]
+            elif instruction["op"] == "addl" and instruction["a"] == frame:
+                offset = instruction["literal"]
+            elif instruction["op"] == "literal":
+                offset = instruction["literal"]
+            else:
+                raise C2CHIPError(
+                    "Can't follow stack pointer in %s" % routine.name,
+                    instruction["trace"].filename,
+                    instruction["trace"].lineno)
+        largest = max(largest, offset)
+        for successor, taken in successors(routine, i):
+            if successor not in offsets or offsets[successor] < offset:
+                offsets[successor] = offset
+                pending.append(successor)
+
+    return largest, offsets
+
+
+def find_loops(routine, edges):
+    """Find the natural loops of a routine
+
+    Returns a dictionary mapping each loop header to the set of instructions
+    in the loop.
+    """
+
+    # find back edges using a depth first search
+    back_edges = []
+    visited = set()
+    on_stack = set()
+    stack = [(0, iter(edges.get(0, [])))]
+    visited.add(0)
+    on_stack.add(0)
+    while stack:
+        node, children = stack[-1]
+        for child, weight in children:
+            if child in on_stack:
+                back_edges.append((node, child))
+            elif child not in visited:
+                visited.add(child)
+                on_stack.add(child)
+                stack.append((child, iter(edges.get(child, []))))
+                break
+        else:
+            stack.pop()
+            on_stack.remove(node)
+
+    predecessors = {}
+    for node, children in edges.iteritems():
+        for child, weight in children:
+            predecessors.setdefault(child, []).append(node)
+
+    loops = {}
+    for tail, header in back_edges:
+        body = loops.setdefault(header, set([header]))
+        pending = [tail]
+        while pending:
+            node = pending.pop()
+            if node not in body:
+                body.add(node)
+                pending.extend(predecessors.get(node, []))
+
+    return loops
+
+
+def longest_path(nodes, entry, costs, edges, stop_at=None):
+    """Find the longest path through an acyclic graph
+
+    Only nodes within nodes are considered. If stop_at is given, paths end
+    when an edge leads to stop_at. Returns the cost of the longest path ending
+    at an exit from nodes, and the cost of the longest path ending at stop_at.
+    """
+
+    # topological order
+    order = []
+    visited = set()
+    stack = [(entry, iter(edges.get(entry, [])))]
+    visited.add(entry)
+    while stack:
+        node, children = stack[-1]
+        for child, weight in children:
+            if child in nodes and child not in visited and child != stop_at:
+                visited.add(child)
+                stack.append((child, iter(edges.get(child, []))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    order.reverse()
+
+    distance = {entry: 0}
+    exit_cost = 0
+    loop_cost = 0
+    for node in order:
+        if node not in distance:
+            continue
+        cost = distance[node] + costs[node]
+        children = edges.get(node, [])
+        if not children:
+            exit_cost = max(exit_cost, cost)
+        for child, weight in children:
+            if child == stop_at:
+                loop_cost = max(loop_cost, cost + weight)
+            elif child in nodes:
+                if distance.get(child, -1) < cost + weight:
+                    distance[child] = cost + weight
+            else:
+                exit_cost = max(exit_cost, cost + weight)
+
+    return exit_cost, loop_cost
+
+
+def block_length(routine, i):
+    """The number of words moved by the block instruction at i, or None
+
+    The number is known when it is loaded as a literal earlier in the same
+    straight line of instructions, the stack operations in between don't
+    change it.
+    """
+
+    register = routine.instructions[i]["b"]
+    targets = set(routine.labels.values())
+    while i and i not in targets:
+        i -= 1
+        instruction = routine.instructions[i]
+        if instruction["op"] == "call":
+            return None
+        if instruction.get("z") == register and (
+                instruction["op"] not in block_operations):
+            if instruction["op"] == "literal":
+                return instruction["literal"] & 0xffff
+            return None
+    return None
+
+
+def routine_cycles(routine, routines, options, bounded):
+    """Find the longest path through a routine in clock cycles
+
+    If bounded is false, loops are ignored and the longest acyclic path is
+    returned. If bounded is true, each loop is assumed to execute the number
+    of times given by its loop_bound pragma, None is returned if any loop is
+    unbounded. The block instructions take a clock for each word, the number
+    of words is found by block_length, otherwise they are treated like an
+    unbounded loop.
+    """
+
+    costs = {}
+    edges = {}
+    for i, instruction in enumerate(routine.instructions):
+        op = instruction["op"]
+        cost = instruction_latency(op, options, worst_case=True)
+        if op in block_operations:
+            length = block_length(routine, i)
+            if length is not None:
+                cost += length
+            elif bounded:
+                routine.unbounded_blocks.append(instruction["trace"])
+                return None
+        backward = routine.labels.get(instruction.get("label"), i + 1) <= i
+        predicted = predict_taken(op, backward, options)
+        if op == "call":
+            callee = routines[instruction["label"]]
+            callee_cost = callee.wcet if bounded else callee.cycles
+            if callee_cost is None:
+                return None
+            cost += callee_cost
+            if not predicted:
+                cost += branch_penalty
+        elif op == "return":
+            cost += branch_penalty
+        costs[i] = cost
+        edges[i] = [(j, branch_penalty if taken != predicted else 0)
+                    for j, taken in successors(routine, i)
+                    if j < len(routine.instructions)]
+
+    loops = find_loops(routine, edges)
+
+    if not bounded:
+        # remove back edges to leave an acyclic graph
+        for header, body in loops.iteritems():
+            for node in body:
+                edges[node] = [(child, weight)
+                               for child, weight in edges[node]
+                               if child != header]
+        nodes = set(costs.keys())
+        exit_cost, loop_cost = longest_path(nodes, 0, costs, edges)
+        return exit_cost
+
+    # replace loops with a single node, innermost first
+    for header, body in sorted(loops.items(), key=lambda x: len(x[1])):
+        if header not in routine.loop_bounds:
+            trace = routine.instructions[header]["trace"]
+            routine.unbounded_loops.append(trace)
+            return None
+        exit_cost, iteration_cost = longest_path(
+            body, header, costs, edges, stop_at=header)
+        bound = routine.loop_bounds[header]
+        costs[header] = (bound + 1) * max(exit_cost, iteration_cost)
+
+        # the header now stands for the whole loop
+        exits = []
+        for node in body:
+            for child, weight in edges[node]:
+                if child not in body:
+                    exits.append((child, weight))
+        edges[header] = exits
+        for node in body:
+            if node != header:
+                del costs[node]
+                del edges[node]
+        for node, children in edges.iteritems():
+            edges[node] = [(child, weight) for child, weight in children
+                           if child == header or child not in body]
+        for outer_header, outer_body in loops.iteritems():
+            if outer_header != header and header in outer_body:
+                outer_body -= body
+                outer_body.add(header)
+
+    nodes = set(costs.keys())
+    exit_cost, loop_cost = longest_path(nodes, 0, costs, edges)
+    return exit_cost
+
+
+def call_order(routines):
+    """Order routines so that callees come before their callers
+
+    Routines which are part of a cycle in the call graph are marked as
+    recursive.
+    """
+
+    order = []
+    state = {}
+
+    def visit(label, path):
+        state[label] = "visiting"
+        for callee in routines[label].calls:
+            if state.get(callee) == "visiting":
+                for recursive in path[path.index(callee):]:
+                    routines[recursive].recursive = True
+            elif callee not in state:
+                visit(callee, path + [callee])
+        state[label] = "done"
+        order.append(label)
+
+    visit("<start>", ["<start>"])
+    return order
+
+
+def analyze(instructions, options={}):
+    """Analyse the expanded instructions of a process
+
+    Returns a dictionary of routines keyed by label. For each routine:
+
+    + stack is the largest number of words of stack used by the routine and
+    the routines it calls, None if the routine is recursive.
+    + cycles is the longest path through the routine in clock cycles,
+    ignoring loops.
+    + wcet is the worst case execution time in clock cycles, using the
+    loop_bound pragmas, None if any loop is unbounded.
+
+    The <start> routine includes the globals, and the call to main, so its
+    stack is the amount of memory needed by the whole process.
+    """
+
+    routines = split_routines(instructions)
+
+    for routine in routines.values():
+        for instruction in routine.instructions:
+            if instruction["op"] == "call":
+                routine.calls.append(instruction["label"])
+            if instruction["op"] in (
+                    stream_operations + block_stream_operations +
+                    ["wait_clocks"]):
+                routine.blocking = True
+
+    # callees are analysed before callers
+    for label in call_order(routines):
+        routine = routines[label]
+        largest, offsets = stack_offsets(routine)
+        routine.stack = largest
+        for i, instruction in enumerate(routine.instructions):
+            if instruction["op"] == "call":
+                callee = routines[instruction["label"]]
+                if routine.recursive or callee.stack is None:
+                    routine.stack = None
+                    break
+                routine.stack = max(
+                    routine.stack, offsets.get(i, 0) + callee.stack)
+        if routine.recursive:
+            routine.stack = None
+            routine.cycles = None
+            routine.wcet = None
+        else:
+            routine.cycles = routine_cycles(routine, routines, options, False)
+            routine.wcet = routine_cycles(routine, routines, options, True)
+        routine.blocking = routine.blocking or any(
+            routines[i].blocking for i in routine.calls)
+
+    return routines
+
+
+def safe_memory_size(routines):
+    """The smallest memory size that can hold the globals and stack"""
+
+    start = routines["<start>"]
+    if start.stack is None:
+        recursive = sorted(
+            [i for i in routines.values() if i.recursive],
+            key=lambda x: x.name)
+        trace = recursive[0].trace if recursive else start.trace
+        raise C2CHIPError(
+            "memory_size=auto can't be used with recursive functions: %s" %
+            ", ".join([i.name for i in recursive]),
+            trace.filename,
+            trace.lineno)
+    return max(start.stack, 1)
+
+
+def report_analysis(routines):
+    """Print a table of stack usage and execution time for each routine"""
+
+    def show(value):
+        if value is None:
+            return "unbounded"
+        return str(value)
+
+    print "Static Analysis"
+    print "==============="
+    print
+    print "%-30s %10s %12s %12s %s" % (
+        "function", "stack", "cycles", "wcet", "notes")
+    for label, routine in sorted(
+            routines.items(), key=lambda x: x[1].name):
+        notes = []
+        if routine.recursive:
+            notes.append("recursive")
+        for trace in routine.unbounded_loops:
+            notes.append("no loop_bound at line %s" % trace.lineno)
+        for trace in routine.unbounded_blocks:
+            notes.append("block of unknown length at line %s" % trace.lineno)
+        if routine.blocking:
+            notes.append("excludes time blocked on I/O and waits")
+        print "%-30s %10s %12s %12s %s" % (
+            routine.name,
+            show(routine.stack),
+            show(routine.cycles),
+            show(routine.wcet),
+            ", ".join(notes))
+    print
@@ -10,7 +10,14 @@ import sys
 from chips.compiler.parser import Parser
 from chips.compiler.exceptions import C2CHIPError
 from chips.compiler.macro_expander import expand_macros
+from chips.compiler.analyzer import analyze, report_analysis
+from chips.compiler.analyzer import safe_memory_size
+from chips.compiler.profiler import size_report, print_size_report
+from chips.compiler.profiler import save_size_report, load_size_report
+from chips.compiler.profiler import diff_size_report
 from chips.compiler.verilog_area import generate_CHIP as generate_CHIP_area
+from chips.compiler.verilog_area import output_buffer_size
+from chips.compiler.verilog_speed import generate_CHIP as generate_CHIP_speed
 from chips.compiler.python_model import generate_python_model
 import fpu
 
@@ -29,22 +36,58 @@ def generate_library():
     output_file.write(fpu.double_to_long)
     output_file.write(fpu.float_to_double)
     output_file.write(fpu.double_to_float)
+    output_file.write(fpu.pipelined_adder)
+    output_file.write(fpu.pipelined_multiplier)
+    output_file.write(fpu.fpu_pipeline_register)
     output_file.close()
 
 
+def parse_options(options):
+    """Convert a list of command line style options into a dictionary
+
+    Options of the form key=value are given a value, other options are set
+    to True. Dictionaries are returned unchanged.
+    """
+
+    if hasattr(options, "items"):
+        return options
+    parsed = {}
+    for option in options:
+        if "=" in option:
+            key, value = option.split("=", 1)
+            parsed[key] = value
+        else:
+            parsed[option] = True
+    return parsed
+
+
 def comp(input_file, options={}, parameters={}, sn=0):
 
+    name, inputs, outputs, documentation, shared_units = comp_shared(
+        input_file, options, parameters, sn)
+    return name, inputs, outputs, documentation
+
+
+def comp_shared(input_file, options={}, parameters={}, sn=0):
+    """Compile a component to Verilog, like comp
+
+    Also returns the floating point cores which the component shares with
+    the rest of the chip, when the shared_fpu option is given.
+    """
+
+    options = parse_options(options)
     reuse = "no_reuse" not in options
     initialize_memory = "no_initialize_memory" not in options
     generate_library()
 
     try:
-            # Optimize for area
+            # Optimize for area or speed
             parser = Parser(input_file, reuse, initialize_memory, parameters)
             process = parser.parse_process()
             name = process.main.name + "_%s" % sn
             instructions = process.generate()
-            instructions = expand_macros(instructions, parser.allocator)
+            instructions = expand_macros(
+                instructions, parser.allocator, options)
             if "dump" in options:
                 for i in instructions:
                     print (
@@ -55,16 +98,40 @@ def comp(input_file, options={}, parameters={}, sn=0):
                         i.get("literal", "-"),
                         i.get("trace"),
                     )
+            memory_size = options.get("memory_size", 4096)
+            sizes = "size_report" in options or "size_diff" in options
+            if "analysis" in options or memory_size == "auto" or sizes:
+                routines = analyze(instructions, options)
+                if "analysis" in options:
+                    report_analysis(routines)
+                if memory_size == "auto":
+                    memory_size = safe_memory_size(routines)
+            if sizes:
+                report = size_report(instructions, process, routines)
+                print_size_report(report)
+                if options.get("size_report", True) is not True:
+                    save_size_report(report, options["size_report"])
+                if "size_diff" in options:
+                    previous = load_size_report(options["size_diff"])
+                    if diff_size_report(previous, report):
+                        raise C2CHIPError(
+                            "Size has increased since %s" %
+                            options["size_diff"])
+            if "speed" in options:
+                generate_CHIP = generate_CHIP_speed
+            else:
+                generate_CHIP = generate_CHIP_area
             output_file = name + ".v"
-            output_file = open(output_file, "w")
-            inputs, outputs = generate_CHIP_area(
+            output_file = open(output_file, "w", output_buffer_size)
+            inputs, outputs, shared_units = generate_CHIP(
                 input_file,
                 name,
                 instructions,
                 output_file,
                 parser.allocator,
                 initialize_memory,
-                int(options.get("memory_size", 4096)))
+                int(memory_size),
+                options=options)
             output_file.close()
 
     except C2CHIPError as err:
@@ -72,7 +139,7 @@ def comp(input_file, options={}, parameters={}, sn=0):
         print err.message
         sys.exit(-1)
 
-    return name, inputs, outputs, ""
+    return name, inputs, outputs, "", shared_units
 
 
 def compile_python_model(
@@ -86,6 +153,7 @@ def compile_python_model(
         sn=0,
 ):
 
+    options = parse_options(options)
     generate_library()
 
     try:
@@ -94,11 +162,15 @@ def compile_python_model(
             process = parser.parse_process()
             name = process.main.name + "_%u" % sn
             instructions = process.generate()
-            instructions = expand_macros(instructions, parser.allocator)
+            instructions = expand_macros(
+                instructions, parser.allocator, options)
             if "dump" in options:
                 for i in instructions:
                     print i
 
+            if "analysis" in options:
+                report_analysis(analyze(instructions, options))
+
             debug = debug or ("debug" in options)
             profile = profile or ("profile" in options)
             model = generate_python_model(
@@ -109,7 +181,8 @@ def compile_python_model(
                 parser.allocator,
                 inputs,
                 outputs,
-                profile)
+                profile,
+                options)
 
             return (
                 model,
@@ -48,6 +48,28 @@ class StopSim(Exception):
     pass
 
 
+class Deadlock(Exception):
+
+    """
+    Every running process is blocked waiting for another to transfer data
+
+    blocked is a list of (instance, filename, lineno, wire) tuples describing
+    each blocked process.
+    """
+
+    def __init__(self, time, blocked):
+        self.time = time
+        self.blocked = blocked
+        self.message = "Deadlock at time %u" % time
+
+    def __str__(self):
+        lines = [self.message]
+        for instance, filename, lineno, wire in self.blocked:
+            lines.append("  %s is blocked at line %s in file %s, %s" % (
+                instance, lineno, filename, wire))
+        return "\n".join(lines)
+
+
 class BreakSim(Exception):
 
     """
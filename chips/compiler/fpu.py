@@ -2542,3 +2542,458 @@ module double_to_float(
 endmodule
 
 """
+pipelined_adder = """//IEEE Floating Point Adder (Single Precision, Pipelined)
+//Copyright (C) Jonathan P Dawson 2013
+//
+//A new pair of operands can be accepted, and a result produced, on every
+//clock. The addition is divided into five steps, unpack, align, add,
+//normalise and round. STAGES (1 to 5) of the boundaries between the steps
+//are registered, so the latency is STAGES clocks. When the result is not
+//accepted, the whole pipeline stalls.
+
+module pipelined_adder(
+        input_a,
+        input_b,
+        input_a_stb,
+        input_b_stb,
+        output_z_ack,
+        clk,
+        rst,
+        output_z,
+        output_z_stb,
+        input_a_ack,
+        input_b_ack);
+
+  parameter STAGES = 5;
+
+  input     clk;
+  input     rst;
+
+  input     [31:0] input_a;
+  input     input_a_stb;
+  output    input_a_ack;
+
+  input     [31:0] input_b;
+  input     input_b_stb;
+  output    input_b_ack;
+
+  output    [31:0] output_z;
+  output    output_z_stb;
+  input     output_z_ack;
+
+  wire      enable;
+  wire      accept;
+
+  //both operands are accepted together
+  assign enable = !output_z_stb || output_z_ack;
+  assign accept = input_a_stb && input_b_stb && enable;
+  assign input_a_ack = input_b_stb && enable;
+  assign input_b_ack = input_a_stb && enable;
+
+  //unpack
+  wire      [31:0] x, y;
+  wire      x_nan, y_nan, x_inf, y_inf;
+  reg       [32:0] u_special;
+
+  //the operand with the larger magnitude is x
+  assign x = input_a[30:0] >= input_b[30:0] ? input_a : input_b;
+  assign y = input_a[30:0] >= input_b[30:0] ? input_b : input_a;
+  assign x_nan = x[30:23] == 255 && x[22:0] != 0;
+  assign y_nan = y[30:23] == 255 && y[22:0] != 0;
+  assign x_inf = x[30:23] == 255 && x[22:0] == 0;
+  assign y_inf = y[30:23] == 255 && y[22:0] == 0;
+
+  always @*
+  begin
+    if (x_nan || y_nan || (x_inf && y_inf && x[31] != y[31])) begin
+      u_special = {1'b1, 32'hffc00000};
+    end else if (x_inf) begin
+      u_special = {1'b1, x};
+    end else begin
+      u_special = 0;
+    end
+  end
+
+  wire      [98:0] u_out, a_in;
+  wire      a_valid;
+  assign u_out = {
+    u_special,
+    x[31],
+    (x[30:23] == 0 ? 8'd1 : x[30:23]),
+    (x[30:23] != 0), x[22:0],
+    y[31],
+    (y[30:23] == 0 ? 8'd1 : y[30:23]),
+    (y[30:23] != 0), y[22:0]};
+
+  fpu_pipeline_register #(.WIDTH(99), .REGISTERED(
+    (1 * STAGES) / 5 != (0 * STAGES) / 5)) unpack_register(
+    clk, rst, enable, accept, u_out, a_valid, a_in);
+
+  //align
+  wire      [32:0] a_special;
+  wire      a_x_s, a_y_s;
+  wire      [7:0] a_x_e, a_y_e, a_d;
+  wire      [23:0] a_x_m, a_y_m;
+  wire      [26:0] a_y_shifted;
+  wire      a_sticky;
+  assign {a_special, a_x_s, a_x_e, a_x_m, a_y_s, a_y_e, a_y_m} = a_in;
+  assign a_d = a_x_e - a_y_e;
+  assign a_y_shifted = a_d > 26 ? 27'd0 : {a_y_m, 3'd0} >> a_d;
+  assign a_sticky = a_d > 26 ? a_y_m != 0 :
+    ({a_y_m, 3'd0} & ~(27'h7ffffff << a_d)) != 0;
+
+  wire      [96:0] a_out, s_in;
+  wire      s_valid;
+  assign a_out = {
+    a_special,
+    a_x_s,
+    a_x_s != a_y_s,
+    a_x_e,
+    {a_x_m, 3'd0},
+    a_y_shifted | a_sticky};
+
+  fpu_pipeline_register #(.WIDTH(97), .REGISTERED(
+    (2 * STAGES) / 5 != (1 * STAGES) / 5)) align_register(
+    clk, rst, enable, a_valid, a_out, s_valid, s_in);
+
+  //add
+  wire      [32:0] s_special;
+  wire      s_x_s, s_subtract;
+  wire      [7:0] s_e;
+  wire      [26:0] s_x_m, s_y_m;
+  wire      [27:0] s_sum;
+  assign {s_special, s_x_s, s_subtract, s_e, s_x_m, s_y_m} = s_in;
+  assign s_sum = s_subtract ? s_x_m - s_y_m : s_x_m + s_y_m;
+
+  wire      [70:0] s_out, n_in;
+  wire      n_valid;
+  //an exact zero is positive unless both operands are negative
+  assign s_out = {
+    s_special,
+    (s_sum == 0 && s_subtract) ? 1'b0 : s_x_s,
+    {1'b0, s_e},
+    s_sum};
+
+  fpu_pipeline_register #(.WIDTH(71), .REGISTERED(
+    (3 * STAGES) / 5 != (2 * STAGES) / 5)) add_register(
+    clk, rst, enable, s_valid, s_out, n_valid, n_in);
+
+  //normalise
+  wire      [32:0] n_special;
+  wire      n_s;
+  wire      [8:0] n_e;
+  wire      [27:0] n_sum;
+  reg       [4:0] n_zeros;
+  reg       [8:0] n_shift;
+  reg       [26:0] n_m;
+  reg       [9:0] n_z_e;
+  integer   i;
+  assign {n_special, n_s, n_e, n_sum} = n_in;
+
+  always @*
+  begin
+    n_zeros = 27;
+    for (i = 0; i <= 26; i = i + 1) begin
+      if (n_sum[i]) begin
+        n_zeros = 26 - i;
+      end
+    end
+    //stop at the smallest exponent, leaving a denormal
+    n_shift = n_zeros < n_e ? n_zeros : n_e - 1;
+    if (n_sum[27]) begin
+      n_m = {n_sum[27:2], n_sum[1] | n_sum[0]};
+      n_z_e = n_e + 1;
+    end else begin
+      n_m = n_sum[26:0] << n_shift;
+      n_z_e = n_e - n_shift;
+    end
+  end
+
+  wire      [70:0] n_out, r_in;
+  wire      r_valid;
+  assign n_out = {n_special, n_s, n_z_e, n_m};
+
+  fpu_pipeline_register #(.WIDTH(71), .REGISTERED(
+    (4 * STAGES) / 5 != (3 * STAGES) / 5)) normalise_register(
+    clk, rst, enable, n_valid, n_out, r_valid, r_in);
+
+  //round
+  wire      [32:0] r_special;
+  wire      r_s;
+  wire      [9:0] r_e;
+  wire      [26:0] r_m;
+  wire      [24:0] r_rounded;
+  wire      [23:0] r_z_m;
+  wire      [9:0] r_z_e;
+  reg       [31:0] r_z;
+  assign {r_special, r_s, r_e, r_m} = r_in;
+  assign r_rounded = r_m[26:3] + (r_m[2] && (r_m[1] || r_m[0] || r_m[3]));
+  assign r_z_m = r_rounded[24] ? r_rounded[24:1] : r_rounded[23:0];
+  assign r_z_e = r_rounded[24] ? r_e + 1 : r_e;
+
+  always @*
+  begin
+    if (r_special[32]) begin
+      r_z = r_special[31:0];
+    end else if (r_z_e >= 255) begin
+      r_z = {r_s, 8'd255, 23'd0};
+    end else if (r_z_m[23]) begin
+      r_z = {r_s, r_z_e[7:0], r_z_m[22:0]};
+    end else begin
+      r_z = {r_s, 8'd0, r_z_m[22:0]};
+    end
+  end
+
+  fpu_pipeline_register #(.WIDTH(32), .REGISTERED(1)) round_register(
+    clk, rst, enable, r_valid, r_z, output_z_stb, output_z);
+
+endmodule
+
+"""
+pipelined_multiplier = """//IEEE Floating Point Multiplier (Single Precision, Pipelined)
+//Copyright (C) Jonathan P Dawson 2013
+//
+//A new pair of operands can be accepted, and a result produced, on every
+//clock. The multiplication is divided into four steps, unpack, multiply,
+//normalise and round. STAGES (1 to 4) of the boundaries between the steps
+//are registered, so the latency is STAGES clocks. When the result is not
+//accepted, the whole pipeline stalls.
+
+module pipelined_multiplier(
+        input_a,
+        input_b,
+        input_a_stb,
+        input_b_stb,
+        output_z_ack,
+        clk,
+        rst,
+        output_z,
+        output_z_stb,
+        input_a_ack,
+        input_b_ack);
+
+  parameter STAGES = 4;
+
+  input     clk;
+  input     rst;
+
+  input     [31:0] input_a;
+  input     input_a_stb;
+  output    input_a_ack;
+
+  input     [31:0] input_b;
+  input     input_b_stb;
+  output    input_b_ack;
+
+  output    [31:0] output_z;
+  output    output_z_stb;
+  input     output_z_ack;
+
+  wire      enable;
+  wire      accept;
+
+  //both operands are accepted together
+  assign enable = !output_z_stb || output_z_ack;
+  assign accept = input_a_stb && input_b_stb && enable;
+  assign input_a_ack = input_b_stb && enable;
+  assign input_b_ack = input_a_stb && enable;
+
+  //unpack
+  wire      a_nan, b_nan, a_inf, b_inf, a_zero, b_zero;
+  wire      u_s;
+  wire      [7:0] u_a_e, u_b_e;
+  reg       [32:0] u_special;
+
+  assign a_nan = input_a[30:23] == 255 && input_a[22:0] != 0;
+  assign b_nan = input_b[30:23] == 255 && input_b[22:0] != 0;
+  assign a_inf = input_a[30:23] == 255 && input_a[22:0] == 0;
+  assign b_inf = input_b[30:23] == 255 && input_b[22:0] == 0;
+  assign a_zero = input_a[30:0] == 0;
+  assign b_zero = input_b[30:0] == 0;
+  assign u_s = input_a[31] ^ input_b[31];
+  assign u_a_e = input_a[30:23] == 0 ? 8'd1 : input_a[30:23];
+  assign u_b_e = input_b[30:23] == 0 ? 8'd1 : input_b[30:23];
+
+  always @*
+  begin
+    if (a_nan || b_nan || (a_inf && b_zero) || (b_inf && a_zero)) begin
+      u_special = {1'b1, 32'hffc00000};
+    end else if (a_inf || b_inf) begin
+      u_special = {1'b1, u_s, 8'd255, 23'd0};
+    end else if (a_zero || b_zero) begin
+      u_special = {1'b1, u_s, 31'd0};
+    end else begin
+      u_special = 0;
+    end
+  end
+
+  wire      [92:0] u_out, m_in;
+  wire      m_valid;
+  //the exponent of bit 47 of the product
+  assign u_out = {
+    u_special,
+    u_s,
+    {3'd0, u_a_e} + {3'd0, u_b_e} - 11'd126,
+    (input_a[30:23] != 0), input_a[22:0],
+    (input_b[30:23] != 0), input_b[22:0]};
+
+  fpu_pipeline_register #(.WIDTH(93), .REGISTERED(
+    (1 * STAGES) / 4 != (0 * STAGES) / 4)) unpack_register(
+    clk, rst, enable, accept, u_out, m_valid, m_in);
+
+  //multiply
+  wire      [32:0] m_special;
+  wire      m_s;
+  wire      [10:0] m_e;
+  wire      [23:0] m_a_m, m_b_m;
+  wire      [47:0] m_product;
+  assign {m_special, m_s, m_e, m_a_m, m_b_m} = m_in;
+  assign m_product = m_a_m * m_b_m;
+
+  wire      [92:0] m_out, n_in;
+  wire      n_valid;
+  assign m_out = {m_special, m_s, m_e, m_product};
+
+  fpu_pipeline_register #(.WIDTH(93), .REGISTERED(
+    (2 * STAGES) / 4 != (1 * STAGES) / 4)) multiply_register(
+    clk, rst, enable, m_valid, m_out, n_valid, n_in);
+
+  //normalise
+  wire      [32:0] n_special;
+  wire      n_s;
+  wire      signed [10:0] n_e;
+  wire      [47:0] n_product;
+  reg       [5:0] n_zeros;
+  reg       signed [10:0] n_shift;
+  reg       [47:0] n_m;
+  reg       n_sticky;
+  integer   i;
+  assign {n_special, n_s, n_e, n_product} = n_in;
+
+  always @*
+  begin
+    n_zeros = 48;
+    for (i = 0; i <= 47; i = i + 1) begin
+      if (n_product[i]) begin
+        n_zeros = 47 - i;
+      end
+    end
+    //stop at the smallest exponent, leaving a denormal
+    n_shift = $signed({5'd0, n_zeros}) < n_e ? $signed({5'd0, n_zeros}) : n_e - 1;
+    if (n_shift >= 0) begin
+      n_m = n_product << n_shift;
+      n_sticky = 0;
+    end else if (n_shift > -48) begin
+      n_m = n_product >> -n_shift;
+      n_sticky = (n_product & ~(48'hffffffffffff << -n_shift)) != 0;
+    end else begin
+      n_m = 0;
+      n_sticky = n_product != 0;
+    end
+  end
+
+  wire      [70:0] n_out, r_in;
+  wire      r_valid;
+  wire      [9:0] n_z_e;
+  assign n_z_e = n_e - n_shift;
+  assign n_out = {
+    n_special,
+    n_s,
+    n_z_e,
+    n_m[47:22],
+    n_m[21:0] != 0 || n_sticky};
+
+  fpu_pipeline_register #(.WIDTH(71), .REGISTERED(
+    (3 * STAGES) / 4 != (2 * STAGES) / 4)) normalise_register(
+    clk, rst, enable, n_valid, n_out, r_valid, r_in);
+
+  //round
+  wire      [32:0] r_special;
+  wire      r_s;
+  wire      [9:0] r_e;
+  wire      [26:0] r_m;
+  wire      [24:0] r_rounded;
+  wire      [23:0] r_z_m;
+  wire      [9:0] r_z_e;
+  reg       [31:0] r_z;
+  assign {r_special, r_s, r_e, r_m} = r_in;
+  assign r_rounded = r_m[26:3] + (r_m[2] && (r_m[1] || r_m[0] || r_m[3]));
+  assign r_z_m = r_rounded[24] ? r_rounded[24:1] : r_rounded[23:0];
+  assign r_z_e = r_rounded[24] ? r_e + 1 : r_e;
+
+  always @*
+  begin
+    if (r_special[32]) begin
+      r_z = r_special[31:0];
+    end else if (r_z_e >= 255) begin
+      r_z = {r_s, 8'd255, 23'd0};
+    end else if (r_z_m[23]) begin
+      r_z = {r_s, r_z_e[7:0], r_z_m[22:0]};
+    end else begin
+      r_z = {r_s, 8'd0, r_z_m[22:0]};
+    end
+  end
+
+  fpu_pipeline_register #(.WIDTH(32), .REGISTERED(1)) round_register(
+    clk, rst, enable, r_valid, r_z, output_z_stb, output_z);
+
+endmodule
+
+"""
+fpu_pipeline_register = """//Pipeline Register for the Pipelined Floating Point Cores
+//Copyright (C) Jonathan P Dawson 2013
+//
+//When REGISTERED is zero, the data passes straight through, so that the
+//number of stages in a pipeline can be chosen using parameters.
+
+module fpu_pipeline_register(
+        clk,
+        rst,
+        enable,
+        input_valid,
+        input_data,
+        output_valid,
+        output_data);
+
+  parameter WIDTH = 32;
+  parameter REGISTERED = 1;
+
+  input     clk;
+  input     rst;
+  input     enable;
+  input     input_valid;
+  input     [WIDTH-1:0] input_data;
+  output    output_valid;
+  output    [WIDTH-1:0] output_data;
+
+  generate
+    if (REGISTERED) begin
+
+      reg       s_output_valid;
+      reg       [WIDTH-1:0] s_output_data;
+
+      always @(posedge clk)
+      begin
+        if (enable) begin
+          s_output_valid <= input_valid;
+          s_output_data <= input_data;
+        end
+        if (rst == 1'b1) begin
+          s_output_valid <= 0;
+        end
+      end
+
+      assign output_valid = s_output_valid;
+      assign output_data = s_output_data;
+
+    end else begin
+
+      assign output_valid = input_valid;
+      assign output_data = input_data;
+
+    end
+  endgenerate
+
+endmodule
+
+"""
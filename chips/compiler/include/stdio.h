@@ -155,5 +155,21 @@ long fget_long(unsigned handle){
     return l;
 }
 
+void fput_long64(long d, unsigned handle){
+    fputc64(d, handle);
+}
+
+long fget_long64(unsigned handle){
+    return fgetc64(handle);
+}
+
+void fput_double64(double d, unsigned handle){
+    fputc64(double_to_bits(d), handle);
+}
+
+double fget_double64(unsigned handle){
+    return bits_to_double(fgetc64(handle));
+}
+
 #endif
 
@@ -1,12 +1,15 @@
+/* String length, used by the copy operations */
+
+unsigned strlen(char s[]){
+	unsigned i = 0;
+	while(s[i]) i++;
+	return i;
+}
+
 /* Copy operations */
 
 void strcpy(char to[], char from[]){
-	unsigned i=0;
-	while(from[i]){
-		to[i] = from[i];
-		i++;
-	}
-	to[i] = from[i];
+	block_copy(to, from, strlen(from) + 1);
 }
 
 void strncpy(char to[], char from[], unsigned n){
@@ -20,53 +23,49 @@ void strncpy(char to[], char from[], unsigned n){
 }
 
 void memcpy(char to[], char from[], unsigned n){
-	unsigned i=0;
-	while(i < n){
-		to[i] = from[i];
-		i++;
-	}
+	block_copy(to, from, n);
 }
 
 void memmove(char to[], char from[], unsigned n){
-	memcpy(from, to); /* cannot overlap */ 
+	/* block_copy works forwards, so it can only move data down */
+	if(to <= from){
+		block_copy(to, from, n);
+	} else {
+		while(n){
+			n--;
+			to[n] = from[n];
+		}
+	}
 }
 
 /* Miscelaneous String Operations */
 
-unsigned strlen(char s[]){
-	unsigned i = 0;
-	while(s[i]) i++;
-	return i;
-}
-
 void memset(char s[], unsigned value, unsigned n){
-	for(i=0; i<n; i++){
-		s[i] = value;
-	}
+	block_fill(s, value, n);
 }
 
 /* String Concatonation Operations */
 
 void strcat(char to[], char from[]){
 	unsigned i=0, j=0;
-	while(a[i]) i++;
-	i++;
-	while(b[j]){
-		a[i] = b[j];
+	while(to[i]) i++;
+	while(from[j]){
+		to[i] = from[j];
 		i++;
 		j++;
 	}
+	to[i] = 0;
 }
 
 void strncat(char to[], char from[], unsigned n){
 	unsigned i=0, j=0;
-	while(a[i]) i++;
-	i++;
-	while(b[j] and j < n){
-		a[i] = b[j];
+	while(to[i]) i++;
+	while(from[j] && j < n){
+		to[i] = from[j];
 		i++;
 		j++;
 	}
+	to[i] = 0;
 }
 
 /* String Comparison Operations */
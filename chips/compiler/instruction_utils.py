@@ -68,58 +68,25 @@ def store_object(trace, instructions, n, offset, local, leave_on_stack=False):
             "b": result_hi,
             "a": address})
     else:
+        # copy the item off the top of the stack in a single instruction
+        source = tos_copy if leave_on_stack else tos
         instructions.append({
             "trace": trace,
             "op": "addl",
+            "z": source,
+            "a": tos,
+            "literal": -n})
+        instructions.append({
+            "trace": trace,
+            "op": "literal",
+            "z": result,
+            "literal": n})
+        instructions.append({
+            "trace": trace,
+            "op": "copy",
             "z": address,
-            "a": address,
-            "literal": n - 1})
-        if leave_on_stack:
-            instructions.append({
-                "trace": trace,
-                "op": "addl",
-                "z": tos_copy,
-                "a": tos,
-                "literal": 0})
-            for i in range(n):
-                instructions.append({
-                    "trace": trace,
-                    "op": "addl",
-                    "z": tos_copy,
-                    "a": tos_copy,
-                    "literal": -1})
-                instructions.append({
-                    "trace": trace,
-                    "op": "load",
-                    "z": result,
-                    "a": tos_copy})
-                instructions.append({
-                    "trace": trace,
-                    "op": "store",
-                    "b": result,
-                    "a": address})
-                if i < n - 1:
-                    instructions.append({
-                        "trace": trace,
-                        "op": "addl",
-                        "z": address,
-                        "a": address,
-                        "literal": -1})
-        else:
-            for i in range(n):
-                pop(trace, instructions, result)
-                instructions.append({
-                    "trace": trace,
-                    "op": "store",
-                    "b": result,
-                    "a": address})
-                if i < n - 1:
-                    instructions.append({
-                        "trace": trace,
-                        "op": "addl",
-                        "z": address,
-                        "a": address,
-                        "literal": -1})
+            "a": source,
+            "b": result})
     return instructions
 
 
@@ -180,20 +147,24 @@ def load_object(trace, instructions, n, offset, local):
             "z": result_hi,
             "a": address})
     else:
-        for i in range(n):
-            instructions.append({
-                "trace": trace,
-                "op": "load",
-                "z": result,
-                "a": address})
-            if i < n - 1:
-                instructions.append({
-                    "trace": trace,
-                    "op": "addl",
-                    "z": address,
-                    "a": address,
-                    "literal": 1})
-            push(trace, instructions, result)
+        # copy the item onto the top of the stack in a single instruction
+        instructions.append({
+            "trace": trace,
+            "op": "literal",
+            "z": result,
+            "literal": n})
+        instructions.append({
+            "trace": trace,
+            "op": "copy",
+            "z": tos,
+            "a": address,
+            "b": result})
+        instructions.append({
+            "trace": trace,
+            "op": "addl",
+            "z": tos,
+            "a": tos,
+            "literal": n})
     return instructions
 
 
@@ -1,5 +1,6 @@
 from register_map import *
 from instruction_utils import *
+from chips.compiler.exceptions import C2CHIPError
 
 sn = 0
 
@@ -100,66 +101,145 @@ def expand_literals(instructions):
     return new_instructions
 
 
-def expand_macros(instructions, allocator):
+def expand_macros(instructions, allocator, options={}):
+    """Substitute macros with real instructions
+
+    Each macro is either expanded inline at every use site, or emitted once
+    as a shared subroutine which is called from each use site. The choice is
+    made for each macro according to the macro_policy option:
+
+        speed    - always expand inline (default)
+        balanced - share macros wrapping a multi-cycle operation, where the
+                   call overhead is small compared to the operation itself
+        area     - share any macro where this reduces the instruction count
+
+    With the long_multiplier=native option, long multiplies use a 64 bit
+    multiplier rather than a sequence of 32 bit multiplies.
+    """
+
+    policy = options.get("macro_policy", "speed")
+    if policy not in ["speed", "balanced", "area"]:
+        raise C2CHIPError(
+            "unknown macro_policy %s, expected speed, balanced or area" %
+            policy)
+
+    long_multiplier = options.get("long_multiplier", "macro")
+    if long_multiplier not in ["macro", "native"]:
+        raise C2CHIPError(
+            "unknown long_multiplier %s, expected macro or native" %
+            long_multiplier)
+    expanders = dict(macros)
+    if long_multiplier == "native":
+        expanders["long_multiply"] = native_long_multiply
+
+    uses = {}
+    for instruction in instructions:
+        if instruction["op"] in macros:
+            uses[instruction["op"]] = uses.get(instruction["op"], 0) + 1
+
+    shared = {}
+    for op, count in uses.iteritems():
+        if share_macro(op, count, policy, expanders):
+            shared[op] = None
+
     new_instructions = []
     for instruction in instructions:
         trace = instruction["trace"]
-        if instruction["op"] == "long_equal":
-            new_instructions.extend(long_equal(trace, instruction))
-        elif instruction["op"] == "long_not_equal":
-            new_instructions.extend(long_not_equal(trace, instruction))
-        elif instruction["op"] == "long_divide":
-            new_instructions.extend(long_divide(trace, instruction))
-        elif instruction["op"] == "long_modulo":
-            new_instructions.extend(long_modulo(trace, instruction))
-        elif instruction["op"] == "unsigned_long_divide":
-            new_instructions.extend(unsigned_long_divide(trace, instruction))
-        elif instruction["op"] == "unsigned_long_modulo":
-            new_instructions.extend(unsigned_long_modulo(trace, instruction))
-        elif instruction["op"] == "long_greater":
-            new_instructions.extend(long_greater(trace, instruction))
-        elif instruction["op"] == "long_greater_equal":
-            new_instructions.extend(long_greater_equal(trace, instruction))
-        elif instruction["op"] == "unsigned_long_greater":
-            new_instructions.extend(unsigned_long_greater(trace, instruction))
-        elif instruction["op"] == "unsigned_long_greater_equal":
-            new_instructions.extend(
-                unsigned_long_greater_equal(trace, instruction))
-        elif instruction["op"] == "long_add":
-            new_instructions.extend(long_add(trace, instruction))
-        elif instruction["op"] == "long_subtract":
-            new_instructions.extend(long_subtract(trace, instruction))
-        elif instruction["op"] == "long_multiply":
-            new_instructions.extend(long_multiply(trace, instruction))
-        elif instruction["op"] == "long_and":
-            new_instructions.extend(long_and(trace, instruction))
-        elif instruction["op"] == "long_or":
-            new_instructions.extend(long_or(trace, instruction))
-        elif instruction["op"] == "long_xor":
-            new_instructions.extend(long_xor(trace, instruction))
-        elif instruction["op"] == "long_shift_left":
-            new_instructions.extend(long_shift_left(trace, instruction))
-        elif instruction["op"] == "long_shift_right":
-            new_instructions.extend(long_shift_right(trace, instruction))
-        elif instruction["op"] == "unsigned_long_shift_right":
-            new_instructions.extend(
-                unsigned_long_shift_right(trace, instruction))
-        elif instruction["op"] == "long_not":
-            new_instructions.extend(long_not(trace, instruction))
-        elif instruction["op"] == "long_float_add":
-            new_instructions.extend(long_float_add(trace, instruction))
-        elif instruction["op"] == "long_float_subtract":
-            new_instructions.extend(long_float_subtract(trace, instruction))
-        elif instruction["op"] == "long_float_multiply":
-            new_instructions.extend(long_float_multiply(trace, instruction))
-        elif instruction["op"] == "long_float_divide":
-            new_instructions.extend(long_float_divide(trace, instruction))
+        op = instruction["op"]
+        if op in shared:
+            if shared[op] is None:
+                shared[op] = trace
+            new_instructions.append(
+                {"trace": trace,
+                 "op": "call",
+                 "z": macro_return_address,
+                 "label": "macro_routine_" + op,
+                 "comment": op,
+                 "macro": op})
+        elif op in macros:
+            for expanded in expanders[op](trace, instruction):
+                expanded["macro"] = op
+                new_instructions.append(expanded)
         else:
             new_instructions.append(instruction)
 
+    # shared macros are placed after the last function, so they can only be
+    # reached by a call
+    for op, trace in sorted(shared.iteritems()):
+        new_instructions.append(
+            {"trace": trace, "op": "label", "label": "macro_routine_" + op})
+        for expanded in expanders[op](trace, {"trace": trace, "op": op}):
+            expanded["macro"] = op
+            expanded["routine"] = "macro_routine_" + op
+            new_instructions.append(expanded)
+        new_instructions.append(
+            {"trace": trace,
+             "op": "return",
+             "a": macro_return_address,
+             "macro": op,
+             "routine": "macro_routine_" + op})
+
+    if "macro_report" in options:
+        report_macros(uses, shared, expanders)
+
     return expand_literals(push_pop(new_instructions))
 
 
+def macro_size(op, expanders=None):
+    """The number of instruction words in a single expansion of a macro"""
+
+    if expanders is None:
+        expanders = macros
+    instructions = expanders[op](None, {"trace": None, "op": op})
+    instructions = expand_literals(instructions)
+    return len([i for i in instructions if i["op"] != "label"])
+
+
+def share_macro(op, uses, policy, expanders=None):
+    """Decide whether a macro should be implemented as a shared subroutine"""
+
+    if policy == "speed":
+        return False
+
+    # each use site is replaced by a single call, and the shared copy needs
+    # an additional return
+    size = macro_size(op, expanders)
+    saving = (uses * size) - (uses + size + 1)
+    if saving <= 0:
+        return False
+
+    if policy == "balanced":
+        return op in multi_cycle_macros
+
+    return True
+
+
+def report_macros(uses, shared, expanders=None):
+    """Print the instruction ROM used by each macro"""
+
+    print "Macro ROM usage"
+    print "==============="
+    print
+    print "%-28s %6s %6s %8s %8s %s" % (
+        "macro", "uses", "size", "inline", "shared", "implementation")
+    total = 0
+    for op, count in sorted(uses.iteritems()):
+        size = macro_size(op, expanders)
+        inline_words = count * size
+        shared_words = count + size + 1
+        if op in shared:
+            implementation = "shared"
+            total += shared_words
+        else:
+            implementation = "inline"
+            total += inline_words
+        print "%-28s %6u %6u %8u %8u %s" % (
+            op, count, size, inline_words, shared_words, implementation)
+    print
+    print "Total macro instruction words:", total
+    print
+
+
 def long_shift_left(trace, instruction):
     """Long Shift Left (by a programable amount)
     Implemented using 1 bit shifts.
@@ -701,6 +781,44 @@ def long_multiply(trace, instruction):
     return instructions
 
 
+def native_long_multiply(trace, instruction):
+    """ multiply long numbers using the 64 bit multiplier """
+
+    instructions = []
+    instructions.append(
+        {"trace": trace,
+         "op": "b_hi",
+         "z": result_b_hi,
+         "a": result_b_hi})
+    instructions.append(
+        {"trace": trace,
+         "op": "b_lo",
+         "z": result_b,
+         "a": result_b})
+    instructions.append(
+        {"trace": trace,
+         "op": "a_hi",
+         "z": result_hi,
+         "a": result_hi})
+    instructions.append(
+        {"trace": trace,
+         "op": "a_lo",
+         "z": result,
+         "a": result})
+    instructions.append({"trace": trace, "op": "long_multiply"})
+    instructions.append(
+        {"trace": trace,
+         "op": "a_lo",
+         "z": result,
+         "a": result})
+    instructions.append(
+        {"trace": trace,
+         "op": "a_hi",
+         "z": result_hi,
+         "a": result_hi})
+    return instructions
+
+
 def long_float_add(trace, instruction):
     instructions = []
     instructions.append(
@@ -983,3 +1101,43 @@ def long_float_divide(trace, instruction):
          "z": result_hi,
          "a": result_hi})
     return instructions
+
+
+macros = {
+    "long_equal": long_equal,
+    "long_not_equal": long_not_equal,
+    "long_divide": long_divide,
+    "long_modulo": long_modulo,
+    "unsigned_long_divide": unsigned_long_divide,
+    "unsigned_long_modulo": unsigned_long_modulo,
+    "long_greater": long_greater,
+    "long_greater_equal": long_greater_equal,
+    "unsigned_long_greater": unsigned_long_greater,
+    "unsigned_long_greater_equal": unsigned_long_greater_equal,
+    "long_add": long_add,
+    "long_subtract": long_subtract,
+    "long_multiply": long_multiply,
+    "long_and": long_and,
+    "long_or": long_or,
+    "long_xor": long_xor,
+    "long_shift_left": long_shift_left,
+    "long_shift_right": long_shift_right,
+    "unsigned_long_shift_right": unsigned_long_shift_right,
+    "long_not": long_not,
+    "long_float_add": long_float_add,
+    "long_float_subtract": long_float_subtract,
+    "long_float_multiply": long_float_multiply,
+    "long_float_divide": long_float_divide,
+}
+
+# macros wrapping an operation which takes many clock cycles
+multi_cycle_macros = [
+    "long_divide",
+    "long_modulo",
+    "unsigned_long_divide",
+    "unsigned_long_modulo",
+    "long_float_add",
+    "long_float_subtract",
+    "long_float_multiply",
+    "long_float_divide",
+]
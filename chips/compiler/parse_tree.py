@@ -97,8 +97,19 @@ class Process:
              "z": frame,
              "literal": 0})
 
-        # reserve stack space for global objects and function return values
+        # const arrays with constant initialisers are placed in a separate
+        # ROM, at the top of the address space
         globals_and_functions = set(called_functions + referenced_globals)
+        rom_objects = []
+        for global_object in globals_and_functions:
+            if isinstance(global_object, GlobalVariable):
+                contents = global_object.rom_contents()
+                if contents is not None:
+                    rom_objects.append((global_object, contents))
+        for global_object, contents in rom_objects:
+            globals_and_functions.remove(global_object)
+
+        # reserve stack space for global objects and function return values
         global_size = sum([size_of(i) for i in globals_and_functions])
         if global_size:
             instructions.append(
@@ -108,10 +119,20 @@ class Process:
                  "a": tos,
                  "literal": global_size // 4})
         offset = 0
+        self.global_objects = []
         for global_object in globals_and_functions:
+            self.global_objects.append((offset, global_object))
             instructions.extend(global_object.initialise(offset))
             offset += size_of(global_object) // 4
 
+        # the ROM ends at address -1
+        offset = -sum([len(contents) for i, contents in rom_objects])
+        for global_object, contents in rom_objects:
+            self.global_objects.append((offset, global_object))
+            instructions.extend(
+                global_object.initialise_rom(offset, contents))
+            offset += len(contents)
+
         # start with a call to main
         call(self.trace, instructions, "function_%s" % id(self.main))
 
@@ -600,6 +621,7 @@ class Loop:
 
     def __init__(self, trace):
         self.trace = trace
+        self.loop_bound = None
 
     def generate(self):
         instructions = [{
@@ -607,6 +629,8 @@ class Loop:
             "op": "label",
             "label": "begin_%s" % id(self)
         }]
+        if self.loop_bound is not None:
+            instructions[-1]["loop_bound"] = self.loop_bound
         instructions.append({
             "trace": self.trace,
                             "op": "label",
@@ -631,6 +655,7 @@ class For:
 
     def __init__(self, trace):
         self.trace = trace
+        self.loop_bound = None
 
     def generate(self):
         instructions = []
@@ -640,6 +665,8 @@ class For:
             {"trace": self.trace,
              "op": "label",
              "label": "begin_%s" % id(self)})
+        if self.loop_bound is not None:
+            instructions[-1]["loop_bound"] = self.loop_bound
         if hasattr(self, "expression"):
 
             instructions.extend(self.expression.generate())
@@ -872,6 +899,37 @@ class GlobalVariable:
                             local=False)
         return instructions
 
+    def rom_contents(self):
+        """The contents of a const array as a list of words
+
+        Returns None unless the variable is a const array, initialised with
+        constant values, which can be placed in ROM.
+        """
+
+        if not (self._const and is_array_of(self) and self.initializer):
+            return None
+        words = []
+        try:
+            for expression in flatten(self.initializer):
+                size = size_of(expression) // 4
+                if size not in [1, 2]:
+                    return None
+                value = expression.int_value()
+                for i in range(size):
+                    words.append(value & 0xffffffff)
+                    value >>= 32
+        except NotConstant:
+            return None
+        return words
+
+    def initialise_rom(self, offset, contents):
+        # the contents are loaded into ROM at compile time
+        self.offset = offset
+        return [{"trace": self.trace,
+                 "op": "rom",
+                 "offset": offset,
+                 "values": contents}]
+
     def reference(self, trace):
         return Variable(trace, self)
 
@@ -2000,12 +2058,159 @@ class Output(Expression):
         return instructions
 
 
+class LongOutput(Expression):
+
+    """ Write a 64 bit expression to the output numbered "handle" """
+
+    def __init__(self, trace, handle, expression):
+        self.trace = trace
+        self.handle = handle
+        self.expression = expression
+        Expression.__init__(self, "void", False)
+
+    def generate(self):
+        instructions = self.handle.generate()
+        push(self.trace, instructions, result)
+        instructions.extend(self.expression.generate())
+        instructions.append(
+            {"trace": self.trace,
+             "op": "a_hi",
+             "z": result_hi,
+             "a": result_hi})
+        instructions.append(
+            {"trace": self.trace,
+             "op": "a_lo",
+             "z": result,
+             "a": result})
+        pop(self.trace, instructions, temp)
+        instructions.append(
+            {"trace": self.trace,
+             "op": "long_write",
+             "a": temp})
+        return instructions
+
+
+class BlockCopy(Expression):
+
+    """ Copy a number of words from one array to another """
+
+    def __init__(self, trace, destination, source, length):
+        self.trace = trace
+        self.destination = destination
+        self.source = source
+        self.length = length
+        Expression.__init__(self, "void", False)
+
+    def generate(self):
+        instructions = self.destination.generate()
+        push(self.trace, instructions, result)
+        instructions.extend(self.source.generate())
+        push(self.trace, instructions, result)
+        instructions.extend(self.length.generate())
+        pop(self.trace, instructions, temp)
+        pop(self.trace, instructions, temp1)
+        instructions.append(
+            {"trace": self.trace,
+             "op": "copy",
+             "z": temp1,
+             "a": temp,
+             "b": result})
+        return instructions
+
+
+class BlockFill(Expression):
+
+    """ Set a number of words in an array to a value """
+
+    def __init__(self, trace, destination, expression, length):
+        self.trace = trace
+        self.destination = destination
+        self.expression = expression
+        self.length = length
+        Expression.__init__(self, "void", False)
+
+    def generate(self):
+        instructions = self.destination.generate()
+        push(self.trace, instructions, result)
+        instructions.extend(self.expression.generate())
+        push(self.trace, instructions, result)
+        instructions.extend(self.length.generate())
+        pop(self.trace, instructions, temp)
+        pop(self.trace, instructions, temp1)
+        instructions.append(
+            {"trace": self.trace,
+             "op": "fill",
+             "z": temp1,
+             "a": temp,
+             "b": result})
+        return instructions
+
+
+class BlockRead(Expression):
+
+    """ Read a number of words from the input numbered "handle" into an array """
+
+    def __init__(self, trace, handle, array, length):
+        self.trace = trace
+        self.handle = handle
+        self.array = array
+        self.length = length
+        Expression.__init__(self, "void", False)
+
+    def generate(self):
+        instructions = self.array.generate()
+        push(self.trace, instructions, result)
+        instructions.extend(self.handle.generate())
+        push(self.trace, instructions, result)
+        instructions.extend(self.length.generate())
+        pop(self.trace, instructions, temp)
+        pop(self.trace, instructions, temp1)
+        instructions.append(
+            {"trace": self.trace,
+             "op": "block_read",
+             "z": temp1,
+             "a": temp,
+             "b": result})
+        return instructions
+
+
+class BlockWrite(Expression):
+
+    """ Write a number of words from an array to the output numbered "handle" """
+
+    def __init__(self, trace, handle, array, length):
+        self.trace = trace
+        self.handle = handle
+        self.array = array
+        self.length = length
+        Expression.__init__(self, "void", False)
+
+    def generate(self):
+        instructions = self.array.generate()
+        push(self.trace, instructions, result)
+        instructions.extend(self.handle.generate())
+        push(self.trace, instructions, result)
+        instructions.extend(self.length.generate())
+        pop(self.trace, instructions, temp)
+        pop(self.trace, instructions, temp1)
+        instructions.append(
+            {"trace": self.trace,
+             "op": "block_write",
+             "z": temp1,
+             "a": temp,
+             "b": result})
+        return instructions
+
+
 class FileWrite(Expression):
 
-    def __init__(self, trace, name, expression):
+    """ Write a value to a file, as text or as raw little endian words """
+
+    def __init__(self, trace, name, expression, binary=False):
         self.name = name
         self.trace = trace
         self.expression = expression
+        self.binary = binary
         Expression.__init__(
             self,
             "void",
@@ -2014,7 +2219,28 @@ class FileWrite(Expression):
     def generate(self):
         instructions = self.expression.generate()
 
-        if self.expression.type_() == "double":
+        if self.binary and self.expression.type_() in ["long", "double"]:
+            instructions.append(
+                {"trace": self.trace,
+                 "op": "a_hi",
+                 "z": result_hi,
+                 "a": result_hi})
+            instructions.append(
+                {"trace": self.trace,
+                 "op": "a_lo",
+                 "z": result,
+                 "a": result})
+            instructions.append(
+                {"trace": self.trace,
+                 "op": "long_binary_file_write",
+                 "file_name": self.name})
+        elif self.binary:
+            instructions.append(
+                {"trace": self.trace,
+                 "op": "binary_file_write",
+                 "a": result,
+                 "file_name": self.name})
+        elif self.expression.type_() == "double":
             instructions.append(
                 {"trace": self.trace,
                  "op": "a_hi",
@@ -2111,18 +2337,49 @@ class Input(Expression):
         return instructions
 
 
+class LongInput(Expression):
+
+    """ Read a 64 bit value from the input numbered "handle" """
+
+    def __init__(self, trace, handle):
+        self.handle = handle
+        self.trace = trace
+        Expression.__init__(self, "long", True)
+
+    def generate(self):
+        instructions = self.handle.generate()
+        instructions.append(
+            {"trace": self.trace,
+             "op": "long_read",
+             "a": result})
+        instructions.append(
+            {"trace": self.trace,
+             "op": "a_lo",
+             "z": result,
+             "a": result})
+        instructions.append(
+            {"trace": self.trace,
+             "op": "a_hi",
+             "z": result_hi,
+             "a": result_hi})
+        return instructions
+
+
 class FileRead(Expression):
 
-    def __init__(self, trace, name):
+    """ Read an int from a file, as text or as a raw little endian word """
+
+    def __init__(self, trace, name, binary=False):
         self.name = name
         self.trace = trace
+        self.binary = binary
         Expression.__init__(self, "int", True)
 
     def generate(self):
         instructions = []
         instructions.append(
             {"trace": self.trace,
-             "op": "file_read",
+             "op": "binary_file_read" if self.binary else "file_read",
              "z": result,
              "file_name": self.name})
         return instructions
@@ -2392,7 +2649,7 @@ class Variable(Object):
         return self.instance.const()
 
     def value(self):
-        if self.const():
+        if self.const() and not is_array_of(self):
             return self.instance.initializer.value()
         else:
             raise NotConstant
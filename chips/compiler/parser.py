@@ -596,8 +596,20 @@ class Parser:
         self.loop.default = default
         return default
 
+    def parse_loop_bound(self):
+        """Return the iteration limit given by a loop_bound pragma, if any"""
+
+        bound = self.tokens.pragma("loop_bound")
+        if bound is None:
+            return None
+        try:
+            return int(bound[0])
+        except (IndexError, ValueError):
+            self.tokens.error("loop_bound pragma expects an integer")
+
     def parse_while(self):
         loop = Loop(Trace(self))
+        loop.loop_bound = self.parse_loop_bound()
         self.tokens.expect("while")
         self.tokens.expect("(")
         expression = self.parse_expression()
@@ -622,6 +634,7 @@ class Parser:
 
         # compile the loop
         loop = Loop(Trace(self))
+        loop.loop_bound = self.parse_loop_bound()
         self.tokens.expect("do")
         stored_loop = self.loop
         self.loop = loop
@@ -658,6 +671,7 @@ class Parser:
 
     def parse_for(self):
         for_ = For(Trace(self))
+        for_.loop_bound = self.parse_loop_bound()
         self.tokens.expect("for")
         self.tokens.expect("(")
         if self.tokens.peek() != ";":
@@ -1333,14 +1347,30 @@ class Parser:
                 expression = self.parse_fgetc()
             elif name == "fputc":
                 expression = self.parse_fputc()
+            elif name == "fgetc64":
+                expression = self.parse_fgetc64()
+            elif name == "fputc64":
+                expression = self.parse_fputc64()
             elif name == "ready":
                 expression = self.parse_ready()
+            elif name == "block_copy":
+                expression = self.parse_block_copy()
+            elif name == "block_fill":
+                expression = self.parse_block_fill()
+            elif name == "fread_block":
+                expression = self.parse_block_stream(BlockRead)
+            elif name == "fwrite_block":
+                expression = self.parse_block_stream(BlockWrite)
             elif name == "output_ready":
                 expression = self.parse_output_ready()
             elif name == "file_read":
                 expression = self.parse_file_read()
             elif name == "file_write":
                 expression = self.parse_file_write()
+            elif name == "binary_file_read":
+                expression = self.parse_file_read(binary=True)
+            elif name == "binary_file_write":
+                expression = self.parse_file_write(binary=True)
             elif name == "double_to_bits":
                 expression = self.parse_double_to_bits()
             elif name == "float_to_bits":
@@ -1417,17 +1447,17 @@ class Parser:
             struct,
             member)
 
-    def parse_file_read(self):
-        """parse the built-in function file_read"""
+    def parse_file_read(self, binary=False):
+        """parse the built-in functions file_read and binary_file_read"""
 
         self.tokens.expect("(")
         file_name = self.tokens.get()
         file_name = file_name.strip('"').decode("string_escape")
         self.tokens.expect(")")
-        return FileRead(Trace(self), file_name)
+        return FileRead(Trace(self), file_name, binary)
 
-    def parse_file_write(self):
-        """parse the built-in function file_write"""
+    def parse_file_write(self, binary=False):
+        """parse the built-in functions file_write and binary_file_write"""
 
         self.tokens.expect("(")
         expression = self.parse_assignment()
@@ -1435,7 +1465,7 @@ class Parser:
         file_name = self.tokens.get()
         file_name = file_name.strip('"').decode("string_escape")
         self.tokens.expect(")")
-        return FileWrite(Trace(self), file_name, expression)
+        return FileWrite(Trace(self), file_name, expression, binary)
 
     def parse_double_to_bits(self):
         """parse the built-in function double_to_bits"""
@@ -1469,13 +1499,26 @@ class Parser:
         self.tokens.expect(")")
         return BitsToFloat(Trace(self), self.to_int(expression))
 
+    def parse_port_width(self):
+        """parse the optional width of an input or output in bits"""
+
+        if self.tokens.peek() != ",":
+            return 32
+        self.tokens.expect(",")
+        width = self.tokens.get()
+        if width not in ["32", "64"]:
+            self.tokens.error("port width must be 32 or 64, not %s" % width)
+        return int(width)
+
     def parse_input(self):
         """parse the built-in function input"""
 
         self.tokens.expect("(")
         input_name = self.tokens.get().strip('"').decode("string_escape")
+        width = self.parse_port_width()
         self.tokens.expect(")")
-        return Constant(Trace(self), self.allocator.new_input(input_name))
+        return Constant(
+            Trace(self), self.allocator.new_input(input_name, width))
 
     def parse_fgetc(self):
         """parse the built-in function fgetc"""
@@ -1485,6 +1528,14 @@ class Parser:
         self.tokens.expect(")")
         return Input(Trace(self), handle)
 
+    def parse_fgetc64(self):
+        """parse the built-in function fgetc64"""
+
+        self.tokens.expect("(")
+        handle = self.parse_assignment()
+        self.tokens.expect(")")
+        return LongInput(Trace(self), handle)
+
     def parse_ready(self):
         """parse the built-in function ready"""
 
@@ -1493,6 +1544,60 @@ class Parser:
         self.tokens.expect(")")
         return Ready(Trace(self), handle)
 
+    def parse_block_address(self):
+        """parse the array or pointer operand of a block built-in"""
+
+        expression = self.parse_assignment()
+        if not (is_array_of(expression) or is_pointer_to(expression)):
+            self.tokens.error("expected an array or a pointer")
+        return expression
+
+    def parse_block_length(self):
+        """parse the number of words operand of a block built-in"""
+
+        expression = self.parse_assignment()
+        if expression.type_() not in integer_like:
+            self.tokens.error("number of words must be an integer")
+        return expression
+
+    def parse_block_copy(self):
+        """parse the built-in function block_copy"""
+
+        self.tokens.expect("(")
+        destination = self.parse_block_address()
+        self.tokens.expect(",")
+        source = self.parse_block_address()
+        self.tokens.expect(",")
+        length = self.parse_block_length()
+        self.tokens.expect(")")
+        return BlockCopy(Trace(self), destination, source, length)
+
+    def parse_block_fill(self):
+        """parse the built-in function block_fill"""
+
+        self.tokens.expect("(")
+        destination = self.parse_block_address()
+        self.tokens.expect(",")
+        value = self.parse_assignment()
+        if size_of(value) != 4:
+            self.tokens.error("fill value must be a 32 bit type")
+        self.tokens.expect(",")
+        length = self.parse_block_length()
+        self.tokens.expect(")")
+        return BlockFill(Trace(self), destination, value, length)
+
+    def parse_block_stream(self, expression_class):
+        """parse the built-in functions fread_block and fwrite_block"""
+
+        self.tokens.expect("(")
+        handle = self.parse_assignment()
+        self.tokens.expect(",")
+        array = self.parse_block_address()
+        self.tokens.expect(",")
+        length = self.parse_block_length()
+        self.tokens.expect(")")
+        return expression_class(Trace(self), handle, array, length)
+
     def parse_output_ready(self):
         """parse the built-in function ready"""
 
@@ -1506,8 +1611,10 @@ class Parser:
 
         self.tokens.expect("(")
         output_name = self.tokens.get().strip('"').decode("string_escape")
+        width = self.parse_port_width()
         self.tokens.expect(")")
-        return Constant(Trace(self), self.allocator.new_output(output_name))
+        return Constant(
+            Trace(self), self.allocator.new_output(output_name, width))
 
     def parse_fputc(self):
         """parse the built-in function fputc"""
@@ -1519,6 +1626,16 @@ class Parser:
         self.tokens.expect(")")
         return Output(Trace(self), handle, expression)
 
+    def parse_fputc64(self):
+        """parse the built-in function fputc64"""
+
+        self.tokens.expect("(")
+        expression = self.to_long(self.parse_assignment())
+        self.tokens.expect(",")
+        handle = self.parse_assignment()
+        self.tokens.expect(")")
+        return LongOutput(Trace(self), handle, expression)
+
     def parse_function_call(self, function):
         """parse a function call"""
 
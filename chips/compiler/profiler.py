@@ -7,6 +7,10 @@ __copyright__ = "Copyright (C) 2015, Jonathan P Dawson"
 __version__ = "0.1"
 
 import operator
+import json
+
+from chips.compiler.types import size_of
+from chips.compiler.parse_tree import Function, ConstChar
 
 
 def code_lines(filename, instructions):
@@ -89,3 +93,225 @@ def annotate_coverage(filename, files, instructions):
         print line.rstrip()
 
     source.close()
+
+
+def function_name(instruction):
+    """The name of the function an instruction belongs to"""
+
+    if "routine" in instruction:
+        return instruction["routine"]
+    function = getattr(instruction["trace"], "function", None)
+    return getattr(function, "name", "<start>")
+
+
+def global_name(instance):
+    """A readable name for an object held in global memory"""
+
+    trace = instance.trace
+    if isinstance(instance, Function):
+        return "return value of %s" % instance.name
+    if isinstance(instance, ConstChar):
+        return "string constant at %s:%s" % (trace.filename, trace.lineno)
+    for scope in [trace.global_scope, trace.function]:
+        for name, variable in getattr(scope, "global_variables", {}).items():
+            if variable is instance:
+                return name
+    return "global at %s:%s" % (trace.filename, trace.lineno)
+
+
+def size_report(instructions, process, routines=None):
+    """Attribute instruction ROM and data memory to their sources
+
+    Instructions should be expanded, but not yet converted by
+    calculate_jumps. If the results of static analysis are given, the stack
+    size and the stack used by each function is included.
+
+    Returns a dictionary which can be printed with print_size_report, or
+    saved as JSON and compared with a later build using diff_size_report.
+    """
+
+    functions = {}
+    lines = {}
+    rom_total = 0
+    for instruction in instructions:
+        if instruction["op"] in ["label", "constant", "rom"]:
+            continue
+        rom_total += 1
+        name = function_name(instruction)
+        function = functions.setdefault(
+            name, {"words": 0, "macro": 0, "literal_hi": 0})
+        function["words"] += 1
+        if "macro" in instruction:
+            function["macro"] += 1
+        if instruction["op"] == "literal_hi":
+            function["literal_hi"] += 1
+        trace = instruction["trace"]
+        line = "%s:%s" % (trace.filename, trace.lineno)
+        lines[line] = lines.get(line, 0) + 1
+
+    objects = {}
+    globals_total = 0
+    const_objects = {}
+    const_total = 0
+    for offset, instance in process.global_objects:
+        words = size_of(instance) // 4
+        if offset < 0:
+            # const arrays are held in a separate ROM
+            const_objects[global_name(instance)] = words
+            const_total += words
+        else:
+            objects[global_name(instance)] = words
+            globals_total += words
+
+    stack = None
+    if routines is not None:
+        for routine in routines.values():
+            if routine.name in functions:
+                functions[routine.name]["stack"] = routine.stack
+        if routines["<start>"].stack is not None:
+            stack = routines["<start>"].stack - globals_total
+
+    return {
+        "rom": {
+            "total": rom_total,
+            "functions": functions,
+            "lines": lines,
+        },
+        "data": {
+            "total": None if stack is None else globals_total + stack,
+            "globals": globals_total,
+            "objects": objects,
+            "stack": stack,
+        },
+        "const": {
+            "total": const_total,
+            "objects": const_objects,
+        },
+    }
+
+
+def print_size_report(report, lines=20):
+    """Print a size report, showing the source lines using most ROM"""
+
+    def show(value):
+        if value is None:
+            return "unbounded"
+        return str(value)
+
+    rom = report["rom"]
+    print "Instruction ROM"
+    print "==============="
+    print
+    print "%-40s %8s %8s %10s %8s" % (
+        "function", "words", "macro", "literal_hi", "stack")
+    for name, function in sorted(
+            rom["functions"].items(),
+            key=lambda x: x[1]["words"],
+            reverse=True):
+        print "%-40s %8u %8u %10u %8s" % (
+            name,
+            function["words"],
+            function["macro"],
+            function["literal_hi"],
+            show(function.get("stack", "-")))
+    print "%-40s %8u" % ("total", rom["total"])
+    print
+    print "%-70s %8s" % ("source line", "words")
+    for line, words in sorted(
+            rom["lines"].items(),
+            key=operator.itemgetter(1),
+            reverse=True)[:lines]:
+        print "%-70s %8u" % (line, words)
+    print
+
+    data = report["data"]
+    print "Data Memory"
+    print "==========="
+    print
+    print "%-70s %8s" % ("object", "words")
+    for name, words in sorted(
+            data["objects"].items(), key=operator.itemgetter(1), reverse=True):
+        print "%-70s %8u" % (name, words)
+    print "%-70s %8s" % ("stack", show(data["stack"]))
+    print "%-70s %8s" % ("total", show(data["total"]))
+    print
+
+    const = report.get("const", {"total": 0})
+    if const["total"]:
+        print "Const ROM"
+        print "========="
+        print
+        print "%-70s %8s" % ("object", "words")
+        for name, words in sorted(
+                const["objects"].items(),
+                key=operator.itemgetter(1),
+                reverse=True):
+            print "%-70s %8u" % (name, words)
+        print "%-70s %8u" % ("total", const["total"])
+        print
+
+
+def save_size_report(report, filename):
+    """Save a size report in JSON format"""
+
+    output_file = open(filename, "w")
+    json.dump(report, output_file, indent=2, sort_keys=True)
+    output_file.close()
+
+
+def load_size_report(filename):
+    """Load a size report saved in JSON format"""
+
+    input_file = open(filename)
+    report = json.load(input_file)
+    input_file.close()
+    return report
+
+
+def diff_size_report(old, new):
+    """Print the change in size between two builds
+
+    Returns True if the instruction ROM, data memory or const ROM has grown.
+    """
+
+    def change(name, old_words, new_words):
+        if old_words != new_words:
+            print "%-40s %10s %10s %+10d" % (
+                name, old_words, new_words, (new_words or 0) - (old_words or 0))
+
+    print "Size Changes"
+    print "============"
+    print
+    print "%-40s %10s %10s %10s" % ("", "old", "new", "change")
+    old_functions = old["rom"]["functions"]
+    new_functions = new["rom"]["functions"]
+    for name in sorted(set(old_functions) | set(new_functions)):
+        change(
+            name,
+            old_functions.get(name, {}).get("words", 0),
+            new_functions.get(name, {}).get("words", 0))
+    change("instruction ROM", old["rom"]["total"], new["rom"]["total"])
+    old_objects = old["data"]["objects"]
+    new_objects = new["data"]["objects"]
+    for name in sorted(set(old_objects) | set(new_objects)):
+        change(name, old_objects.get(name, 0), new_objects.get(name, 0))
+    change("stack", old["data"]["stack"], new["data"]["stack"])
+    change("data memory", old["data"]["total"], new["data"]["total"])
+    old_const = old.get("const", {"total": 0, "objects": {}})
+    new_const = new.get("const", {"total": 0, "objects": {}})
+    for name in sorted(
+            set(old_const["objects"]) | set(new_const["objects"])):
+        change(
+            "const " + name,
+            old_const["objects"].get(name, 0),
+            new_const["objects"].get(name, 0))
+    change("const ROM", old_const["total"], new_const["total"])
+    print
+
+    grown = new["rom"]["total"] > old["rom"]["total"]
+    grown = grown or new_const["total"] > old_const["total"]
+    if new["data"]["total"] is None:
+        grown = grown or old["data"]["total"] is not None
+    elif old["data"]["total"] is not None:
+        grown = grown or new["data"]["total"] > old["data"]["total"]
+    return grown
@@ -7,14 +7,46 @@ __version__ = "0.1"
 import chips_c
 import sys
 import math
+import struct
+import collections
 import register_map
 from chips.compiler.exceptions import StopSim, BreakSim, ChipsAssertionFail
-from chips.compiler.exceptions import NoProfile
-from utils import calculate_jumps
+from chips.compiler.exceptions import NoProfile, C2CHIPError
+from utils import calculate_jumps, split_rom
+from verilog_area import instruction_latency, branch_penalty
+from verilog_area import predicted_branches
+from verilog_area import stream_operations, floating_point_units
+from verilog_area import block_operations, block_stream_operations
+from verilog_speed import instruction_timing
 from chips_c import bits_to_float, float_to_bits, bits_to_double, double_to_bits, add, subtract
 from chips_c import greater, greater_equal, unsigned_greater, unsigned_greater_equal
 from chips_c import shift_left, shift_right, unsigned_shift_right
 
+# binary files hold raw little endian 32 bit words
+binary_word = struct.Struct("<I")
+binary_long = struct.Struct("<Q")
+
+# bytes buffered when writing binary files, and read at once from them
+binary_buffer_size = 1 << 20
+
+# the type and console format of each report instruction
+report_types = {
+    "report": ("int", "%d"),
+    "long_report": ("long", "%d"),
+    "float_report": ("float", "%f"),
+    "long_float_report": ("double", "%s"),
+    "unsigned_report": ("unsigned", "%d"),
+    "long_unsigned_report": ("unsigned long", "%d"),
+}
+report_formats = dict(report_types.values())
+
+
+def print_report(time, instance, filename, lineno, type_, value):
+    """The default report sink, print each report to the console"""
+
+    print (report_formats[type_] + " (report (%s) at line: %s in file: %s)") % (
+        value, type_, lineno, filename)
+
 def to_32_signed(a):
     if a & 0x80000000:
         return a | (~0xffffffff)
@@ -25,6 +57,24 @@ def to_64_signed(a):
         return a | (~0xffffffffffffffff)
     return a
 
+def float_bits(a):
+    """float_to_bits, which also converts infinities"""
+
+    if math.isinf(a):
+        return 0xff800000 if a < 0 else 0x7f800000
+    return float_to_bits(a)
+
+def divide_by_zero(a, b):
+    """The result of a floating point division by zero
+
+    Like the floating point dividers, a nonzero number divided by zero is an
+    infinity with the sign of a / b, only 0/0 is not a number.
+    """
+
+    if a == 0 or math.isnan(a):
+        return float("nan")
+    return math.copysign(float("inf"), a) * math.copysign(1, b)
+
 def generate_python_model(
         debug,
         input_file,
@@ -33,13 +83,30 @@ def generate_python_model(
         allocator,
         inputs,
         outputs,
-        profile=False
+        profile=False,
+        options={}
 ):
 
     instructions, initial_memory_contents = calculate_jumps(instructions, True)
+    initial_memory_contents, rom_contents = split_rom(initial_memory_contents)
+
+    # In cycle accurate mode, each instruction takes the same number of clock
+    # cycles as in the generated verilog.
+    latencies = None
+    predicted = set()
+    merged = set()
+    penalty = branch_penalty
+    if "cycle_accurate" in options and "speed" in options:
+        latencies, merged = instruction_timing(instructions, options)
+        penalty = 0
+    elif "cycle_accurate" in options:
+        latencies = [
+            instruction_latency(i["op"], options) for i in instructions]
+        predicted = predicted_branches(instructions, options)
 
     input_files = set(
-        [i["file_name"] for i in instructions if "file_read" == i["op"]]
+        [i["file_name"] for i in instructions if
+         i["op"] in ["file_read", "binary_file_read"]]
     )
 
     output_files = set(
@@ -47,15 +114,31 @@ def generate_python_model(
          i["op"].endswith("file_write")]
     )
 
+    binary_files = set(
+        [i["file_name"] for i in instructions if "binary" in i["op"]]
+    )
+
     # map input numbers to port models
     numbered_inputs = {}
     for number, input_name in allocator.input_names.iteritems():
         if input_name in inputs:
             numbered_inputs[number] = inputs[input_name]
+            check_width(
+                input_file,
+                "input",
+                input_name,
+                allocator.input_widths[input_name],
+                inputs[input_name])
     numbered_outputs = {}
     for number, output_name in allocator.output_names.iteritems():
         if output_name in outputs:
             numbered_outputs[number] = outputs[output_name]
+            check_width(
+                input_file,
+                "output",
+                output_name,
+                allocator.output_widths[output_name],
+                outputs[output_name])
 
     return PythonModel(
         debug,
@@ -66,9 +149,25 @@ def generate_python_model(
         numbered_inputs,
         numbered_outputs,
         profile,
+        latencies,
+        binary_files,
+        predicted,
+        rom_contents,
+        merged,
+        penalty,
     )
 
 
+def check_width(input_file, kind, name, width, port):
+    """Check that a port is connected to a wire of the same width"""
+
+    if port.width != width:
+        raise C2CHIPError(
+            "%s %s is %u bits wide, but is connected to a %u bit wire" % (
+                kind, name, width, port.width),
+            input_file)
+
+
 class PythonModel:
 
     """create a python model equivalent to the generated verilog"""
@@ -81,15 +180,35 @@ class PythonModel:
             input_files,
             output_files,
             inputs, outputs,
-            profile=False
+            profile=False,
+            latencies=None,
+            binary_files=(),
+            predicted=(),
+            rom=(),
+            merged=(),
+            penalty=branch_penalty,
     ):
         self.debug = debug
         self.profile = profile
+        self.latencies = latencies
+        self.predicted = predicted
+        self.merged = merged
+        self.branch_penalty = penalty
         self.instructions = instructions
         self.memory_content = memory_content
+        self.rom = rom
+
+        # floating point cores shared with other processes, see Chip
+        self.pool = None
+
+        # loads from the top of the address space are routed to the ROM
+        self.rom_base = 0x100000000 - len(rom)
 
         self.input_file_names = input_files
         self.output_file_names = output_files
+        self.binary_file_names = binary_files
+        self.name = None
+        self.report_sink = print_report
         self.inputs = inputs
         self.outputs = outputs
 
@@ -114,17 +233,31 @@ class PythonModel:
         self.max_stack = 0
         self.timer = 0
         self.clock = 0
+        self.stall = 0
+        self.blocked = False
+        self.waiting = False
+        self.block = None
+        if self.latencies is not None:
+            # the pipeline fills after reset
+            self.stall = self.branch_penalty
 
         self.files = {}
 
         self.input_files = {}
+        self.binary_words = {}
         for file_name in self.input_file_names:
-            file_ = open(file_name)
+            if file_name in self.binary_file_names:
+                file_ = open(file_name, "rb", binary_buffer_size)
+            else:
+                file_ = open(file_name)
             self.input_files[file_name] = file_
 
         self.output_files = {}
         for file_name in self.output_file_names:
-            file_ = open(file_name, "w")
+            if file_name in self.binary_file_names:
+                file_ = open(file_name, "wb", binary_buffer_size)
+            else:
+                file_ = open(file_name, "w")
             self.output_files[file_name] = file_
 
     def get_line(self):
@@ -181,6 +314,25 @@ class PythonModel:
     def simulation_step(self):
         """execute the python simulation by one step"""
 
+        self.execute()
+
+        # the speed optimised state machine executes a group of independent
+        # instructions in a single clock
+        while self.program_counter in self.merged and not (
+                self.stall or self.waiting):
+            self.clock -= 1
+            self.execute()
+
+    def execute(self):
+        """execute one instruction, or one clock of a stalled instruction"""
+
+        # wait for a multi-cycle instruction to complete
+        if self.stall:
+            self.stall -= 1
+            self.clock += 1
+            self.waiting = False
+            return
+
         l = self.get_line()
         f = self.get_file()
         if f in self.breakpoints:
@@ -215,6 +367,7 @@ class PythonModel:
         this_instruction = self.program_counter
         self.program_counter += 1
         wait = False
+        transferred = False
         result = None
 
         if instruction["op"] == "stop":
@@ -249,7 +402,27 @@ class PythonModel:
         elif instruction["op"] == "store":
             self.memory[operand_a] = operand_b
         elif instruction["op"] == "load":
-            result = self.memory.get(operand_a, 0)
+            if operand_a >= self.rom_base:
+                result = self.rom[operand_a - self.rom_base]
+            else:
+                result = self.memory.get(operand_a, 0)
+        elif instruction["op"] == "copy":
+            # the hardware counts the words with 16 bits
+            destination = self.registers.get(z, 0)
+            count = operand_b & 0xffff
+            if operand_a >= self.rom_base:
+                start = operand_a - self.rom_base
+                words = self.rom[start:start + count]
+            else:
+                words = [self.memory.get(i, 0) for i in
+                         xrange(operand_a, operand_a + count)]
+            self.memory.update(
+                zip(xrange(destination, destination + count), words))
+        elif instruction["op"] == "fill":
+            destination = self.registers.get(z, 0)
+            count = operand_b & 0xffff
+            self.memory.update(
+                (i, operand_a) for i in xrange(destination, destination + count))
         elif instruction["op"] == "call":
             result = this_instruction + 1
             self.program_counter = literal
@@ -324,6 +497,12 @@ class PythonModel:
             lw = operand_a * operand_b
             self.carry = chips_c.high_word(lw)
             result = chips_c.low_word(lw)
+        elif instruction["op"] == "long_multiply":
+            a = chips_c.join_words(self.a_hi, self.a_lo)
+            b = chips_c.join_words(self.b_hi, self.b_lo)
+            product = (a * b) & 0xffffffffffffffff
+            self.a_hi = chips_c.high_word(product)
+            self.a_lo = chips_c.low_word(product)
         elif instruction["op"] == "divide":
             a = operand_a
             b = operand_b
@@ -417,8 +596,19 @@ class PythonModel:
         elif instruction["op"] == "timer_high":
             result = self.clock>>32
         elif instruction["op"] == "file_read":
-            value = self.input_files[instruction["filename"]].getline()
-            result = value
+            value = self.input_files[instruction["file_name"]].readline()
+            if not value:
+                self.end_of_file(instruction)
+            result = int(value) & 0xffffffff
+        elif instruction["op"] == "binary_file_read":
+            result = self.binary_file_read(instruction)
+        elif instruction["op"] == "binary_file_write":
+            self.output_files[instruction["file_name"]].write(
+                binary_word.pack(operand_a & 0xffffffff))
+        elif instruction["op"] == "long_binary_file_write":
+            self.output_files[instruction["file_name"]].write(
+                binary_long.pack(chips_c.join_words(
+                    self.a_hi, self.a_lo) & 0xffffffffffffffff))
         elif instruction["op"] == "float_file_write":
             self.output_files[instruction["file_name"]].write(
                 "%.7f\n" %
@@ -438,6 +628,22 @@ class PythonModel:
                 input_ = self.inputs[operand_a]
                 if input_.src_rdy and input_.dst_rdy:
                     result = input_.q
+                    if input_.width == 64:
+                        result &= 0xffffffff
+                    input_.next_dst_rdy = False
+                else:
+                    input_.next_dst_rdy = True
+                    wait = True
+        elif instruction["op"] == "long_read":
+            if operand_a not in self.inputs:
+                self.a_hi = 0
+                self.a_lo = 0
+            else:
+                input_ = self.inputs[operand_a]
+                if input_.src_rdy and input_.dst_rdy:
+                    value = input_.q & ((1 << input_.width) - 1)
+                    self.a_hi = chips_c.high_word(value)
+                    self.a_lo = chips_c.low_word(value)
                     input_.next_dst_rdy = False
                 else:
                     input_.next_dst_rdy = True
@@ -471,6 +677,71 @@ class PythonModel:
                     output_.q = operand_b
                     output_.next_src_rdy = True
                     wait = True
+        elif instruction["op"] == "long_write":
+            if operand_a not in self.outputs:
+                pass
+            else:
+                output_ = self.outputs[operand_a]
+                if output_.src_rdy and output_.dst_rdy:
+                    output_.next_src_rdy = False
+                else:
+                    value = chips_c.join_words(self.a_hi, self.a_lo)
+                    output_.q = value & ((1 << output_.width) - 1)
+                    output_.next_src_rdy = True
+                    wait = True
+        elif instruction["op"] == "block_read":
+            # a word is read in each step, and the block is written to memory
+            # when the last has been read
+            count = operand_b & 0xffff
+            if self.block is None:
+                self.block = []
+            if operand_a in self.inputs:
+                input_ = self.inputs[operand_a]
+                if input_.src_rdy and input_.dst_rdy:
+                    value = input_.q
+                    if input_.width == 64:
+                        value &= 0xffffffff
+                    self.block.append(value)
+                    transferred = True
+                if len(self.block) < count:
+                    input_.next_dst_rdy = True
+                    wait = True
+                else:
+                    input_.next_dst_rdy = False
+            if not wait:
+                destination = self.registers.get(z, 0)
+                self.memory.update(
+                    zip(xrange(destination, destination + count), self.block))
+                self.block = None
+        elif instruction["op"] == "block_write":
+            # the block is read from memory in the first step, and a word is
+            # written in each step
+            if self.block is None:
+                source = self.registers.get(z, 0)
+                count = operand_b & 0xffff
+                if source >= self.rom_base:
+                    start = source - self.rom_base
+                    words = self.rom[start:start + count]
+                else:
+                    words = [self.memory.get(i, 0) for i in
+                             xrange(source, source + count)]
+                self.block = collections.deque(words)
+            if operand_a in self.outputs:
+                output_ = self.outputs[operand_a]
+                if output_.src_rdy and output_.dst_rdy:
+                    self.block.popleft()
+                    transferred = True
+                    if self.block:
+                        output_.next_q = self.block[0]
+                elif self.block:
+                    output_.q = self.block[0]
+                if self.block:
+                    output_.next_src_rdy = True
+                    wait = True
+                else:
+                    output_.next_src_rdy = False
+            if not wait:
+                self.block = None
         elif instruction["op"] == "float_add":
             a = operand_a
             b = operand_b
@@ -497,7 +768,7 @@ class PythonModel:
             try:
                 result = float_to_bits(float_ / floatb)
             except ZeroDivisionError:
-                result = float_to_bits(float("nan"))
+                result = float_bits(divide_by_zero(float_, floatb))
         elif instruction["op"] == "long_float_add":
             double = bits_to_double(chips_c.join_words(self.a_hi, self.a_lo))
             doubleb = bits_to_double(chips_c.join_words(self.b_hi, self.b_lo))
@@ -520,8 +791,9 @@ class PythonModel:
                 self.a_hi = chips_c.high_word(double_to_bits(double / doubleb))
                 self.a_lo = chips_c.low_word(double_to_bits(double / doubleb))
             except ZeroDivisionError:
-                self.a_hi = chips_c.high_word(double_to_bits(float("nan")))
-                self.a_lo = chips_c.low_word(double_to_bits(float("nan")))
+                quotient = divide_by_zero(double, doubleb)
+                self.a_hi = chips_c.high_word(double_to_bits(quotient))
+                self.a_lo = chips_c.low_word(double_to_bits(quotient))
         elif instruction["op"] == "long_float_file_write":
             long_word = chips_c.join_words(self.a_hi, self.a_lo)
             self.output_files[instruction["file_name"]].write(
@@ -538,42 +810,22 @@ class PythonModel:
                     instruction["file"],
                     instruction["line"])
         elif instruction["op"] == "report":
-            print "%d (report (int) at line: %s in file: %s)" % (
-                to_32_signed(self.a_lo),
-                instruction["line"],
-                instruction["file"],
-            )
+            self.report(instruction, to_32_signed(self.a_lo))
         elif instruction["op"] == "long_report":
-            print "%d (report (long) at line: %s in file: %s)" % (
-                to_64_signed(chips_c.join_words(self.a_hi, self.a_lo)),
-                instruction["line"],
-                instruction["file"],
-            )
+            self.report(
+                instruction,
+                to_64_signed(chips_c.join_words(self.a_hi, self.a_lo)))
         elif instruction["op"] == "float_report":
-            print "%f (report (float) at line: %s in file: %s)" % (
-                bits_to_float(self.a_lo),
-                instruction["line"],
-                instruction["file"],
-            )
+            self.report(instruction, bits_to_float(self.a_lo))
         elif instruction["op"] == "long_float_report":
-            print "%s (report (double) at line: %s in file: %s)" % (
-
-                bits_to_double(chips_c.join_words(self.a_hi, self.a_lo)),
-                instruction["line"],
-                instruction["file"],
-            )
+            self.report(
+                instruction,
+                bits_to_double(chips_c.join_words(self.a_hi, self.a_lo)))
         elif instruction["op"] == "unsigned_report":
-            print "%d (report (unsigned) at line: %s in file: %s)" % (
-                self.a_lo,
-                instruction["line"],
-                instruction["file"],
-            )
+            self.report(instruction, self.a_lo)
         elif instruction["op"] == "long_unsigned_report":
-            print "%d (report (unsigned long) at line: %s in file: %s)" % (
-                chips_c.join_words(self.a_hi, self.a_lo),
-                instruction["line"],
-                instruction["file"],
-            )
+            self.report(
+                instruction, chips_c.join_words(self.a_hi, self.a_lo))
         elif instruction["op"] == "wait_clocks":
             if self.timer == operand_a:
                 wait = False
@@ -594,4 +846,114 @@ class PythonModel:
         if wait:
             self.program_counter = this_instruction
 
+        # waiting for another process to transfer data, a block read or
+        # write isn't blocked while words are being transferred
+        self.waiting = wait
+        self.blocked = wait and not transferred and instruction["op"] in (
+            stream_operations + block_stream_operations)
+
+        if self.latencies is not None and not wait:
+            self.stall = self.cycles(instruction, this_instruction)
+            if self.pool is not None and instruction["op"] in floating_point_units:
+                # wait for the shared core to be granted
+                self.stall += self.pool.request(
+                    floating_point_units[instruction["op"]],
+                    self.clock,
+                    self.latencies[this_instruction])
+
         self.clock += 1
+
+    def activity(self):
+        """What the model did in the last step
+
+        One of "running", "read", "write" (blocked on a handshake) or "wait"
+        (in wait_clocks).
+        """
+
+        op = self.instructions[self.program_counter]["op"]
+        if self.blocked:
+            if op in ["read", "long_read", "block_read"]:
+                return "read"
+            return "write"
+        if self.waiting and op == "wait_clocks":
+            return "wait"
+        return "running"
+
+    def report(self, instruction, value):
+        """Pass a report to the report sink
+
+        The sink is called with the time, the instance name, the file and
+        line of the report, the type reported and the value.
+        """
+
+        if self.report_sink is not None:
+            self.report_sink(
+                self.clock,
+                self.name,
+                instruction["file"],
+                instruction["line"],
+                report_types[instruction["op"]][0],
+                value)
+
+    def binary_file_read(self, instruction):
+        """Read the next word of a binary file
+
+        The file is read binary_buffer_size bytes at a time, and the words
+        unpacked together.
+        """
+
+        words = self.binary_words.get(instruction["file_name"])
+        if not words:
+            data = self.input_files[instruction["file_name"]].read(
+                binary_buffer_size)
+            count = len(data) // binary_word.size
+            if not count:
+                self.end_of_file(instruction)
+            words = list(struct.unpack(
+                "<%uI" % count, data[:count * binary_word.size]))
+            words.reverse()
+            self.binary_words[instruction["file_name"]] = words
+        return words.pop()
+
+    def end_of_file(self, instruction):
+        trace = instruction["trace"]
+        raise C2CHIPError(
+            "no more data in file %s" % instruction["file_name"],
+            trace.filename,
+            trace.lineno)
+
+    def get_blocked_port(self):
+        """The input or output the model is blocked on, or None"""
+
+        if not self.blocked:
+            return None
+        instruction = self.instructions[self.program_counter]
+        handle = self.registers.get(instruction.get("a", 0), 0)
+        if instruction["op"] in ["read", "long_read", "block_read"]:
+            return self.inputs.get(handle)
+        return self.outputs.get(handle)
+
+    def cycles(self, instruction, this_instruction):
+        """Extra clock cycles taken by an instruction in cycle accurate mode
+
+        Reads, writes and waits have already taken some clock cycles waiting
+        for their handshake or timer. Copy and fill take a clock for each
+        word, block reads and writes have already taken a clock for each
+        word, but finish a clock sooner when there are no words.
+        """
+
+        stall = self.latencies[this_instruction] - 1
+        count = self.registers.get(instruction.get("b"), 0) & 0xffff
+        if instruction["op"] in stream_operations:
+            stall -= 1
+        elif instruction["op"] == "wait_clocks":
+            stall = 1
+        elif instruction["op"] in block_stream_operations:
+            if not count:
+                stall -= 1
+        elif instruction["op"] in block_operations:
+            stall += count
+        taken = self.program_counter != this_instruction + 1
+        if taken != (this_instruction in self.predicted):
+            stall += self.branch_penalty
+        return stall
@@ -12,6 +12,7 @@ result_b = 10
 result_b_hi = 11
 thirty_two = 12
 greater_than_32 = 13
+macro_return_address = 14
 
 regmap = {
     "temp": 0,
@@ -28,5 +29,6 @@ regmap = {
     "result_b_hi": 11,
     "thirty_two": 12,
     "greater_than_32": 13,
+    "macro_return_address": 14,
 }
 rregmap = dict((j, i) for i, j in regmap.iteritems())
@@ -23,6 +23,7 @@ class Tokens:
     def __init__(self, filename, parameters={}):
         self.tokens = []
         self.definitions = []
+        self.pragmas = {}
         self.filename = None
         self.lineno = None
         self.scan(
@@ -71,6 +72,7 @@ class Tokens:
 
         token = []
         tokens = []
+        pragmas = {}
         self.lineno = 1
         jump = False
         for line in input_file:
@@ -85,6 +87,14 @@ class Tokens:
                 self.lineno += 1
                 continue
 
+            elif line.strip().startswith("#pragma"):
+                # a pragma applies to the first token that follows it
+                words = line.strip().split()[1:]
+                if words:
+                    pragmas[words[0]] = words[1:]
+                self.lineno += 1
+                continue
+
             elif external_preprocessor and line.strip().startswith("#"):
                 l = line.strip()
                 l = l.lstrip("#")
@@ -223,6 +233,9 @@ class Tokens:
                     token = char
 
                 newline = False
+            if pragmas and tokens and tokens[-1][1] == self.lineno:
+                self.pragmas[(self.filename, self.lineno)] = pragmas
+                pragmas = {}
             self.lineno += 1
 
         self.tokens.extend(tokens)
@@ -266,6 +279,17 @@ class Tokens:
             self.error("Unexpected end of file")
         return token
 
+    def pragma(self, name):
+        """
+        Return the arguments of a pragma applied to the next token in the
+        stream, or None if there is no such pragma.
+        """
+
+        if self.tokens:
+            filename, lineno, token = self.tokens[0]
+            return self.pragmas.get((filename, lineno), {}).get(name)
+        return None
+
     def end(self):
         """Return True if all the tokens have been consumed."""
 
@@ -17,6 +17,9 @@ def calculate_jumps(instructions, extract_constants=False):
             labels[instruction["label"]] = location
         elif instruction["op"] == "constant" and extract_constants:
             initial_contents[instruction["offset"]] = instruction["value"]
+        elif instruction["op"] == "rom" and extract_constants:
+            for index, value in enumerate(instruction["values"]):
+                initial_contents[instruction["offset"] + index] = value
         else:
             new_instructions.append(instruction)
             location += 1
@@ -31,3 +34,21 @@ def calculate_jumps(instructions, extract_constants=False):
         return instructions, initial_contents
     else:
         return instructions
+
+
+def split_rom(initial_contents):
+    """Separate the contents of the ROM from the contents of the data memory
+
+    The ROM ends at address -1, returns the initial contents of the data
+    memory, and a list of the ROM contents starting at the lowest address.
+    """
+
+    memory_contents = {}
+    rom_size = 0
+    for location, content in initial_contents.iteritems():
+        if location < 0:
+            rom_size += 1
+        else:
+            memory_contents[location] = content
+    rom_contents = [initial_contents[i] for i in range(-rom_size, 0)]
+    return memory_contents, rom_contents
@@ -13,7 +13,8 @@ The area optimized implementation uses a CPU like architecture.
 __author__ = "Jon Dawson"
 __copyright__ = "Copyright (C) 2013, Jonathan P Dawson"
 
-from utils import calculate_jumps
+from chips.compiler.exceptions import C2CHIPError
+from utils import calculate_jumps, split_rom
 from textwrap import dedent
 
 
@@ -37,6 +38,16 @@ def print_verilog_literal(size, value):
         return "-%s'd%s" % (size, abs(value))
 
 
+def encode_instruction(instruction, opcode_bits):
+    """The instruction ROM word for an encoded instruction"""
+
+    return (
+        instruction["op"] << 24 |
+        (instruction.get("z", 0) & 0xf) << 20 |
+        (instruction.get("a", 0) & 0xf) << 16 |
+        (instruction["literal"] | instruction.get("b", 0)) & 0xffff)
+
+
 def generate_instruction_set(instructions):
     """Calculate the required instruction set"""
 
@@ -116,14 +127,14 @@ def generate_declarations(
     inputs = allocator.input_names.values()
     outputs = allocator.output_names.values()
     input_files = set([i["file_name"]
-                       for i in instructions if "file_read" == i["op"]])
+                       for i in instructions if i["op"] in ("file_read", "binary_file_read")])
     output_files = set([i["file_name"]
-                        for i in instructions if i["op"] in ("file_write", "float_file_write", "long_float_file_write")])
+                        for i in instructions if i["op"].endswith("file_write")])
     testbench = not inputs and not outputs and not no_tb_mode
 
     # Do not generate a port in testbench mode
     inports = [
-        ("input_" + i, 32) for i in inputs
+        ("input_" + i, allocator.input_widths[i]) for i in inputs
     ] + [
         ("input_" + i + "_stb", 1) for i in inputs
     ] + [
@@ -131,7 +142,7 @@ def generate_declarations(
     ]
 
     outports = [
-        ("output_" + i, 32) for i in outputs
+        ("output_" + i, allocator.output_widths[i]) for i in outputs
     ] + [
         ("output_" + i + "_stb", 1) for i in outputs
     ] + [
@@ -177,11 +188,15 @@ def generate_declarations(
     ] + [
         ("s_output_" + i + "_stb", 32) for i in outputs
     ] + [
-        ("s_output_" + i, 32) for i in outputs
+        ("s_output_" + i, allocator.output_widths[i]) for i in outputs
     ] + [
         ("s_input_" + i + "_ack", 32) for i in inputs
     ]
 
+    # binary files are read a word at a time, most significant byte first
+    if "binary_file_read" in [i["op"] for i in instructions]:
+        signals.append(("file_word", 32))
+
     if testbench:
         signals.append(("clk", 1))
         signals.append(("rst", 1))
@@ -241,35 +256,231 @@ def floating_point_enables(instruction_set):
     return floating_point_arithmetic, floating_point_conversions, floating_point_debug
 
 
-def generate_CHIP(input_file,
-                  name,
-                  instructions,
-                  output_file,
-                  allocator,
-                  initialize_memory,
-                  memory_size=1024,
-                  no_tb_mode=False,
-                  options={}):
-    """A big ugly function to crunch through all the instructions and generate the CHIP equivilent"""
-
-    instructions, initial_memory_contents = calculate_jumps(instructions, True)
-    instruction_set, instruction_memory = generate_instruction_set(
-        instructions)
-    opcodes = [i["op"] for i in instruction_set]
-    register_bits = 16
-    opcode_bits = log2(len(instruction_set))
-    instruction_bits = 16 + 4 + 4 + opcode_bits
-    declarations = generate_declarations(
-        instructions,
-        no_tb_mode,
-        register_bits,
-        opcode_bits,
-        allocator)
-    inputs, outputs, input_files, output_files, testbench, inports, outports, signals = declarations
-    floating_point_arithmetic, floating_point_conversions, floating_point_debug  = floating_point_enables(
-        instruction_set)
+# Generated files are written in large chunks.
+output_buffer_size = 1 << 20
+
+# Extra clock cycles needed to refill the pipeline after a taken branch, call
+# or return.
+branch_penalty = 2
+
+# Instructions which jump to a label.
+branch_operations = ["goto", "call", "jmp_if_false", "jmp_if_true"]
+
+
+def predict_taken(op, backward, options={}):
+    """True if a branch is predicted to be taken
+
+    With the branch_prediction option, gotos and calls, and conditional
+    branches to an earlier instruction (usually the end of a loop), are
+    redirected as soon as they are fetched. A branch costs branch_penalty
+    extra clock cycles only when the prediction is wrong.
+    """
+
+    if "branch_prediction" not in options:
+        return False
+    if op in ["goto", "call"]:
+        return True
+    return op in ["jmp_if_false", "jmp_if_true"] and backward
+
+
+def predicted_branches(instructions, options={}):
+    """The addresses of the branches which are predicted to be taken
+
+    The instructions must have been through calculate_jumps.
+    """
+
+    return set([
+        address for address, instruction in enumerate(instructions)
+        if instruction["op"] in branch_operations and predict_taken(
+            instruction["op"], instruction["label"] <= address, options)
+    ])
+
+# Instructions which transfer data through an input or output.
+stream_operations = ["read", "write", "long_read", "long_write"]
+
+# Instructions which stream a block of data memory through an input or
+# output, one word in each clock.
+block_stream_operations = ["block_read", "block_write"]
+
+# Instructions which copy, fill or stream a block of data memory, one word in
+# each clock. The z register holds the address of the block, it is read
+# rather than written.
+block_operations = ["copy", "fill"] + block_stream_operations
+
+# The floating point core used by each floating point instruction.
+floating_point_units = {
+    "float_add": "adder",
+    "float_subtract": "adder",
+    "float_multiply": "multiplier",
+    "float_divide": "divider",
+    "long_float_add": "double_adder",
+    "long_float_subtract": "double_adder",
+    "long_float_multiply": "double_multiplier",
+    "long_float_divide": "double_divider",
+    "int_to_float": "int_to_float",
+    "float_to_int": "float_to_int",
+    "long_to_double": "long_to_double",
+    "double_to_long": "double_to_long",
+    "float_to_double": "float_to_double",
+    "double_to_float": "double_to_float",
+}
+
+# Clock cycles taken by each floating point core between accepting its
+# operands and presenting a result as (typical, worst case). The cores iterate
+# while aligning and normalising, so the time taken depends on the data. The
+# typical figure assumes normalised operands of similar magnitude, and small
+# values for conversions, the worst case allows for the largest number of
+# iterations.
+floating_point_latency = {
+    "adder": (9, 290),
+    "multiplier": (10, 110),
+    "divider": (109, 160),
+    "double_adder": (10, 2110),
+    "double_multiplier": (11, 230),
+    "double_divider": (226, 330),
+    "int_to_float": (34, 38),
+    "float_to_int": (34, 35),
+    "long_to_double": (66, 70),
+    "double_to_long": (66, 68),
+    "float_to_double": (1, 27),
+    "double_to_float": (1, 30),
+}
+
+# Extra clock cycles taken to grant a shared floating point core, see the
+# shared_fpu option of Chip.
+arbitration_latency = 1
+
+# The quotient bits found in each clock by the integer dividers, see the
+# divider option.
+divider_radix_bits = {"radix2": 1, "radix4": 2, "radix16": 4}
+
+
+def arithmetic_units(options={}):
+    """The integer multiplier and divider selected by the options
+
+    The multiplier option is partial (default), which adds four 16 bit
+    partial products in a second clock, or dsp, which multiplies in a single
+    clock. The divider option is radix2 (default), radix4 or radix16, and
+    sets the number of quotient bits found in each clock. The divide_latency
+    and long_divide_latency options override the clocks taken by the
+    dividers. Returns (multiplier, divide_latency, long_divide_latency).
+    """
+
+    multiplier = options.get("multiplier", "partial")
+    if multiplier not in ["partial", "dsp"]:
+        raise C2CHIPError(
+            "unknown multiplier %s, expected partial or dsp" % multiplier)
+
+    divider = options.get("divider", "radix2")
+    if divider not in divider_radix_bits:
+        raise C2CHIPError(
+            "unknown divider %s, expected radix2, radix4 or radix16" %
+            divider)
+    bits = divider_radix_bits[divider]
+
+    divide_latency = int(options.get("divide_latency", 32 / bits))
+    long_divide_latency = int(options.get("long_divide_latency", 64 / bits))
+    for latency, width in [(divide_latency, 32), (long_divide_latency, 64)]:
+        if latency < 1 or width % latency:
+            raise C2CHIPError(
+                "divider latency %s must divide %u exactly" % (latency, width))
+
+    return multiplier, divide_latency, long_divide_latency
+
+
+def instruction_latency(op, options={}, worst_case=False):
+    """Clock cycles taken to execute an instruction
+
+    The figures follow the state machine generated by generate_CHIP. The
+    branch_penalty must be added when a branch is taken. Reads and writes
+    are given the time needed to complete a handshake with a ready partner,
+    wait_clocks excludes the clocks waited, and the block instructions
+    exclude the clock taken by each word.
+    """
+
+    multiplier, divide_latency, long_divide_latency = arithmetic_units(
+        options)
+
+    if op in ["label", "constant", "rom"]:
+        return 0
+    elif op == "multiply":
+        return 1 if multiplier == "dsp" else 2
+    elif op in ["load", "long_multiply"]:
+        return 2
+    elif op in ["divide", "unsigned_divide", "modulo", "unsigned_modulo"]:
+        return divide_latency + 2
+    elif op in [
+            "long_divide",
+            "unsigned_long_divide",
+            "long_modulo",
+            "unsigned_long_modulo"]:
+        return long_divide_latency + 2
+    elif op in stream_operations + block_stream_operations:
+        return 3
+    elif op in ["wait_clocks", "copy", "fill"]:
+        return 2
+    elif op in floating_point_units:
+        typical, worst = floating_point_latency[floating_point_units[op]]
+        latency = worst if worst_case else typical
+        if floating_point_units[op] != op:
+            # arithmetic, write a, write b and read z handshakes
+            return 1 + 2 + 2 + latency + 2
+        else:
+            # conversion, write a and read z handshakes
+            return 1 + 2 + latency + 2
+    else:
+        return 1
+
+
+def shared_floating_point_ports(units):
+    """The ports which connect a process to shared floating point cores
+
+    With the shared_fpu option, the cores are instanced once in the chip,
+    and each process uses the same handshakes through its ports. Returns the
+    inputs and outputs as lists of (name, size).
+    """
+
+    inports = []
+    outports = []
+    for unit in units:
+        if unit in floating_point_units:
+            # conversion
+            in_width = 64 if unit.startswith(("long", "double")) else 32
+            out_width = 64 if unit.endswith(("long", "double")) else 32
+            outports += [
+                ("%s_in" % unit, in_width),
+                ("%s_in_stb" % unit, 1),
+                ("%s_out_ack" % unit, 1)]
+            inports += [
+                ("%s_in_ack" % unit, 1),
+                ("%s_out" % unit, out_width),
+                ("%s_out_stb" % unit, 1)]
+        else:
+            width = 64 if unit.startswith("double") else 32
+            outports += [
+                ("%s_a" % unit, width),
+                ("%s_a_stb" % unit, 1),
+                ("%s_b" % unit, width),
+                ("%s_b_stb" % unit, 1),
+                ("%s_z_ack" % unit, 1)]
+            inports += [
+                ("%s_a_ack" % unit, 1),
+                ("%s_b_ack" % unit, 1),
+                ("%s_z" % unit, width),
+                ("%s_z_stb" % unit, 1)]
+    return inports, outports
+
+
+def write_header(
+        output_file,
+        name,
+        input_file,
+        inputs,
+        outputs,
+        inports,
+        outports):
+    """Write the file header and the module port list"""
 
-    # output the code in verilog
     output_file.write("//name : %s\n" % name)
     for i in inputs:
         output_file.write("//input : input_%s:16\n" % i)
@@ -291,7 +502,7 @@ def generate_CHIP(input_file,
 
     output_file.write("module %s" % name)
 
-    all_ports = [name for name, size in inports + outports] + ["exception"]
+    all_ports = [port for port, size in inports + outports] + ["exception"]
     if all_ports:
         output_file.write("(")
         output_file.write(",".join(all_ports))
@@ -299,7 +510,13 @@ def generate_CHIP(input_file,
     else:
         output_file.write(";\n")
 
-    output_file.write("  integer file_count;\n")
+
+def write_floating_point_declarations(
+        output_file,
+        floating_point_arithmetic,
+        floating_point_conversions,
+        floating_point_debug):
+    """Declare the signals connecting the floating point cores"""
 
     for i in floating_point_arithmetic:
 
@@ -339,6 +556,289 @@ def generate_CHIP(input_file,
     if floating_point_debug:
         output_file.write("  real fp_value;\n")
 
+
+def write_testbench(output_file, testbench):
+    """Generate a clock and reset in testbench mode"""
+
+    if testbench:
+
+        output_file.write(
+            "\n  //////////////////////////////////////////////////////////////////////////////\n")
+        output_file.write(
+            "  // CLOCK AND RESET GENERATION                                                 \n")
+        output_file.write(
+            "  //                                                                            \n")
+        output_file.write(
+            "  // This file was generated in test bench mode. In this mode, the verilog      \n")
+        output_file.write(
+            "  // output file can be executed directly within a verilog simulator.           \n")
+        output_file.write(
+            "  // In test bench mode, a simulated clock and reset signal are generated within\n")
+        output_file.write(
+            "  // the output file.                                                           \n")
+        output_file.write(
+            "  // Verilog files generated in testbecnch mode are not suitable for synthesis, \n")
+        output_file.write(
+            "  // or for instantiation within a larger design.\n")
+
+        output_file.write("  \n  initial\n")
+        output_file.write("  begin\n")
+        output_file.write("    rst <= 1'b1;\n")
+        output_file.write("    #50 rst <= 1'b0;\n")
+        output_file.write("  end\n\n")
+
+        output_file.write("  \n  initial\n")
+        output_file.write("  begin\n")
+        output_file.write("    clk <= 1'b0;\n")
+        output_file.write("    while (1) begin\n")
+        output_file.write("      #5 clk <= ~clk;\n")
+        output_file.write("    end\n")
+        output_file.write("  end\n\n")
+
+
+def write_floating_point_instances(
+        output_file,
+        floating_point_arithmetic,
+        floating_point_conversions):
+    """Instance the floating point cores used by the process"""
+
+    if floating_point_arithmetic or floating_point_conversions:
+
+        output_file.write(
+            "\n  //////////////////////////////////////////////////////////////////////////////\n")
+        output_file.write(
+            "  // Floating Point Arithmetic                                                  \n")
+        output_file.write(
+            "  //                                                                            \n")
+        output_file.write(
+            "  // Generate IEEE 754 single precision divider, adder and multiplier           \n")
+        output_file.write(
+            "  //                                                                            \n")
+
+        for i in floating_point_arithmetic:
+            output_file.write("  %s %s_inst(\n" % (i, i))
+            output_file.write("    .clk(clk),\n")
+            output_file.write("    .rst(rst),\n")
+            output_file.write("    .input_a(%s_a),\n" % i)
+            output_file.write("    .input_a_stb(%s_a_stb),\n" % i)
+            output_file.write("    .input_a_ack(%s_a_ack),\n" % i)
+            output_file.write("    .input_b(%s_b),\n" % i)
+            output_file.write("    .input_b_stb(%s_b_stb),\n" % i)
+            output_file.write("    .input_b_ack(%s_b_ack),\n" % i)
+            output_file.write("    .output_z(%s_z),\n" % i)
+            output_file.write("    .output_z_stb(%s_z_stb),\n" % i)
+            output_file.write("    .output_z_ack(%s_z_ack)\n" % i)
+            output_file.write("  );\n")
+
+        for i in floating_point_conversions:
+            output_file.write("  %s %s_inst(\n" % (i, i))
+            output_file.write("    .clk(clk),\n")
+            output_file.write("    .rst(rst),\n")
+            output_file.write("    .input_a(%s_in),\n" % i)
+            output_file.write("    .input_a_stb(%s_in_stb),\n" % i)
+            output_file.write("    .input_a_ack(%s_in_ack),\n" % i)
+            output_file.write("    .output_z(%s_out),\n" % i)
+            output_file.write("    .output_z_stb(%s_out_stb),\n" % i)
+            output_file.write("    .output_z_ack(%s_out_ack)\n" % i)
+            output_file.write("  );\n")
+
+
+def write_hex_file(file_name, words):
+    """Write (address, value) pairs in the format read by $readmemh"""
+
+    hex_file = open(file_name, "w", output_buffer_size)
+    hex_file.write("".join(
+        ["@%x %x\n" % (address, value) for address, value in words]))
+    hex_file.close()
+
+
+def write_memory_initialization(
+        output_file, initial_memory_contents, hex_file=None):
+    """Initialise the data memory with the contents of global arrays
+
+    If hex_file is given, the contents are written to a separate file, which
+    is loaded using $readmemh.
+    """
+
+    output_file.write("\n  //////////////////////////////////////////////////////////////////////////////\n")
+    output_file.write("  // MEMORY INITIALIZATION                                                      \n")
+    output_file.write("  //                                                                            \n")
+    output_file.write("  // In order to reduce program size, array contents have been stored into      \n")
+    output_file.write("  // memory at initialization. In an FPGA, this will result in the memory being \n")
+    output_file.write("  // initialized when the FPGA configures.                                      \n")
+    output_file.write("  // Memory will not be re-initialized at reset.                                \n")
+    output_file.write("  // Dissable this behaviour using the no_initialize_memory switch              \n")
+    output_file.write("  \n  initial\n")
+    output_file.write("  begin\n")
+    if hex_file is not None and initial_memory_contents:
+        write_hex_file(hex_file, [
+            (location, content & 0xffffffff) for location, content in
+            sorted(initial_memory_contents.iteritems())])
+        output_file.write("    $readmemh(\"%s\", memory);\n" % hex_file)
+    else:
+        output_file.write("".join([
+            "    memory[%s] = %s;\n" % (location, content)
+            for location, content in initial_memory_contents.iteritems()]))
+    output_file.write("  end\n\n")
+
+
+def write_rom(output_file, rom_contents, hex_file=None):
+    """Implement the ROM holding const arrays
+
+    The ROM is at the top of the data address space, loads from these
+    addresses are routed to the ROM. If hex_file is given, the contents are
+    written to a separate file, which is loaded using $readmemh.
+    """
+
+    rom_start = 0x10000 - len(rom_contents)
+    output_file.write(
+        "\n  //////////////////////////////////////////////////////////////////////////////\n")
+    output_file.write(
+        "  // CONST ROM                                                                  \n")
+    output_file.write(
+        "  //                                                                            \n")
+    output_file.write(
+        "  // const arrays are stored in a ROM, at the top of the address space           \n")
+    output_file.write("  \n  reg [31:0] rom [65535:%i];\n" % rom_start)
+    output_file.write("  reg [31:0] rom_data;\n")
+    output_file.write("  reg load_rom;\n")
+    output_file.write("  \n  initial\n")
+    output_file.write("  begin\n")
+    if hex_file is not None:
+        write_hex_file(hex_file, [
+            (rom_start + location, content)
+            for location, content in enumerate(rom_contents)])
+        output_file.write("    $readmemh(\"%s\", rom);\n" % hex_file)
+    else:
+        output_file.write("".join([
+            "    rom[%s] = %s;\n" % (rom_start + location, content)
+            for location, content in enumerate(rom_contents)]))
+    output_file.write("  end\n\n")
+    output_file.write("  \n  always @(posedge clk)\n")
+    output_file.write("  begin\n")
+    output_file.write("    rom_data <= rom[load_address];\n")
+    output_file.write("    load_rom <= load_address >= %i;\n" % rom_start)
+    output_file.write("  end\n\n")
+
+
+def loaded_data(rom_contents):
+    """The value returned by a load from the data memory or the ROM"""
+
+    if rom_contents:
+        return "(load_rom ? rom_data : load_data)"
+    return "load_data"
+
+
+def check_address_space(input_file, memory_size, rom_contents):
+    """The data memory and the ROM share a 16 bit address space"""
+
+    if memory_size + len(rom_contents) > 0x10000:
+        raise C2CHIPError(
+            "memory_size is %u, and const arrays use %u words, there are only "
+            "65536 addresses" % (memory_size, len(rom_contents)),
+            input_file)
+
+
+def write_open_files(output_file, input_files, output_files, binary_files):
+    """Open all the files used by the process at the start of the simulation"""
+
+    if input_files or output_files:
+
+        output_file.write(
+            "\n  //////////////////////////////////////////////////////////////////////////////\n")
+        output_file.write(
+            "  // OPEN FILES                                                                 \n")
+        output_file.write(
+            "  //                                                                            \n")
+        output_file.write(
+            "  // Open all files used at the start of the process                            \n")
+
+        output_file.write("  \n  initial\n")
+        output_file.write("  begin\n")
+        for file_name, file_ in input_files.iteritems():
+            if file_name in binary_files:
+                output_file.write(
+                    "    %s = $fopen(\"%s\", \"rb\");\n" %
+                    (file_, file_name))
+            else:
+                output_file.write(
+                    "    %s = $fopen(\"%s\", \"r\");\n" %
+                    (file_, file_name))
+        for file_name, file_ in output_files.iteritems():
+            if file_name in binary_files:
+                output_file.write(
+                    "    %s = $fopen(\"%s\", \"wb\");\n" %
+                    (file_, file_name))
+            else:
+                output_file.write(
+                    "    %s = $fopen(\"%s\");\n" %
+                    (file_, file_name))
+        output_file.write("  end\n\n")
+
+
+def generate_CHIP(input_file,
+                  name,
+                  instructions,
+                  output_file,
+                  allocator,
+                  initialize_memory,
+                  memory_size=1024,
+                  no_tb_mode=False,
+                  options={}):
+    """A big ugly function to crunch through all the instructions and generate the CHIP equivilent"""
+
+    instructions, initial_memory_contents = calculate_jumps(instructions, True)
+    initial_memory_contents, rom_contents = split_rom(initial_memory_contents)
+    check_address_space(input_file, memory_size, rom_contents)
+    instruction_set, instruction_memory = generate_instruction_set(
+        instructions)
+    opcodes = [i["op"] for i in instruction_set]
+    branch_prediction = "branch_prediction" in options
+    fetch_address = "program_counter"
+    if branch_prediction:
+        fetch_address = "fetch_address"
+    register_bits = 16
+    opcode_bits = log2(len(instruction_set))
+    instruction_bits = 16 + 4 + 4 + opcode_bits
+    declarations = generate_declarations(
+        instructions,
+        no_tb_mode,
+        register_bits,
+        opcode_bits,
+        allocator)
+    inputs, outputs, input_files, output_files, testbench, inports, outports, signals = declarations
+    binary_files = set([i["file_name"]
+                        for i in instructions if "binary" in i["op"]])
+    floating_point_arithmetic, floating_point_conversions, floating_point_debug  = floating_point_enables(
+        instruction_set)
+
+    # With the shared_fpu option, the floating point cores are instanced by
+    # the chip, and shared with other processes
+    shared_units = []
+    if "shared_fpu" in options and not testbench:
+        shared_units = (sorted(floating_point_arithmetic) +
+                        sorted(floating_point_conversions))
+    shared_inports, shared_outports = shared_floating_point_ports(
+        shared_units)
+
+    # output the code in verilog
+    write_header(
+        output_file,
+        name,
+        input_file,
+        inputs,
+        outputs,
+        inports + shared_inports,
+        outports + shared_outports)
+
+    output_file.write("  integer file_count;\n")
+
+    write_floating_point_declarations(
+        output_file,
+        floating_point_arithmetic,
+        floating_point_conversions,
+        floating_point_debug)
+
     states = [
         "stop",
         "instruction_fetch",
@@ -350,9 +850,13 @@ def generate_CHIP(input_file,
 
     if inports:
         states.append("read")
+        if "long_read" in opcodes:
+            states.append("long_read")
 
     if outports:
         states.append("write")
+        if "long_write" in opcodes:
+            states.append("long_write")
 
     needs_divider = False
     for i in ["divide", "unsigned_divide", "modulo", "unsigned_modulo"]:
@@ -366,14 +870,20 @@ def generate_CHIP(input_file,
             states.append(i)
             needs_long_divider = True
 
-    if "multiply" in opcodes:
+    multiplier, divide_latency, long_divide_latency = arithmetic_units(
+        options)
+    divide_iterations = 32/divide_latency
+    long_divide_iterations = 64/long_divide_latency
+
+    if "multiply" in opcodes and multiplier == "partial":
         states.append("multiply")
 
-    divide_latency = options.get("divide_latency", 32)
-    divide_iterations = 32/divide_latency
+    if "long_multiply" in opcodes:
+        states.append("long_multiply")
 
-    long_divide_latency = options.get("long_divide_latency", 64)
-    long_divide_iterations = 64/long_divide_latency
+    for i in block_operations:
+        if i in opcodes:
+            states.append(i)
 
     for i in floating_point_arithmetic:
         states.append("%s_write_a" % i)
@@ -419,14 +929,14 @@ def generate_CHIP(input_file,
             output_file.write(name)
             output_file.write(";\n")
 
-    for name, size in inports:
-        write_declaration("  input ", name, size)
+    for port, size in inports + shared_inports:
+        write_declaration("  input ", port, size)
 
-    for name, size in outports:
-        write_declaration("  output ", name, size)
+    for port, size in outports + shared_outports:
+        write_declaration("  output ", port, size)
 
-    for name, size in signals:
-        write_declaration("  reg ", name, size)
+    for signal, size in signals:
+        write_declaration("  reg ", signal, size)
 
     output_file.write("  output reg exception;\n")
     output_file.write(
@@ -449,6 +959,10 @@ def generate_CHIP(input_file,
     output_file.write("  wire  store_enable;\n")
     output_file.write("  wire  forward_a;\n")
     output_file.write("  wire  forward_b;\n")
+    if branch_prediction:
+        output_file.write("  wire  predict;\n")
+        output_file.write("  reg   predicted_2;\n")
+        output_file.write("  wire [15:0] fetch_address;\n")
 
     if needs_divider:
       output_file.write("  reg [31:0] shifter;\n")
@@ -470,106 +984,49 @@ def generate_CHIP(input_file,
       output_file.write("  reg long_quotient_sign;\n")
       output_file.write("  reg long_dividend_sign;\n")
 
-    if "multiply" in opcodes:
+    if "multiply" in opcodes and multiplier == "partial":
       output_file.write("  reg [31:0] product_a;\n")
       output_file.write("  reg [31:0] product_b;\n")
       output_file.write("  reg [31:0] product_c;\n")
       output_file.write("  reg [31:0] product_d;\n")
 
-    # generate clock and reset in testbench mode
-    if testbench:
-
-        output_file.write(
-            "\n  //////////////////////////////////////////////////////////////////////////////\n")
-        output_file.write(
-            "  // CLOCK AND RESET GENERATION                                                 \n")
-        output_file.write(
-            "  //                                                                            \n")
-        output_file.write(
-            "  // This file was generated in test bench mode. In this mode, the verilog      \n")
-        output_file.write(
-            "  // output file can be executed directly within a verilog simulator.           \n")
-        output_file.write(
-            "  // In test bench mode, a simulated clock and reset signal are generated within\n")
-        output_file.write(
-            "  // the output file.                                                           \n")
-        output_file.write(
-            "  // Verilog files generated in testbecnch mode are not suitable for synthesis, \n")
-        output_file.write(
-            "  // or for instantiation within a larger design.\n")
-
-        output_file.write("  \n  initial\n")
-        output_file.write("  begin\n")
-        output_file.write("    rst <= 1'b1;\n")
-        output_file.write("    #50 rst <= 1'b0;\n")
-        output_file.write("  end\n\n")
-
-        output_file.write("  \n  initial\n")
-        output_file.write("  begin\n")
-        output_file.write("    clk <= 1'b0;\n")
-        output_file.write("    while (1) begin\n")
-        output_file.write("      #5 clk <= ~clk;\n")
-        output_file.write("    end\n")
-        output_file.write("  end\n\n")
-
-    # Instance Floating Point Arithmetic
-    if floating_point_arithmetic or floating_point_conversions:
-
-        output_file.write(
-            "\n  //////////////////////////////////////////////////////////////////////////////\n")
-        output_file.write(
-            "  // Floating Point Arithmetic                                                  \n")
-        output_file.write(
-            "  //                                                                            \n")
-        output_file.write(
-            "  // Generate IEEE 754 single precision divider, adder and multiplier           \n")
-        output_file.write(
-            "  //                                                                            \n")
-
-        for i in floating_point_arithmetic:
-            output_file.write("  %s %s_inst(\n" % (i, i))
-            output_file.write("    .clk(clk),\n")
-            output_file.write("    .rst(rst),\n")
-            output_file.write("    .input_a(%s_a),\n" % i)
-            output_file.write("    .input_a_stb(%s_a_stb),\n" % i)
-            output_file.write("    .input_a_ack(%s_a_ack),\n" % i)
-            output_file.write("    .input_b(%s_b),\n" % i)
-            output_file.write("    .input_b_stb(%s_b_stb),\n" % i)
-            output_file.write("    .input_b_ack(%s_b_ack),\n" % i)
-            output_file.write("    .output_z(%s_z),\n" % i)
-            output_file.write("    .output_z_stb(%s_z_stb),\n" % i)
-            output_file.write("    .output_z_ack(%s_z_ack)\n" % i)
-            output_file.write("  );\n")
-
-        for i in floating_point_conversions:
-            output_file.write("  %s %s_inst(\n" % (i, i))
-            output_file.write("    .clk(clk),\n")
-            output_file.write("    .rst(rst),\n")
-            output_file.write("    .input_a(%s_in),\n" % i)
-            output_file.write("    .input_a_stb(%s_in_stb),\n" % i)
-            output_file.write("    .input_a_ack(%s_in_ack),\n" % i)
-            output_file.write("    .output_z(%s_out),\n" % i)
-            output_file.write("    .output_z_stb(%s_out_stb),\n" % i)
-            output_file.write("    .output_z_ack(%s_out_ack)\n" % i)
-            output_file.write("  );\n")
-
-     # Generate a state machine to execute the instructions
-    #if initialize_memory and allocator.memory_content:
-#
-    output_file.write("\n  //////////////////////////////////////////////////////////////////////////////\n")
-    output_file.write("  // MEMORY INITIALIZATION                                                      \n")
-    output_file.write("  //                                                                            \n")
-    output_file.write("  // In order to reduce program size, array contents have been stored into      \n")
-    output_file.write("  // memory at initialization. In an FPGA, this will result in the memory being \n")
-    output_file.write("  // initialized when the FPGA configures.                                      \n")
-    output_file.write("  // Memory will not be re-initialized at reset.                                \n")
-    output_file.write("  // Dissable this behaviour using the no_initialize_memory switch              \n")
-#
-    output_file.write("  \n  initial\n")
-    output_file.write("  begin\n")
-    for location, content in initial_memory_contents.iteritems():
-        output_file.write("    memory[%s] = %s;\n"%(location, content))
-    output_file.write("  end\n\n")
+    if "long_multiply" in opcodes:
+      output_file.write("  reg [63:0] long_product_a;\n")
+      output_file.write("  reg [31:0] long_product_b;\n")
+      output_file.write("  reg [31:0] long_product_c;\n")
+
+    needs_block = set(opcodes) & set(block_operations)
+    if needs_block:
+      output_file.write("  wire [31:0] register_z;\n")
+      output_file.write("  wire [31:0] operand_z;\n")
+      output_file.write("  wire  forward_z;\n")
+      output_file.write("  reg [15:0] block_source;\n")
+      output_file.write("  reg [15:0] block_destination;\n")
+      output_file.write("  reg [15:0] block_count;\n")
+      output_file.write("  reg [31:0] block_value;\n")
+      output_file.write("  reg block_loaded;\n")
+
+    write_testbench(output_file, testbench)
+
+    write_floating_point_instances(
+        output_file,
+        floating_point_arithmetic - set(shared_units),
+        floating_point_conversions - set(shared_units))
+
+    # With the readmemh option, the instruction ROM and the data memory are
+    # initialised from separate files, and the listing option writes the
+    # comments to a separate listing file.
+    readmemh = "readmemh" in options
+    memory_file = None
+    if readmemh:
+        memory_file = "%s_memory.hex" % name
+    write_memory_initialization(
+        output_file, initial_memory_contents, memory_file)
+    if rom_contents:
+        rom_file = None
+        if readmemh:
+            rom_file = "%s_rom.hex" % name
+        write_rom(output_file, rom_contents, rom_file)
     output_file.write(
         "\n  //////////////////////////////////////////////////////////////////////////////\n")
     output_file.write(
@@ -578,57 +1035,63 @@ def generate_CHIP(input_file,
         "  //                                                                            \n")
     output_file.write(
         "  // Initialise the contents of the instruction memory                          \n")
-    output_file.write("  //\n")
-    output_file.write("  // Intruction Set\n")
-    output_file.write("  // ==============\n")
-    for num, opcode in enumerate(instruction_set):
-        output_file.write("  // %s %s\n" % (num, opcode))
-
-    output_file.write("  // Intructions\n")
-    output_file.write("  // ===========\n")
-    output_file.write("  \n  initial\n")
-    output_file.write("  begin\n")
-    for location, instruction in enumerate(instruction_memory):
-        output_file.write("    instructions[%s] = {%s, %s, %s, %s};//%s : %s %s\n" % (
-            location,
-            print_verilog_literal(opcode_bits, instruction["op"]),
-            print_verilog_literal(4, instruction.get("z", 0)),
-            print_verilog_literal(4, instruction.get("a", 0)),
-            print_verilog_literal(
-            16, instruction["literal"] | instruction.get("b", 0)),
-            instruction["filename"],
-            instruction["lineno"],
-            instruction["comment"],
-        ))
-    output_file.write("  end\n\n")
-
-    if input_files or output_files:
-
-        output_file.write(
-            "\n  //////////////////////////////////////////////////////////////////////////////\n")
-        output_file.write(
-            "  // OPEN FILES                                                                 \n")
-        output_file.write(
-            "  //                                                                            \n")
+    if "listing" in options:
+        listing = open("%s.lst" % name, "w", output_buffer_size)
+        listing.write("".join(
+            ["%s %s\n" % (num, opcode)
+             for num, opcode in enumerate(instruction_set)]))
+        listing.write("".join([
+            "%s %0*x %s : %s %s\n" % (
+                location,
+                (instruction_bits + 3) / 4,
+                encode_instruction(instruction, opcode_bits),
+                instruction["filename"],
+                instruction["lineno"],
+                instruction["comment"])
+            for location, instruction in enumerate(instruction_memory)]))
+        listing.close()
+
+    if readmemh:
+        instruction_file = "%s_instructions.hex" % name
+        write_hex_file(instruction_file, [
+            (location, encode_instruction(instruction, opcode_bits))
+            for location, instruction in enumerate(instruction_memory)])
+        output_file.write("  \n  initial\n")
+        output_file.write("  begin\n")
         output_file.write(
-            "  // Open all files used at the start of the process                            \n")
-
+            "    $readmemh(\"%s\", instructions);\n" % instruction_file)
+        output_file.write("  end\n\n")
+    else:
+        output_file.write("  //\n")
+        output_file.write("  // Intruction Set\n")
+        output_file.write("  // ==============\n")
+        for num, opcode in enumerate(instruction_set):
+            output_file.write("  // %s %s\n" % (num, opcode))
+
+        output_file.write("  // Intructions\n")
+        output_file.write("  // ===========\n")
         output_file.write("  \n  initial\n")
         output_file.write("  begin\n")
-        for file_name, file_ in input_files.iteritems():
-            output_file.write(
-                "    %s = $fopenr(\"%s\");\n" %
-                (file_, file_name))
-        for file_name, file_ in output_files.iteritems():
-            output_file.write(
-                "    %s = $fopen(\"%s\");\n" %
-                (file_, file_name))
+        output_file.write("".join([
+            "    instructions[%s] = {%s, %s, %s, %s};//%s : %s %s\n" % (
+                location,
+                print_verilog_literal(opcode_bits, instruction["op"]),
+                print_verilog_literal(4, instruction.get("z", 0)),
+                print_verilog_literal(4, instruction.get("a", 0)),
+                print_verilog_literal(
+                16, instruction["literal"] | instruction.get("b", 0)),
+                instruction["filename"],
+                instruction["lineno"],
+                instruction["comment"],
+            ) for location, instruction in enumerate(instruction_memory)]))
         output_file.write("  end\n\n")
 
+    write_open_files(output_file, input_files, output_files, binary_files)
+
     output_file.write("  \n  always @(posedge clk)\n")
     output_file.write("  begin\n")
     output_file.write("    load_data <= memory[load_address];\n")
-    output_file.write("    if(store_enable && state == execute) begin\n")
+    output_file.write("    if(store_enable) begin\n")
     output_file.write("      if (store_address > %i) begin\n"%(memory_size-1))
     output_file.write("        $display(\"!!!!stack overflow!!!!\");\n")
     output_file.write("        $finish_and_return(1);\n")
@@ -651,8 +1114,8 @@ def generate_CHIP(input_file,
     output_file.write("    //implement memory for instructions\n")
     output_file.write(
         "    if (state == instruction_fetch || state == operand_fetch || state == execute) begin\n")
-    output_file.write("      instruction <= instructions[program_counter];\n")
-    output_file.write("      program_counter_1 <= program_counter;\n")
+    output_file.write("      instruction <= instructions[%s];\n" % fetch_address)
+    output_file.write("      program_counter_1 <= %s;\n" % fetch_address)
     output_file.write("    end\n")
     output_file.write("  end\n\n")
     output_file.write("  assign opcode    = instruction[%s:%s];\n" % (
@@ -665,6 +1128,26 @@ def generate_CHIP(input_file,
     output_file.write("  assign forward_a = (address_a_2 == address_z_3 && write_enable);\n")
     output_file.write("  assign forward_b = (address_b_2 == address_z_3 && write_enable);\n")
 
+    if branch_prediction:
+
+        # redirect the fetch as soon as a predicted branch is fetched
+        unconditional = []
+        conditional = []
+        for opcode, instruction in enumerate(instruction_set):
+            if instruction["op"] in ["goto", "call"]:
+                unconditional.append("opcode == %s" % opcode)
+            elif instruction["op"] in ["jmp_if_false", "jmp_if_true"]:
+                conditional.append("opcode == %s" % opcode)
+        predictions = unconditional
+        if conditional:
+            predictions.append("((%s) && literal <= program_counter_1)" %
+                               " || ".join(conditional))
+        if not predictions:
+            predictions = ["0"]
+        output_file.write("  assign predict = (state == operand_fetch || state == execute) &&\n")
+        output_file.write("    (%s);\n" % " ||\n    ".join(predictions))
+        output_file.write("  assign fetch_address = predict?literal:program_counter;\n")
+
     output_file.write(
         "\n  //////////////////////////////////////////////////////////////////////////////\n")
     output_file.write("  // PIPELINE STAGE 2 -- FETCH OPERANDS\n")
@@ -678,6 +1161,8 @@ def generate_CHIP(input_file,
     output_file.write(
         "    if (state == operand_fetch || state == execute) begin\n")
     output_file.write("      opcode_2 <= opcode;\n")
+    if branch_prediction:
+        output_file.write("      predicted_2 <= predict;\n")
     output_file.write("      literal_2 <= literal;\n")
     output_file.write("      address_a_2 <= address_a;\n")
     output_file.write("      address_b_2 <= address_b;\n")
@@ -689,18 +1174,46 @@ def generate_CHIP(input_file,
     output_file.write("  assign register_b = registers[address_b_2];\n")
     output_file.write("  assign operand_a = forward_a?result:register_a;\n")
     output_file.write("  assign operand_b = forward_b?result:register_b;\n")
-    output_file.write("  assign store_address = operand_a;\n")
-    output_file.write("  assign load_address = operand_a;\n")
-    output_file.write("  assign store_data = operand_b;\n")
 
     store_opcode = 0
     for opcode, instruction in enumerate(instruction_set):
         if instruction["op"] == "store":
             store_opcode = opcode
+    store_enable = ["(state == execute && opcode_2==%s)" % store_opcode]
+
+    if needs_block:
+        # the block instructions take over the memory, the address of the
+        # block is read from the z register
+        output_file.write("  assign register_z = registers[address_z_2];\n")
+        output_file.write("  assign forward_z = (address_z_2 == address_z_3 && write_enable);\n")
+        output_file.write("  assign operand_z = forward_z?result:register_z;\n")
+        output_file.write("  assign store_address = state == execute?operand_a:block_destination;\n")
+        sources = ["state == %s" % i for i in ["copy", "block_write"]
+                   if i in opcodes]
+        if sources:
+            output_file.write("  assign load_address = %s?block_source:operand_a;\n" %
+                              " || ".join(sources))
+        else:
+            output_file.write("  assign load_address = operand_a;\n")
+        if "copy" in opcodes:
+            store_enable.append("(state == copy && block_loaded)")
+        if "block_read" in opcodes:
+            store_enable.append("(state == block_read && block_loaded)")
+        data = "operand_b"
+        if "fill" in opcodes or "block_read" in opcodes:
+            data = "state == execute?%s:block_value" % data
+        if "fill" in opcodes:
+            store_enable.append("(state == fill && block_count != 0)")
+        if "copy" in opcodes:
+            data = "state == copy?%s:%s" % (loaded_data(rom_contents), data)
+        output_file.write("  assign store_data = %s;\n" % data)
+    else:
+        output_file.write("  assign store_address = operand_a;\n")
+        output_file.write("  assign load_address = operand_a;\n")
+        output_file.write("  assign store_data = operand_b;\n")
 
     output_file.write(
-        "  assign store_enable = (opcode_2==%s);\n" %
-        store_opcode)
+        "  assign store_enable = %s;\n" % " || ".join(store_enable))
 
     output_file.write(
         "\n  //////////////////////////////////////////////////////////////////////////////\n")
@@ -720,12 +1233,12 @@ def generate_CHIP(input_file,
     output_file.write("    end\n")
     output_file.write("    //operand_fetch\n")
     output_file.write("    operand_fetch: begin\n")
-    output_file.write("      program_counter <= program_counter + 1;\n")
+    output_file.write("      program_counter <= %s + 1;\n" % fetch_address)
     output_file.write("      state <= execute;\n")
     output_file.write("    end\n")
     output_file.write("    //execute\n")
     output_file.write("    execute: begin\n")
-    output_file.write("      program_counter <= program_counter + 1;\n")
+    output_file.write("      program_counter <= %s + 1;\n" % fetch_address)
     output_file.write("      address_z_3 <= address_z_2;\n")
     output_file.write("      case(opcode_2)\n\n")
 
@@ -758,6 +1271,41 @@ def generate_CHIP(input_file,
         elif instruction["op"] == "load":
             output_file.write("          state <= load;\n")
 
+        elif instruction["op"] == "copy":
+            output_file.write("          block_source <= operand_a;\n")
+            output_file.write("          block_destination <= operand_z;\n")
+            output_file.write("          block_count <= operand_b;\n")
+            output_file.write("          block_loaded <= 0;\n")
+            output_file.write("          state <= copy;\n")
+
+        elif instruction["op"] == "fill":
+            output_file.write("          block_value <= operand_a;\n")
+            output_file.write("          block_destination <= operand_z;\n")
+            output_file.write("          block_count <= operand_b;\n")
+            output_file.write("          state <= fill;\n")
+
+        elif instruction["op"] == "block_read":
+            output_file.write("          read_input <= operand_a;\n")
+            output_file.write("          block_destination <= operand_z;\n")
+            output_file.write("          block_count <= operand_b;\n")
+            output_file.write("          block_loaded <= 0;\n")
+            output_file.write("          state <= block_read;\n")
+
+        elif instruction["op"] == "block_write":
+            output_file.write("          write_output <= operand_a;\n")
+            output_file.write("          block_source <= operand_z;\n")
+            output_file.write("          block_count <= operand_b;\n")
+            output_file.write("          block_loaded <= 0;\n")
+            output_file.write("          state <= block_write;\n")
+
+        elif instruction["op"] == "call" and branch_prediction:
+            output_file.write("          result <= program_counter_2 + 1;\n")
+            output_file.write("          write_enable <= 1;\n")
+            output_file.write("          if (!predicted_2) begin\n")
+            output_file.write("            program_counter <= literal_2;\n")
+            output_file.write("            state <= instruction_fetch;\n")
+            output_file.write("          end\n")
+
         elif instruction["op"] == "call":
             output_file.write("          result <= program_counter_2 + 1;\n")
             output_file.write("          write_enable <= 1;\n")
@@ -853,6 +1401,12 @@ def generate_CHIP(input_file,
             output_file.write("          carry[0] <= ~long_result[32];\n")
             output_file.write("          write_enable <= 1;\n")
 
+        elif instruction["op"] == "multiply" and multiplier == "dsp":
+            output_file.write("          long_result = operand_a * operand_b;\n")
+            output_file.write("          result <= long_result[31:0];\n")
+            output_file.write("          carry <= long_result[63:32];\n")
+            output_file.write("          write_enable <= 1;\n")
+
         elif instruction["op"] == "multiply":
 
             output_file.write("          product_a <= operand_a[15:0]  * operand_b[15:0];\n")
@@ -861,6 +1415,12 @@ def generate_CHIP(input_file,
             output_file.write("          product_d <= operand_a[31:16] * operand_b[31:16];\n")
             output_file.write("          state <= multiply;\n")
 
+        elif instruction["op"] == "long_multiply":
+            output_file.write("          long_product_a <= a_lo * b_lo;\n")
+            output_file.write("          long_product_b <= a_lo * b_hi;\n")
+            output_file.write("          long_product_c <= a_hi * b_lo;\n")
+            output_file.write("          state <= long_multiply;\n")
+
         elif instruction["op"] == "unsigned_divide":
             output_file.write("          dividend  <= operand_a;\n")
             output_file.write("          divisor <= operand_b;\n")
@@ -1101,6 +1661,21 @@ def generate_CHIP(input_file,
             output_file.write("          double_divider_b <= {b_hi, b_lo};\n")
             output_file.write("          state <= double_divider_write_a;\n")
 
+        elif instruction["op"] in ["jmp_if_false", "jmp_if_true"] and (
+                branch_prediction):
+            # correct the prediction made when the branch was fetched
+            if instruction["op"] == "jmp_if_false":
+                output_file.write("          if ((operand_a == 0) != predicted_2) begin\n")
+            else:
+                output_file.write("          if ((operand_a != 0) != predicted_2) begin\n")
+            output_file.write("            if (predicted_2) begin\n")
+            output_file.write("              program_counter <= program_counter_2 + 1;\n")
+            output_file.write("            end else begin\n")
+            output_file.write("              program_counter <= literal_2;\n")
+            output_file.write("            end\n")
+            output_file.write("            state <= instruction_fetch;\n")
+            output_file.write("          end\n")
+
         elif instruction["op"] == "jmp_if_false":
             output_file.write("          if (operand_a == 0) begin\n")
             output_file.write("            program_counter <= literal_2;\n")
@@ -1113,17 +1688,34 @@ def generate_CHIP(input_file,
             output_file.write("            state <= instruction_fetch;\n")
             output_file.write("          end\n")
 
+        elif instruction["op"] == "goto" and branch_prediction:
+            output_file.write("          if (!predicted_2) begin\n")
+            output_file.write("            program_counter <= literal_2;\n")
+            output_file.write("            state <= instruction_fetch;\n")
+            output_file.write("          end\n")
+
         elif instruction["op"] == "goto":
             output_file.write("          program_counter <= literal_2;\n")
             output_file.write("          state <= instruction_fetch;\n")
 
         elif instruction["op"] == "file_read":
-            output_file.write("        16'd%s:\n" % (opcode))
-            output_file.write("        begin\n")
             output_file.write("          file_count = $fscanf(%s, \"%%d\\n\", result);\n" % (
                               input_files[instruction["file_name"]]))
             output_file.write("          write_enable <= 1;\n")
-            output_file.write("        end\n\n")
+
+        elif instruction["op"] == "binary_file_read":
+            output_file.write("          file_count = $fread(file_word, %s);\n" % (
+                              input_files[instruction["file_name"]]))
+            output_file.write("          result <= {file_word[7:0], file_word[15:8], file_word[23:16], file_word[31:24]};\n")
+            output_file.write("          write_enable <= 1;\n")
+
+        elif instruction["op"] == "binary_file_write":
+            output_file.write("          $fwrite (%s, \"%%u\", operand_a);\n" % (
+                              output_files[instruction["file_name"]]))
+
+        elif instruction["op"] == "long_binary_file_write":
+            output_file.write("          $fwrite (%s, \"%%u%%u\", a_lo, a_hi);\n" % (
+                              output_files[instruction["file_name"]]))
 
         elif instruction["op"] == "float_file_write":
             output_file.write('          long_result[63] = operand_a[31];\n')
@@ -1160,10 +1752,18 @@ def generate_CHIP(input_file,
             output_file.write("          $fdisplay (%s, \"%%d\", $signed(operand_a));\n" % (
                               output_files[instruction["file_name"]]))
 
+        elif instruction["op"] == "long_file_write":
+            output_file.write("          $fdisplay (%s, \"%%d\", $signed({a_hi, a_lo}));\n" % (
+                              output_files[instruction["file_name"]]))
+
         elif instruction["op"] == "read":
             output_file.write("          state <= read;\n")
             output_file.write("          read_input <= operand_a;\n")
 
+        elif instruction["op"] == "long_read":
+            output_file.write("          state <= long_read;\n")
+            output_file.write("          read_input <= operand_a;\n")
+
         elif instruction["op"] == "ready":
             output_file.write("          result <= 0;\n")
             output_file.write("          case(operand_a)\n\n")
@@ -1195,6 +1795,10 @@ def generate_CHIP(input_file,
             output_file.write("          write_output <= operand_a;\n")
             output_file.write("          write_value <= operand_b;\n")
 
+        elif instruction["op"] == "long_write":
+            output_file.write("          state <= long_write;\n")
+            output_file.write("          write_output <= operand_a;\n")
+
         elif instruction["op"] == "assert":
             output_file.write("          if (operand_a == 0) begin\n")
             output_file.write("            $display(\"Assertion failed at line: %s in file: %s\");\n" % (
@@ -1282,7 +1886,17 @@ def generate_CHIP(input_file,
     output_file.write("    end\n\n")
 
 
-    if "multiply" in opcodes:
+    if "long_multiply" in opcodes:
+        output_file.write("    long_multiply:\n")
+        output_file.write("    begin\n")
+        output_file.write("      long_result = long_product_a +\n")
+        output_file.write("                    ((long_product_b + long_product_c) << 32);\n")
+        output_file.write("      a_hi <= long_result[63:32];\n")
+        output_file.write("      a_lo <= long_result[31:0];\n")
+        output_file.write("      state <= execute;\n")
+        output_file.write("    end\n\n")
+
+    if "multiply" in opcodes and multiplier == "partial":
         output_file.write("    multiply:\n")
         output_file.write("    begin\n")
         output_file.write("      long_result = product_a +\n")
@@ -1415,56 +2029,188 @@ def generate_CHIP(input_file,
         output_file.write("      end\n")
         output_file.write("    end\n\n")
 
+    # 32 bit values are zero extended to, or truncated from, 64 bit ports,
+    # long_read and long_write transfer a_hi and a_lo in one handshake
     if allocator.input_names:
-        output_file.write("    read:\n")
-        output_file.write("    begin\n")
-        output_file.write("      case(read_input)\n")
-        for handle, input_name in allocator.input_names.iteritems():
-            output_file.write("      %s:\n" % (handle))
-            output_file.write("      begin\n")
-            output_file.write("        s_input_%s_ack <= 1;\n" % input_name)
-            output_file.write("        if (s_input_%s_ack && input_%s_stb) begin\n" % (
-                              input_name,
-                              input_name))
-            output_file.write("          result <= input_%s;\n" % input_name)
-            output_file.write("          write_enable <= 1;\n")
-            output_file.write("          s_input_%s_ack <= 0;\n" % input_name)
-            output_file.write("          state <= execute;\n")
-            output_file.write("        end\n")
-            output_file.write("      end\n")
-        output_file.write("      endcase\n")
-        output_file.write("    end\n\n")
+        read_states = ["read"]
+        if "long_read" in opcodes:
+            read_states.append("long_read")
+        for state in read_states:
+            output_file.write("    %s:\n" % state)
+            output_file.write("    begin\n")
+            output_file.write("      case(read_input)\n")
+            for handle, input_name in allocator.input_names.iteritems():
+                wide = allocator.input_widths[input_name] == 64
+                output_file.write("      %s:\n" % (handle))
+                output_file.write("      begin\n")
+                output_file.write("        s_input_%s_ack <= 1;\n" % input_name)
+                output_file.write("        if (s_input_%s_ack && input_%s_stb) begin\n" % (
+                                  input_name,
+                                  input_name))
+                if state == "long_read":
+                    output_file.write(
+                        "          a_lo <= input_%s[31:0];\n" % input_name)
+                    if wide:
+                        output_file.write(
+                            "          a_hi <= input_%s[63:32];\n" % input_name)
+                    else:
+                        output_file.write("          a_hi <= 0;\n")
+                else:
+                    output_file.write(
+                        "          result <= input_%s[31:0];\n" % input_name)
+                    output_file.write("          write_enable <= 1;\n")
+                output_file.write("          s_input_%s_ack <= 0;\n" % input_name)
+                output_file.write("          state <= execute;\n")
+                output_file.write("        end\n")
+                output_file.write("      end\n")
+            output_file.write("      endcase\n")
+            output_file.write("    end\n\n")
 
     if allocator.output_names:
-        output_file.write("    write:\n")
-        output_file.write("    begin\n")
-        output_file.write("      case(write_output)\n")
-        for handle, output_name in allocator.output_names.iteritems():
-            output_file.write("      %s:\n" % (handle))
-            output_file.write("      begin\n")
-            output_file.write("        s_output_%s_stb <= 1;\n" % output_name)
-            output_file.write(
-                "        s_output_%s <= write_value;\n" %
-                output_name)
-            output_file.write("        if (output_%s_ack && s_output_%s_stb) begin\n" % (
-                              output_name,
-                              output_name))
-            output_file.write(
-                "          s_output_%s_stb <= 0;\n" %
-                output_name)
-            output_file.write("          state <= execute;\n")
-            output_file.write("        end\n")
-            output_file.write("      end\n")
-        output_file.write("      endcase\n")
-        output_file.write("    end\n\n")
+        write_states = ["write"]
+        if "long_write" in opcodes:
+            write_states.append("long_write")
+        for state in write_states:
+            output_file.write("    %s:\n" % state)
+            output_file.write("    begin\n")
+            output_file.write("      case(write_output)\n")
+            for handle, output_name in allocator.output_names.iteritems():
+                wide = allocator.output_widths[output_name] == 64
+                if state == "long_write" and wide:
+                    value = "{a_hi, a_lo}"
+                elif state == "long_write":
+                    value = "a_lo"
+                elif wide:
+                    value = "{32'd0, write_value}"
+                else:
+                    value = "write_value"
+                output_file.write("      %s:\n" % (handle))
+                output_file.write("      begin\n")
+                output_file.write("        s_output_%s_stb <= 1;\n" % output_name)
+                output_file.write(
+                    "        s_output_%s <= %s;\n" % (output_name, value))
+                output_file.write("        if (output_%s_ack && s_output_%s_stb) begin\n" % (
+                                  output_name,
+                                  output_name))
+                output_file.write(
+                    "          s_output_%s_stb <= 0;\n" %
+                    output_name)
+                output_file.write("          state <= execute;\n")
+                output_file.write("        end\n")
+                output_file.write("      end\n")
+            output_file.write("      endcase\n")
+            output_file.write("    end\n\n")
 
     output_file.write("    load:\n")
     output_file.write("    begin\n")
-    output_file.write("        result <= load_data;\n")
+    output_file.write("        result <= %s;\n" % loaded_data(rom_contents))
     output_file.write("        write_enable <= 1;\n")
     output_file.write("        state <= execute;\n")
     output_file.write("    end\n\n")
 
+    # Each word is read in one clock, and written in the next
+    if "copy" in opcodes:
+        output_file.write("    copy:\n")
+        output_file.write("    begin\n")
+        output_file.write("      if (block_loaded) begin\n")
+        output_file.write("        block_destination <= block_destination + 1;\n")
+        output_file.write("      end\n")
+        output_file.write("      block_loaded <= block_count != 0;\n")
+        output_file.write("      if (block_count) begin\n")
+        output_file.write("        block_source <= block_source + 1;\n")
+        output_file.write("        block_count <= block_count - 1;\n")
+        output_file.write("      end else begin\n")
+        output_file.write("        state <= execute;\n")
+        output_file.write("      end\n")
+        output_file.write("    end\n\n")
+
+    if "fill" in opcodes:
+        output_file.write("    fill:\n")
+        output_file.write("    begin\n")
+        output_file.write("      if (block_count) begin\n")
+        output_file.write("        block_destination <= block_destination + 1;\n")
+        output_file.write("        block_count <= block_count - 1;\n")
+        output_file.write("      end else begin\n")
+        output_file.write("        state <= execute;\n")
+        output_file.write("      end\n")
+        output_file.write("    end\n\n")
+
+    # Each word is written to memory in the clock after its handshake, the
+    # acknowledge is held until the last word has been transferred
+    if "block_read" in opcodes:
+        output_file.write("    block_read:\n")
+        output_file.write("    begin\n")
+        output_file.write("      if (block_loaded) begin\n")
+        output_file.write("        block_destination <= block_destination + 1;\n")
+        output_file.write("      end\n")
+        output_file.write("      block_loaded <= 0;\n")
+        if allocator.input_names:
+            output_file.write("      case(read_input)\n")
+            for handle, input_name in allocator.input_names.iteritems():
+                output_file.write("      %s:\n" % (handle))
+                output_file.write("      begin\n")
+                output_file.write(
+                    "        s_input_%s_ack <= block_count != 0;\n" % input_name)
+                output_file.write("        if (s_input_%s_ack && input_%s_stb) begin\n" % (
+                                  input_name,
+                                  input_name))
+                output_file.write(
+                    "          block_value <= input_%s[31:0];\n" % input_name)
+                output_file.write("          block_loaded <= 1;\n")
+                output_file.write("          block_count <= block_count - 1;\n")
+                output_file.write(
+                    "          s_input_%s_ack <= block_count != 1;\n" % input_name)
+                output_file.write("        end\n")
+                output_file.write("      end\n")
+            output_file.write("      endcase\n")
+        output_file.write("      if (block_count == 0) begin\n")
+        output_file.write("        state <= execute;\n")
+        output_file.write("      end\n")
+        output_file.write("    end\n\n")
+
+    # Each word is loaded in the clock before it is needed. When the output
+    # isn't acknowledged, the word loaded is discarded, and loaded again.
+    if "block_write" in opcodes:
+        output_file.write("    block_write:\n")
+        output_file.write("    begin\n")
+        if allocator.output_names:
+            output_file.write("      case(write_output)\n")
+            for handle, output_name in allocator.output_names.iteritems():
+                if allocator.output_widths[output_name] == 64:
+                    value = "{32'd0, %s}" % loaded_data(rom_contents)
+                else:
+                    value = loaded_data(rom_contents)
+                ready = "!s_output_%s_stb || output_%s_ack" % (
+                    output_name, output_name)
+                output_file.write("      %s:\n" % (handle))
+                output_file.write("      begin\n")
+                output_file.write("        if (%s) begin\n" % ready)
+                output_file.write(
+                    "          s_output_%s_stb <= block_loaded;\n" % output_name)
+                output_file.write(
+                    "          s_output_%s <= %s;\n" % (output_name, value))
+                output_file.write("          if (block_loaded) begin\n")
+                output_file.write("            block_count <= block_count - 1;\n")
+                output_file.write("          end\n")
+                output_file.write("          block_source <= block_source + 1;\n")
+                output_file.write(
+                    "          block_loaded <= block_count != block_loaded;\n")
+                output_file.write("          if (block_count == 0) begin\n")
+                output_file.write("            state <= execute;\n")
+                output_file.write("          end\n")
+                output_file.write("        end else if (block_loaded) begin\n")
+                output_file.write("          block_source <= block_source - 1;\n")
+                output_file.write("          block_loaded <= 0;\n")
+                output_file.write("        end else begin\n")
+                output_file.write("          block_source <= block_source + 1;\n")
+                output_file.write("          block_loaded <= block_count != 0;\n")
+                output_file.write("        end\n")
+                output_file.write("      end\n")
+            output_file.write("      endcase\n")
+        else:
+            output_file.write("      state <= execute;\n")
+        output_file.write("    end\n\n")
+
     output_file.write("    wait_state:\n")
     output_file.write("    begin\n")
     output_file.write("      if (timer) begin\n")
@@ -1555,7 +2301,7 @@ def generate_CHIP(input_file,
 
     if needs_long_divider:
         output_file.write("    //long divider kernel logic\n")
-        output_file.write("    repeat (%u) begin\n"%(divide_iterations))
+        output_file.write("    repeat (%u) begin\n"%(long_divide_iterations))
         output_file.write("      long_shifter = {long_remainder[62:0], long_dividend[63]};\n")
         output_file.write("      long_difference = long_shifter - long_divisor;\n")
         output_file.write("      long_dividend = long_dividend << 1;\n")
@@ -1606,4 +2352,4 @@ def generate_CHIP(input_file,
         output_file.write("  assign output_%s = s_output_%s;\n" % (i, i))
     output_file.write("\nendmodule\n")
 
-    return inputs, outputs
+    return inputs, outputs, shared_units
@@ -0,0 +1,1196 @@
+#!/usr/bin/env python
+"""Generate Verilog Implementation of Instructions
+
+The speed optimized implementation translates the instructions directly into
+a state machine.
++ Registers are implemented as flip-flops.
++ Each basic block is divided into steps, each step takes a single clock.
++ A step holds as many consecutive instructions as possible, an instruction
+  can't share a step with an instruction which writes one of its operands.
++ Taken branches, calls and returns take no extra clocks.
++ Data memory is implemented in block RAM, only one load or store is
+  executed in each step.
++ Logic is generated for every instruction in the program, so the design is
+  much larger than the area optimized implementation.
+
+"""
+
+__author__ = "Jon Dawson"
+__copyright__ = "Copyright (C) 2015, Jonathan P Dawson"
+
+from chips.compiler.exceptions import C2CHIPError
+from chips.compiler.register_map import rregmap
+from utils import calculate_jumps, split_rom
+from verilog_area import generate_declarations, floating_point_enables
+from verilog_area import floating_point_units, stream_operations
+from verilog_area import block_operations
+from verilog_area import write_header, write_floating_point_declarations
+from verilog_area import shared_floating_point_ports
+from verilog_area import write_testbench, write_floating_point_instances
+from verilog_area import write_memory_initialization, write_open_files
+from verilog_area import write_rom, loaded_data, check_address_space
+from verilog_area import arithmetic_units, instruction_latency
+
+# Instructions which transfer control, they end a step.
+control_operations = ["goto", "jmp_if_false", "jmp_if_true", "call",
+                      "return", "stop"]
+
+# Instructions which start at the end of a step, and complete in states of
+# their own.
+divide_operations = ["divide", "unsigned_divide", "modulo", "unsigned_modulo"]
+long_divide_operations = [
+    "long_divide",
+    "unsigned_long_divide",
+    "long_modulo",
+    "unsigned_long_modulo"]
+multi_cycle_operations = (["load", "wait_clocks"] + divide_operations +
+                          long_divide_operations + block_operations +
+                          floating_point_units.keys())
+
+# Registers read and written by instructions, other than a, b and z.
+implicit_reads = {
+    "a_lo": ["a_lo"],
+    "a_hi": ["a_hi"],
+    "b_lo": ["b_lo"],
+    "b_hi": ["b_hi"],
+    "carry": ["carry"],
+    "add_with_carry": ["carry"],
+    "subtract_with_carry": ["carry"],
+    "shift_left_with_carry": ["carry"],
+    "shift_right_with_carry": ["carry"],
+    "report": ["a_lo"],
+    "unsigned_report": ["a_lo"],
+    "float_report": ["a_lo"],
+    "long_report": ["a_lo", "a_hi"],
+    "long_unsigned_report": ["a_lo", "a_hi"],
+    "long_float_report": ["a_lo", "a_hi"],
+    "long_file_write": ["a_lo", "a_hi"],
+    "long_binary_file_write": ["a_lo", "a_hi"],
+    "long_float_file_write": ["a_lo", "a_hi"],
+    "long_write": ["a_lo", "a_hi"],
+    "int_to_float": ["a_lo"],
+    "float_to_int": ["a_lo"],
+    "float_to_double": ["a_lo"],
+    "long_to_double": ["a_lo", "a_hi"],
+    "double_to_long": ["a_lo", "a_hi"],
+    "double_to_float": ["a_lo", "a_hi"],
+}
+for op in long_divide_operations + [
+        "long_float_add",
+        "long_float_subtract",
+        "long_float_multiply",
+        "long_float_divide",
+        "long_multiply"]:
+    implicit_reads[op] = ["a_lo", "a_hi", "b_lo", "b_hi"]
+
+implicit_writes = {
+    "a_lo": ["a_lo"],
+    "a_hi": ["a_hi"],
+    "b_lo": ["b_lo"],
+    "b_hi": ["b_hi"],
+    "add": ["carry"],
+    "add_with_carry": ["carry"],
+    "subtract": ["carry"],
+    "subtract_with_carry": ["carry"],
+    "multiply": ["carry"],
+    "shift_left": ["carry"],
+    "shift_right": ["carry"],
+    "unsigned_shift_right": ["carry"],
+    "long_read": ["a_lo", "a_hi"],
+    "long_multiply": ["a_lo", "a_hi"],
+}
+
+
+def register_name(register):
+    """The name of the flip-flops which implement a register"""
+
+    return "register_%s" % rregmap.get(register, register)
+
+
+def sign_extend(literal):
+    """A 32 bit verilog literal, sign extended from 16 bits"""
+
+    literal &= 0xffff
+    if literal & 0x8000:
+        literal |= 0xffff0000
+    return "32'h%08x" % literal
+
+
+def reads(instruction):
+    """The registers read by an instruction"""
+
+    registers = set(implicit_reads.get(instruction["op"], []))
+    fields = ["a", "b"]
+    if instruction["op"] in block_operations:
+        fields.append("z")
+    for field in fields:
+        if field in instruction:
+            registers.add(instruction[field])
+    return registers
+
+
+def writes(instruction):
+    """The registers written by an instruction"""
+
+    registers = set(implicit_writes.get(instruction["op"], []))
+    if "z" in instruction and instruction["op"] not in block_operations:
+        registers.add(instruction["z"])
+    return registers
+
+
+class Step:
+
+    """A group of instructions which are executed in the same clock"""
+
+    def __init__(self, address):
+        self.address = address
+        self.instructions = []
+        self.reads = set()
+        self.writes = set()
+        self.memory = False
+        self.load = None
+
+    def conflicts(self, instruction):
+        """True if an instruction can't be executed in this step"""
+
+        if reads(instruction) & self.writes:
+            return True
+        if writes(instruction) & self.writes:
+            return True
+        return self.memory and instruction["op"] in ["load", "store"]
+
+    def add(self, instruction):
+        self.instructions.append(instruction)
+        self.reads |= reads(instruction)
+        self.writes |= writes(instruction)
+        if instruction["op"] in ["load", "store"]:
+            self.memory = True
+
+    def next_address(self):
+        return self.address + len(self.instructions)
+
+
+def schedule(instructions):
+    """Divide the instructions into steps
+
+    Each step starts with the instruction at the step's address, so the
+    address of the first instruction can be used as the state, and a return
+    address can be used to select the next state. A load completes in the
+    following step, unless the following step can be entered from elsewhere,
+    or needs the value loaded.
+    """
+
+    entries = set([0])
+    for address, instruction in enumerate(instructions):
+        if "label" in instruction:
+            entries.add(instruction["label"])
+        if instruction["op"] == "call":
+            entries.add(address + 1)
+
+    steps = []
+    step = None
+    for address, instruction in enumerate(instructions):
+        op = instruction["op"]
+        ended = step is None or step.instructions[-1]["op"] in (
+            control_operations + stream_operations + multi_cycle_operations)
+        if (ended or address in entries or op in stream_operations or
+                step.conflicts(instruction)):
+            previous = step
+            step = Step(address)
+            steps.append(step)
+            if previous is not None and previous.instructions[-1]["op"] == "load":
+                load = previous.instructions[-1]
+                if (address not in entries and op not in stream_operations and
+                        not (reads(instruction) | writes(instruction)) &
+                        writes(load)):
+                    step.load = load
+                    step.writes |= writes(load)
+        step.add(instruction)
+    return steps
+
+
+def instruction_timing(instructions, options={}):
+    """Clock cycles taken by each instruction in the state machine
+
+    Used by the cycle accurate Python model. Returns the latency of each
+    instruction, as given by instruction_latency for the area optimised
+    processor, and the addresses of the instructions which are executed in
+    the same clock as the instruction before them. Branches take no extra
+    clock cycles.
+    """
+
+    steps = schedule(instructions)
+    merged_loads = set(id(step.load) for step in steps if step.load)
+    latencies = []
+    merged = set()
+    for step in steps:
+        for offset, instruction in enumerate(step.instructions):
+            op = instruction["op"]
+            if offset:
+                merged.add(step.address + offset)
+            if op == "load":
+                # completes in the following step, or in a state of its own
+                latency = 1 if id(instruction) in merged_loads else 2
+            elif op in ["multiply", "long_multiply"]:
+                latency = 1
+            elif op in stream_operations:
+                latency = 2
+            elif op in floating_point_units:
+                # the single precision cores take an extra clock to accept
+                # operands written in separate handshakes
+                latency = instruction_latency(op, options)
+                if floating_point_units[op] in ["adder", "multiplier", "divider"]:
+                    latency += 1
+            else:
+                latency = instruction_latency(op, options)
+            latencies.append(latency)
+    return latencies, merged
+
+
+def generate_CHIP(input_file,
+                  name,
+                  instructions,
+                  output_file,
+                  allocator,
+                  initialize_memory,
+                  memory_size=1024,
+                  no_tb_mode=False,
+                  options={}):
+    """Generate a state machine which executes the instructions"""
+
+    instructions, initial_memory_contents = calculate_jumps(instructions, True)
+    initial_memory_contents, rom_contents = split_rom(initial_memory_contents)
+    check_address_space(input_file, memory_size, rom_contents)
+    opcodes = set([i["op"] for i in instructions])
+    # the register and opcode widths only size the area optimised processor
+    declarations = generate_declarations(
+        instructions,
+        no_tb_mode,
+        16,
+        1,
+        allocator)
+    inputs, outputs, input_files, output_files, testbench, inports, outports, signals = declarations
+    binary_files = set([i["file_name"]
+                        for i in instructions if "binary" in i["op"]])
+    floating_point_arithmetic, floating_point_conversions, floating_point_debug = floating_point_enables(
+        instructions)
+    steps = schedule(instructions)
+
+    # the state machine always multiplies in a single clock
+    multiplier, divide_latency, long_divide_latency = arithmetic_units(
+        options)
+    divide_iterations = 32 / divide_latency
+    long_divide_iterations = 64 / long_divide_latency
+
+    input_files = dict(
+        zip(input_files, ["input_file_%s" %
+                          i for i, j in enumerate(input_files)]))
+    output_files = dict(
+        zip(output_files, ["output_file_%s" %
+                           i for i, j in enumerate(output_files)]))
+
+    # states which don't start a step are numbered after the instructions
+    extra_states = []
+
+    def new_state(comment):
+        extra_states.append((len(instructions) + len(extra_states), comment, []))
+        return extra_states[-1]
+
+    stop_state = new_state("stop")
+
+    # the memory is addressed by whichever step is active
+    loads = []
+    stores = []
+
+    def logic(instruction, step, code):
+        """Generate the logic for an instruction, add new states as needed"""
+
+        op = instruction["op"]
+        a = register_name(instruction.get("a"))
+        b = register_name(instruction.get("b"))
+        z = register_name(instruction.get("z"))
+        next_state = step.next_address()
+
+        if op == "nop":
+            pass
+
+        elif op == "literal":
+            code.append("%s <= %s;" % (z, sign_extend(instruction["literal"])))
+
+        elif op == "addl":
+            code.append("%s <= %s + %s;" % (
+                z, a, sign_extend(instruction["literal"])))
+
+        elif op == "literal_hi":
+            code.append("%s <= {16'h%04x, %s[15:0]};" % (
+                z, instruction["literal"] & 0xffff, a))
+
+        elif op == "store":
+            stores.append((step.address, a, b, "1"))
+
+        elif op == "load":
+            loads.append((step.address, a))
+            if not any(i.load is instruction for i in steps):
+                state, comment, state_code = new_state("load")
+                state_code.append(
+                    "%s <= %s;" % (z, loaded_data(rom_contents)))
+                state_code.append("state <= %s;" % next_state)
+                code.append("state <= %s;" % state)
+
+        elif op == "copy":
+            # each word is read in one clock, and written in the next
+            code.append("block_source <= %s;" % a)
+            code.append("block_destination <= %s;" % z)
+            code.append("block_count <= %s;" % b)
+            code.append("block_loaded <= 0;")
+            state, comment, state_code = new_state(op)
+            loads.append((state, "block_source"))
+            stores.append((state, "block_destination",
+                           loaded_data(rom_contents), "block_loaded"))
+            state_code.append("if (block_loaded) begin")
+            state_code.append("  block_destination <= block_destination + 1;")
+            state_code.append("end")
+            state_code.append("block_loaded <= block_count != 0;")
+            state_code.append("if (block_count) begin")
+            state_code.append("  block_source <= block_source + 1;")
+            state_code.append("  block_count <= block_count - 1;")
+            state_code.append("end else begin")
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % state)
+
+        elif op == "fill":
+            code.append("block_value <= %s;" % a)
+            code.append("block_destination <= %s;" % z)
+            code.append("block_count <= %s;" % b)
+            state, comment, state_code = new_state(op)
+            stores.append((state, "block_destination", "block_value",
+                           "block_count != 0"))
+            state_code.append("if (block_count) begin")
+            state_code.append("  block_destination <= block_destination + 1;")
+            state_code.append("  block_count <= block_count - 1;")
+            state_code.append("end else begin")
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % state)
+
+        elif op == "block_read":
+            # each word is written to memory in the clock after its handshake
+            code.append("block_destination <= %s;" % z)
+            code.append("block_count <= %s;" % b)
+            code.append("block_loaded <= 0;")
+            state, comment, state_code = new_state(op)
+            stores.append((state, "block_destination", "block_value",
+                           "block_loaded"))
+            state_code.append("if (block_loaded) begin")
+            state_code.append("  block_destination <= block_destination + 1;")
+            state_code.append("end")
+            state_code.append("block_loaded <= 0;")
+            if allocator.input_names:
+                code.append("read_input <= %s;" % a)
+                state_code.append("case(read_input)")
+                for handle, input_name in allocator.input_names.iteritems():
+                    state_code.append("  %s:" % handle)
+                    state_code.append("  begin")
+                    state_code.append(
+                        "    s_input_%s_ack <= block_count != 0;" % input_name)
+                    state_code.append(
+                        "    if (s_input_%s_ack && input_%s_stb) begin" % (
+                            input_name, input_name))
+                    state_code.append(
+                        "      block_value <= input_%s[31:0];" % input_name)
+                    state_code.append("      block_loaded <= 1;")
+                    state_code.append("      block_count <= block_count - 1;")
+                    state_code.append(
+                        "      s_input_%s_ack <= block_count != 1;" % input_name)
+                    state_code.append("    end")
+                    state_code.append("  end")
+                state_code.append("endcase")
+            state_code.append("if (block_count == 0) begin")
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % state)
+
+        elif op == "block_write":
+            # each word is loaded in the clock before it is needed, and loaded
+            # again if the output isn't acknowledged
+            code.append("block_source <= %s;" % z)
+            code.append("block_count <= %s;" % b)
+            code.append("block_loaded <= 0;")
+            state, comment, state_code = new_state(op)
+            loads.append((state, "block_source"))
+            if allocator.output_names:
+                code.append("write_output <= %s;" % a)
+                state_code.append("case(write_output)")
+                for handle, output_name in allocator.output_names.iteritems():
+                    if allocator.output_widths[output_name] == 64:
+                        value = "{32'd0, %s}" % loaded_data(rom_contents)
+                    else:
+                        value = loaded_data(rom_contents)
+                    state_code.append("  %s:" % handle)
+                    state_code.append("  begin")
+                    state_code.append(
+                        "    if (!s_output_%s_stb || output_%s_ack) begin" % (
+                            output_name, output_name))
+                    state_code.append(
+                        "      s_output_%s_stb <= block_loaded;" % output_name)
+                    state_code.append(
+                        "      s_output_%s <= %s;" % (output_name, value))
+                    state_code.append("      if (block_loaded) begin")
+                    state_code.append("        block_count <= block_count - 1;")
+                    state_code.append("      end")
+                    state_code.append("      block_source <= block_source + 1;")
+                    state_code.append(
+                        "      block_loaded <= block_count != block_loaded;")
+                    state_code.append("      if (block_count == 0) begin")
+                    state_code.append("        state <= %s;" % next_state)
+                    state_code.append("      end")
+                    state_code.append("    end else if (block_loaded) begin")
+                    state_code.append("      block_source <= block_source - 1;")
+                    state_code.append("      block_loaded <= 0;")
+                    state_code.append("    end else begin")
+                    state_code.append("      block_source <= block_source + 1;")
+                    state_code.append("      block_loaded <= block_count != 0;")
+                    state_code.append("    end")
+                    state_code.append("  end")
+                state_code.append("endcase")
+            else:
+                state_code.append("state <= %s;" % next_state)
+            code.append("state <= %s;" % state)
+
+        elif op == "call":
+            code.append("%s <= %s;" % (z, next_state))
+            code.append("state <= %s;" % instruction["label"])
+
+        elif op == "return":
+            code.append("state <= %s[15:0];" % a)
+
+        elif op == "goto":
+            code.append("state <= %s;" % instruction["label"])
+
+        elif op == "jmp_if_false":
+            code.append("if (%s == 0) state <= %s;" % (a, instruction["label"]))
+
+        elif op == "jmp_if_true":
+            code.append("if (%s != 0) state <= %s;" % (a, instruction["label"]))
+
+        elif op in ["a_lo", "b_lo", "a_hi", "b_hi"]:
+            code.append("%s <= %s;" % (op, a))
+            code.append("%s <= %s;" % (z, op))
+
+        elif op == "not":
+            code.append("%s <= ~%s;" % (z, a))
+
+        elif op == "int_to_long":
+            code.append("%s <= {32{%s[31]}};" % (z, a))
+
+        elif op == "add":
+            code.append("long_result = %s + %s;" % (a, b))
+            code.append("%s <= long_result[31:0];" % z)
+            code.append("carry[0] <= long_result[32];")
+
+        elif op == "add_with_carry":
+            code.append("long_result = %s + %s + carry[0];" % (a, b))
+            code.append("%s <= long_result[31:0];" % z)
+            code.append("carry[0] <= long_result[32];")
+
+        elif op == "subtract":
+            code.append("long_result = %s + (~%s) + 1;" % (a, b))
+            code.append("%s <= long_result[31:0];" % z)
+            code.append("carry[0] <= ~long_result[32];")
+
+        elif op == "subtract_with_carry":
+            code.append("long_result = %s + (~%s) + carry[0];" % (a, b))
+            code.append("%s <= long_result[31:0];" % z)
+            code.append("carry[0] <= ~long_result[32];")
+
+        elif op == "multiply":
+            code.append("long_result = %s * %s;" % (a, b))
+            code.append("%s <= long_result[31:0];" % z)
+            code.append("carry <= long_result[63:32];")
+
+        elif op == "long_multiply":
+            code.append("long_result = {a_hi, a_lo} * {b_hi, b_lo};")
+            code.append("a_hi <= long_result[63:32];")
+            code.append("a_lo <= long_result[31:0];")
+
+        elif op in divide_operations:
+            signed = not op.startswith("unsigned")
+            if op == "divide":
+                code.append("quotient_sign <= %s[31] ^ %s[31];" % (a, b))
+            elif op == "modulo":
+                code.append("dividend_sign <= %s[31];" % a)
+            if signed:
+                code.append("dividend <= %s[31]?-%s:%s;" % (a, a, a))
+                code.append("divisor <= %s[31]?-%s:%s;" % (b, b, b))
+            else:
+                code.append("dividend <= %s;" % a)
+                code.append("divisor <= %s;" % b)
+            code.append("timer <= %i;" % divide_latency)
+            code.append("remainder <= 0;")
+            code.append("quotient <= 0;")
+            if op.endswith("divide"):
+                value = "quotient"
+                sign = "quotient_sign"
+            else:
+                value = "remainder"
+                sign = "dividend_sign"
+            state, comment, state_code = new_state(op)
+            state_code.append("if (timer) begin")
+            state_code.append("  timer <= timer - 1;")
+            state_code.append("end else begin")
+            if signed:
+                state_code.append("  %s <= %s?-%s:%s;" % (z, sign, value, value))
+            else:
+                state_code.append("  %s <= %s;" % (z, value))
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % state)
+
+        elif op in long_divide_operations:
+            signed = not op.startswith("unsigned")
+            if op == "long_divide":
+                code.append("long_quotient_sign <= a_hi[31] ^ b_hi[31];")
+            elif op == "long_modulo":
+                code.append("long_dividend_sign <= a_hi[31];")
+            if signed:
+                code.append(
+                    "long_dividend <= a_hi[31]?-{a_hi, a_lo}:{a_hi, a_lo};")
+                code.append(
+                    "long_divisor <= b_hi[31]?-{b_hi, b_lo}:{b_hi, b_lo};")
+            else:
+                code.append("long_dividend <= {a_hi, a_lo};")
+                code.append("long_divisor <= {b_hi, b_lo};")
+            code.append("timer <= %i;" % long_divide_latency)
+            code.append("long_remainder <= 0;")
+            code.append("long_quotient <= 0;")
+            if op.endswith("divide"):
+                value = "long_quotient"
+                sign = "long_quotient_sign"
+            else:
+                value = "long_remainder"
+                sign = "long_dividend_sign"
+            state, comment, state_code = new_state(op)
+            state_code.append("if (timer) begin")
+            state_code.append("  timer <= timer - 1;")
+            state_code.append("end else begin")
+            if signed:
+                state_code.append(
+                    "  long_result = %s?-%s:%s;" % (sign, value, value))
+            else:
+                state_code.append("  long_result = %s;" % value)
+            state_code.append("  a_hi <= long_result[63:32];")
+            state_code.append("  a_lo <= long_result[31:0];")
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % state)
+
+        elif op == "carry":
+            code.append("%s <= carry;" % z)
+
+        elif op == "or":
+            code.append("%s <= %s | %s;" % (z, a, b))
+
+        elif op == "and":
+            code.append("%s <= %s & %s;" % (z, a, b))
+
+        elif op == "xor":
+            code.append("%s <= %s ^ %s;" % (z, a, b))
+
+        elif op == "shift_left":
+            code.append("if(%s < 32) begin" % b)
+            code.append("  %s <= %s << %s;" % (z, a, b))
+            code.append("  carry <= %s >> (32-%s);" % (a, b))
+            code.append("end else begin")
+            code.append("  %s <= 0;" % z)
+            code.append("  carry <= %s;" % a)
+            code.append("end")
+
+        elif op == "shift_left_with_carry":
+            code.append("if(%s < 32) begin" % b)
+            code.append("  %s <= (%s << %s) | carry;" % (z, a, b))
+            code.append("end else begin")
+            code.append("  %s <= carry;" % z)
+            code.append("end")
+
+        elif op == "shift_right":
+            code.append("if(%s < 32) begin" % b)
+            code.append("  %s <= $signed(%s) >>> %s;" % (z, a, b))
+            code.append("  carry <= %s << (32-%s);" % (a, b))
+            code.append("end else begin")
+            code.append("  %s <= %s[31]?-1:0;" % (z, a))
+            code.append("  carry <= %s;" % a)
+            code.append("end")
+
+        elif op == "unsigned_shift_right":
+            code.append("if(%s < 32) begin" % b)
+            code.append("  %s <= %s >> %s;" % (z, a, b))
+            code.append("  carry <= %s << (32-%s);" % (a, b))
+            code.append("end else begin")
+            code.append("  %s <= 0;" % z)
+            code.append("  carry <= %s;" % a)
+            code.append("end")
+
+        elif op == "shift_right_with_carry":
+            code.append("if(%s < 32) begin" % b)
+            code.append("  %s <= (%s >> %s) | carry;" % (z, a, b))
+            code.append("end else begin")
+            code.append("  %s <= carry;" % z)
+            code.append("end")
+
+        elif op == "greater":
+            code.append("%s <= $signed(%s) > $signed(%s);" % (z, a, b))
+
+        elif op == "greater_equal":
+            code.append("%s <= $signed(%s) >= $signed(%s);" % (z, a, b))
+
+        elif op == "unsigned_greater":
+            code.append("%s <= $unsigned(%s) > $unsigned(%s);" % (z, a, b))
+
+        elif op == "unsigned_greater_equal":
+            code.append("%s <= $unsigned(%s) >= $unsigned(%s);" % (z, a, b))
+
+        elif op == "equal":
+            code.append("%s <= %s == %s;" % (z, a, b))
+
+        elif op == "not_equal":
+            code.append("%s <= %s != %s;" % (z, a, b))
+
+        elif op in floating_point_units:
+            unit = floating_point_units[op]
+            if unit in floating_point_arithmetic:
+                if unit.startswith("double"):
+                    code.append("%s_a <= {a_hi, a_lo};" % unit)
+                    operand_b = "{b_hi, b_lo}"
+                    if op.endswith("subtract"):
+                        operand_b = "{~b_hi[31], b_hi[30:0], b_lo}"
+                else:
+                    code.append("%s_a <= %s;" % (unit, a))
+                    operand_b = b
+                    if op.endswith("subtract"):
+                        operand_b = "{~%s[31], %s[30:0]}" % (b, b)
+                code.append("%s_b <= %s;" % (unit, operand_b))
+                write_a = new_state(op)
+                write_b = new_state(op)
+                read_z = new_state(op)
+                handshakes = [(write_a, "a", write_b), (write_b, "b", read_z)]
+                if unit.startswith("double"):
+                    results = ["a_lo <= %s_z[31:0];" % unit,
+                               "a_hi <= %s_z[63:32];" % unit]
+                else:
+                    results = ["%s <= %s_z;" % (z, unit)]
+            else:
+                if unit.startswith("long") or unit.startswith("double"):
+                    code.append("%s_in <= {a_hi, a_lo};" % unit)
+                else:
+                    code.append("%s_in <= a_lo;" % unit)
+                write_a = new_state(op)
+                read_z = new_state(op)
+                handshakes = [(write_a, "in", read_z)]
+                if unit.endswith("long") or unit.endswith("double"):
+                    results = ["a_lo <= %s_out[31:0];" % unit,
+                               "a_hi <= %s_out[63:32];" % unit]
+                else:
+                    results = ["a_lo <= %s_out;" % unit]
+            for (state, comment, state_code), port, following in handshakes:
+                state_code.append("%s_%s_stb <= 1;" % (unit, port))
+                state_code.append("if (%s_%s_stb && %s_%s_ack) begin" % (
+                    unit, port, unit, port))
+                state_code.append("  %s_%s_stb <= 0;" % (unit, port))
+                state_code.append("  state <= %s;" % following[0])
+                state_code.append("end")
+            state, comment, state_code = read_z
+            port = "z" if unit in floating_point_arithmetic else "out"
+            state_code.append("%s_%s_ack <= 1;" % (unit, port))
+            state_code.append("if (%s_%s_stb && %s_%s_ack) begin" % (
+                unit, port, unit, port))
+            state_code.extend("  " + i for i in results)
+            state_code.append("  %s_%s_ack <= 0;" % (unit, port))
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % write_a[0])
+
+        elif op == "file_read":
+            code.append("file_count = $fscanf(%s, \"%%d\\n\", %s);" % (
+                input_files[instruction["file_name"]], z))
+
+        elif op == "binary_file_read":
+            code.append("file_count = $fread(file_word, %s);" % (
+                input_files[instruction["file_name"]]))
+            code.append("%s <= {file_word[7:0], file_word[15:8], file_word[23:16], file_word[31:24]};" % z)
+
+        elif op == "binary_file_write":
+            code.append("$fwrite (%s, \"%%u\", %s);" % (
+                output_files[instruction["file_name"]], a))
+
+        elif op == "long_binary_file_write":
+            code.append("$fwrite (%s, \"%%u%%u\", a_lo, a_hi);" % (
+                output_files[instruction["file_name"]]))
+
+        elif op in ["float_file_write", "float_report"]:
+            value = a if op == "float_file_write" else "a_lo"
+            code.append("long_result[63] = %s[31];" % value)
+            code.append("if (%s[30:23] == 0) begin" % value)
+            code.append("    long_result[62:52] = 0;")
+            code.append("end else if (%s[30:23] == 255) begin" % value)
+            code.append("    long_result[62:52] = 2047;")
+            code.append("end else begin")
+            code.append(
+                "    long_result[62:52] = (%s[30:23] - 127) + 1023;" % value)
+            code.append("end")
+            code.append("long_result[51:29] = %s[22:0];" % value)
+            code.append("long_result[28:0] = 0;")
+            code.append("fp_value = $bitstoreal(long_result);")
+            if op == "float_file_write":
+                code.append('$fdisplay (%s, "%%g", fp_value);' % (
+                    output_files[instruction["file_name"]]))
+            else:
+                code.append('$display ("%%f (report (float) at line: %s in file: %s)", fp_value);' % (
+                    instruction["line"], instruction["file"]))
+
+        elif op == "long_float_file_write":
+            code.append("fp_value = $bitstoreal({a_hi, a_lo});")
+            code.append('$fdisplay (%s, "%%g", fp_value);' % (
+                output_files[instruction["file_name"]]))
+
+        elif op == "unsigned_file_write":
+            code.append("$fdisplay (%s, \"%%d\", $unsigned(%s));" % (
+                output_files[instruction["file_name"]], a))
+
+        elif op == "file_write":
+            code.append("$fdisplay (%s, \"%%d\", $signed(%s));" % (
+                output_files[instruction["file_name"]], a))
+
+        elif op == "long_file_write":
+            code.append("$fdisplay (%s, \"%%d\", $signed({a_hi, a_lo}));" % (
+                output_files[instruction["file_name"]]))
+
+        elif op in ["read", "long_read"]:
+            # the step waits until the handshake is complete
+            code.append("case(%s)" % a)
+            for handle, input_name in allocator.input_names.iteritems():
+                wide = allocator.input_widths[input_name] == 64
+                code.append("  %s:" % handle)
+                code.append("  begin")
+                code.append("    s_input_%s_ack <= 1;" % input_name)
+                code.append("    if (s_input_%s_ack && input_%s_stb) begin" % (
+                    input_name, input_name))
+                if op == "long_read":
+                    code.append("      a_lo <= input_%s[31:0];" % input_name)
+                    if wide:
+                        code.append(
+                            "      a_hi <= input_%s[63:32];" % input_name)
+                    else:
+                        code.append("      a_hi <= 0;")
+                else:
+                    code.append("      %s <= input_%s[31:0];" % (
+                        z, input_name))
+                code.append("      s_input_%s_ack <= 0;" % input_name)
+                code.append("      state <= %s;" % next_state)
+                code.append("    end")
+                code.append("  end")
+            code.append("endcase")
+
+        elif op in ["write", "long_write"]:
+            code.append("case(%s)" % a)
+            for handle, output_name in allocator.output_names.iteritems():
+                wide = allocator.output_widths[output_name] == 64
+                if op == "long_write" and wide:
+                    value = "{a_hi, a_lo}"
+                elif op == "long_write":
+                    value = "a_lo"
+                elif wide:
+                    value = "{32'd0, %s}" % b
+                else:
+                    value = b
+                code.append("  %s:" % handle)
+                code.append("  begin")
+                code.append("    s_output_%s_stb <= 1;" % output_name)
+                code.append("    s_output_%s <= %s;" % (output_name, value))
+                code.append("    if (output_%s_ack && s_output_%s_stb) begin" % (
+                    output_name, output_name))
+                code.append("      s_output_%s_stb <= 0;" % output_name)
+                code.append("      state <= %s;" % next_state)
+                code.append("    end")
+                code.append("  end")
+            code.append("endcase")
+
+        elif op == "ready":
+            code.append("%s <= 0;" % z)
+            code.append("case(%s)" % a)
+            for handle, input_name in allocator.input_names.iteritems():
+                code.append("  %s: %s <= input_%s_stb;" % (
+                    handle, z, input_name))
+            code.append("endcase")
+
+        elif op == "output_ready":
+            code.append("%s <= 0;" % z)
+            code.append("case(%s)" % a)
+            for handle, output_name in allocator.output_names.iteritems():
+                code.append("  %s: %s <= output_%s_ack;" % (
+                    handle, z, output_name))
+            code.append("endcase")
+
+        elif op == "assert":
+            code.append("if (%s == 0) begin" % a)
+            code.append("  $display(\"Assertion failed at line: %s in file: %s\");" % (
+                instruction["line"], instruction["file"]))
+            code.append("  $finish_and_return(1);")
+            code.append("end")
+
+        elif op == "wait_clocks":
+            code.append("timer <= %s;" % a)
+            state, comment, state_code = new_state(op)
+            state_code.append("if (timer) begin")
+            state_code.append("  timer <= timer - 1;")
+            state_code.append("end else begin")
+            state_code.append("  state <= %s;" % next_state)
+            state_code.append("end")
+            code.append("state <= %s;" % state)
+
+        elif op == "timer_low":
+            code.append("%s <= timer_clock[31:0];" % z)
+
+        elif op == "timer_high":
+            code.append("%s <= timer_clock[63:32];" % z)
+
+        elif op == "report":
+            code.append('$display ("%%d (report (int) at line: %s in file: %s)", $signed(a_lo));' % (
+                instruction["line"], instruction["file"]))
+
+        elif op == "long_report":
+            code.append('$display ("%%d (report (long) at line: %s in file: %s)", $signed({a_hi, a_lo}));' % (
+                instruction["line"], instruction["file"]))
+
+        elif op == "long_float_report":
+            code.append("fp_value = $bitstoreal({a_hi, a_lo});")
+            code.append('$display ("%%f (report (double) at line: %s in file: %s)", fp_value);' % (
+                instruction["line"], instruction["file"]))
+
+        elif op == "unsigned_report":
+            code.append('$display ("%%d (report (unsigned) at line: %s in file: %s)", $unsigned(a_lo));' % (
+                instruction["line"], instruction["file"]))
+
+        elif op == "long_unsigned_report":
+            code.append('$display ("%%d (report (unsigned long) at line: %s in file: %s)", $unsigned({a_hi, a_lo}));' % (
+                instruction["line"], instruction["file"]))
+
+        elif op == "stop":
+            # If we are in testbench mode stop the simulation
+            # If we are part of a larger design, other C programs may still be
+            # running
+            for file_ in input_files.values():
+                code.append("$fclose(%s);" % file_)
+            for file_ in output_files.values():
+                code.append("$fclose(%s);" % file_)
+            if testbench:
+                code.append("$finish;")
+            code.append("state <= %s;" % stop_state[0])
+
+        else:
+            raise C2CHIPError(
+                "%s is not supported by the speed optimised implementation" %
+                op, input_file)
+
+    # generate the logic for each step
+    step_code = []
+    for step in steps:
+        code = []
+        if step.instructions[0]["op"] not in stream_operations:
+            code.append("state <= %s;" % step.next_address())
+        if step.load is not None:
+            code.append("%s <= %s;" % (
+                register_name(step.load["z"]), loaded_data(rom_contents)))
+        for instruction in step.instructions:
+            logic(instruction, step, code)
+        step_code.append((step, code))
+
+    registers = set()
+    for instruction in instructions:
+        for field in ["a", "b", "z"]:
+            if field in instruction:
+                registers.add(instruction[field])
+
+    # With the shared_fpu option, the floating point cores are instanced by
+    # the chip, and shared with other processes
+    shared_units = []
+    if "shared_fpu" in options and not testbench:
+        shared_units = (sorted(floating_point_arithmetic) +
+                        sorted(floating_point_conversions))
+    shared_inports, shared_outports = shared_floating_point_ports(
+        shared_units)
+
+    # output the code in verilog
+    write_header(
+        output_file,
+        name,
+        input_file,
+        inputs,
+        outputs,
+        inports + shared_inports,
+        outports + shared_outports)
+
+    output_file.write("  integer file_count;\n")
+
+    write_floating_point_declarations(
+        output_file,
+        floating_point_arithmetic,
+        floating_point_conversions,
+        floating_point_debug)
+
+    for i in input_files.values():
+        output_file.write("  integer %s;\n" % i)
+
+    for i in output_files.values():
+        output_file.write("  integer %s;\n" % i)
+
+    def write_declaration(object_type, name, size):
+        if size == 1:
+            output_file.write(object_type)
+            output_file.write(name)
+            output_file.write(";\n")
+        else:
+            output_file.write(object_type)
+            output_file.write("[%i:0]" % (size - 1))
+            output_file.write(" ")
+            output_file.write(name)
+            output_file.write(";\n")
+
+    # keep the port signals, the area optimised processor isn't needed
+    signals = [(i, j) for i, j in signals if i.startswith("s_") or i in [
+        "file_word", "clk", "rst"]]
+    signals += [
+        ("state", 16),
+        ("timer", 32),
+        ("timer_clock", 64),
+        ("a_hi", 32),
+        ("b_hi", 32),
+        ("a_lo", 32),
+        ("b_lo", 32),
+        ("carry", 32),
+        ("long_result", 64),
+        ("load_data", 32),
+        ("load_address", 16),
+        ("store_address", 16),
+        ("store_data", 32),
+        ("store_enable", 1),
+    ] + [
+        (register_name(i), 32) for i in sorted(registers)
+    ]
+
+    for port, size in inports + shared_inports:
+        write_declaration("  input ", port, size)
+
+    for port, size in outports + shared_outports:
+        write_declaration("  output ", port, size)
+
+    for signal, size in signals:
+        write_declaration("  reg ", signal, size)
+
+    output_file.write("  output reg exception;\n")
+    output_file.write("  reg [31:0] memory [%i:0];\n" % (memory_size-1))
+
+    if opcodes & set(divide_operations):
+      output_file.write("  reg [31:0] shifter;\n")
+      output_file.write("  reg [32:0] difference;\n")
+      output_file.write("  reg [31:0] divisor;\n")
+      output_file.write("  reg [31:0] dividend;\n")
+      output_file.write("  reg [31:0] quotient;\n")
+      output_file.write("  reg [31:0] remainder;\n")
+      output_file.write("  reg quotient_sign;\n")
+      output_file.write("  reg dividend_sign;\n")
+
+    if opcodes & set(long_divide_operations):
+      output_file.write("  reg [63:0] long_shifter;\n")
+      output_file.write("  reg [64:0] long_difference;\n")
+      output_file.write("  reg [63:0] long_divisor;\n")
+      output_file.write("  reg [63:0] long_dividend;\n")
+      output_file.write("  reg [63:0] long_quotient;\n")
+      output_file.write("  reg [63:0] long_remainder;\n")
+      output_file.write("  reg long_quotient_sign;\n")
+      output_file.write("  reg long_dividend_sign;\n")
+
+    if opcodes & set(block_operations):
+      output_file.write("  reg [15:0] block_source;\n")
+      output_file.write("  reg [15:0] block_destination;\n")
+      output_file.write("  reg [15:0] block_count;\n")
+      output_file.write("  reg [31:0] block_value;\n")
+      output_file.write("  reg block_loaded;\n")
+
+    # the handle of the port a block is streamed through
+    if "block_read" in opcodes:
+      output_file.write("  reg [31:0] read_input;\n")
+    if "block_write" in opcodes:
+      output_file.write("  reg [31:0] write_output;\n")
+
+    write_testbench(output_file, testbench)
+
+    write_floating_point_instances(
+        output_file,
+        floating_point_arithmetic - set(shared_units),
+        floating_point_conversions - set(shared_units))
+
+    memory_file = None
+    if "readmemh" in options:
+        memory_file = "%s_memory.hex" % name
+    write_memory_initialization(
+        output_file, initial_memory_contents, memory_file)
+    if rom_contents:
+        rom_file = None
+        if "readmemh" in options:
+            rom_file = "%s_rom.hex" % name
+        write_rom(output_file, rom_contents, rom_file)
+
+    write_open_files(output_file, input_files, output_files, binary_files)
+
+    output_file.write(
+        "\n  //////////////////////////////////////////////////////////////////////////////\n")
+    output_file.write(
+        "  // DATA MEMORY                                                                \n")
+    output_file.write(
+        "  //                                                                            \n")
+    output_file.write(
+        "  // The active step selects the load and store addresses                       \n")
+    output_file.write("  \n  always @(*)\n")
+    output_file.write("  begin\n")
+    output_file.write("    load_address = 0;\n")
+    output_file.write("    store_address = 0;\n")
+    output_file.write("    store_data = 0;\n")
+    output_file.write("    store_enable = 0;\n")
+    if loads or stores:
+        # a copy loads and stores in the same state
+        accesses = {}
+        for state, address in loads:
+            accesses.setdefault(state, []).append(
+                "load_address = %s;" % address)
+        for state, address, data, enable in stores:
+            accesses.setdefault(state, []).extend([
+                "store_address = %s;" % address,
+                "store_data = %s;" % data,
+                "store_enable = %s;" % enable])
+        output_file.write("    case(state)\n")
+        for state, lines in sorted(accesses.items()):
+            if len(lines) == 1:
+                output_file.write("      %s: %s\n" % (state, lines[0]))
+            else:
+                output_file.write("      %s: begin\n" % state)
+                for line in lines:
+                    output_file.write("        %s\n" % line)
+                output_file.write("      end\n")
+        output_file.write("    endcase\n")
+    output_file.write("  end\n")
+
+    output_file.write("  \n  always @(posedge clk)\n")
+    output_file.write("  begin\n")
+    output_file.write("    load_data <= memory[load_address];\n")
+    output_file.write("    if(store_enable) begin\n")
+    output_file.write("      if (store_address > %i) begin\n"%(memory_size-1))
+    output_file.write("        $display(\"!!!!stack overflow!!!!\");\n")
+    output_file.write("        $finish_and_return(1);\n")
+    output_file.write("        exception <= 1'b1;\n")
+    output_file.write("      end\n")
+    output_file.write("      memory[store_address] <= store_data;\n")
+    output_file.write("    end\n")
+    output_file.write("    if (rst==1'b1) begin\n")
+    output_file.write("      exception <= 1'b0;\n")
+    output_file.write("    end\n")
+    output_file.write("  end\n\n")
+
+    output_file.write(
+        "\n  //////////////////////////////////////////////////////////////////////////////\n")
+    output_file.write(
+        "  // STATE MACHINE                                                              \n")
+    output_file.write(
+        "  //                                                                            \n")
+    output_file.write(
+        "  // Each state executes a step, the state is the address of the first          \n")
+    output_file.write(
+        "  // instruction in the step.                                                   \n")
+    output_file.write("  \n  always @(posedge clk)\n")
+    output_file.write("  begin\n\n")
+    output_file.write("  timer_clock <= timer_clock + 1;\n")
+    output_file.write("  case(state)\n\n")
+
+    for step, code in step_code:
+        for instruction in step.instructions:
+            output_file.write("    //%s %s\n" % (
+                instruction.get("trace", "-"), instruction["op"]))
+        output_file.write("    16'd%s:\n" % step.address)
+        output_file.write("    begin\n")
+        for line in code:
+            output_file.write("      %s\n" % line)
+        output_file.write("    end\n\n")
+
+    for state, comment, code in extra_states:
+        output_file.write("    //%s\n" % comment)
+        output_file.write("    16'd%s:\n" % state)
+        output_file.write("    begin\n")
+        for line in code:
+            output_file.write("      %s\n" % line)
+        output_file.write("    end\n\n")
+
+    output_file.write("  endcase\n\n")
+
+    if opcodes & set(divide_operations):
+        output_file.write("    //divider kernel logic\n")
+        output_file.write("    repeat (%u) begin\n"%(divide_iterations))
+        output_file.write("      shifter = {remainder[30:0], dividend[31]};\n")
+        output_file.write("      difference = shifter - divisor;\n")
+        output_file.write("      dividend = dividend << 1;\n")
+        output_file.write("      if (difference[32]) begin\n")
+        output_file.write("        remainder = shifter;\n")
+        output_file.write("        quotient = quotient << 1;\n")
+        output_file.write("      end else begin\n")
+        output_file.write("        remainder = difference[31:0];\n")
+        output_file.write("        quotient = quotient << 1 | 1;\n")
+        output_file.write("      end\n")
+        output_file.write("    end\n\n")
+
+    if opcodes & set(long_divide_operations):
+        output_file.write("    //long divider kernel logic\n")
+        output_file.write("    repeat (%u) begin\n"%(long_divide_iterations))
+        output_file.write("      long_shifter = {long_remainder[62:0], long_dividend[63]};\n")
+        output_file.write("      long_difference = long_shifter - long_divisor;\n")
+        output_file.write("      long_dividend = long_dividend << 1;\n")
+        output_file.write("      if (long_difference[64]) begin\n")
+        output_file.write("        long_remainder = long_shifter;\n")
+        output_file.write("        long_quotient = long_quotient << 1;\n")
+        output_file.write("      end else begin\n")
+        output_file.write("        long_remainder = long_difference[63:0];\n")
+        output_file.write("        long_quotient = long_quotient << 1 | 1;\n")
+        output_file.write("      end\n")
+        output_file.write("    end\n\n")
+
+    # Reset state machine and control signals
+    output_file.write("    if (rst == 1'b1) begin\n")
+    output_file.write("      timer <= 0;\n")
+    output_file.write("      timer_clock <= 0;\n")
+    output_file.write("      state <= 0;\n")
+
+    for i in inputs:
+        output_file.write("      s_input_%s_ack <= 0;\n" % (i))
+
+    for i in outputs:
+        output_file.write("      s_output_%s_stb <= 0;\n" % (i))
+
+    for i in floating_point_arithmetic:
+        output_file.write("      %s_a_stb <= 0;\n" % (i))
+        output_file.write("      %s_b_stb <= 0;\n" % (i))
+        output_file.write("      %s_z_ack <= 0;\n" % (i))
+
+    for i in floating_point_conversions:
+        output_file.write("      %s_in_stb <= 0;\n" % (i))
+        output_file.write("      %s_out_ack <= 0;\n" % (i))
+
+    output_file.write("    end\n")
+    output_file.write("  end\n")
+    for i in inputs:
+        output_file.write("  assign input_%s_ack = s_input_%s_ack;\n" % (i, i))
+    for i in outputs:
+        output_file.write(
+            "  assign output_%s_stb = s_output_%s_stb;\n" %
+            (i, i))
+        output_file.write("  assign output_%s = s_output_%s;\n" % (i, i))
+    output_file.write("\nendmodule\n")
+
+    return inputs, outputs, shared_units
@@ -1,11 +1,76 @@
 from chips.api.api import Chip, Component, Wire, VerilogComponent
 from chips_c import float_to_bits, double_to_bits, low_word, high_word
+import chips_c
+from chips.compiler.python_model import divide_by_zero
+
+# Components are shared between calls with the same code, so that each
+# temporary C file is only created once.
+_components = {}
+
+
+def _component(C_file, V_file=None, model=None):
+    """Create an inline component, or reuse one with the same code
+
+    The model is a generator function used in simulation in place of the C
+    code.
+    """
+
+    key = (C_file, V_file)
+    if key not in _components:
+        if V_file is None:
+            _components[key] = Component(C_file, inline=True, model=model)
+        else:
+            _components[key] = VerilogComponent(
+                C_file, V_file=V_file, inline=True, model=model)
+    return _components[key]
+
+
+def _calculate(a, b, operation, type_):
+    """Python equivalent of a C arithmetic operation"""
+
+    if operation == "+":
+        return a + b
+    elif operation == "-":
+        return a - b
+    elif operation == "*":
+        return a * b
+    elif type_ == "int":
+        return chips_c.divide(a & 0xffffffff, b & 0xffffffff)
+    elif type_ == "long":
+        return chips_c.long_divide(
+            a & 0xffffffffffffffff, b & 0xffffffffffffffff)
+    try:
+        return a / b
+    except ZeroDivisionError:
+        return divide_by_zero(a, b)
+
+
+def _compare(a, b, operation):
+    """Python equivalent of a C comparison"""
+
+    return int({
+        "==": a == b,
+        "!=": a != b,
+        "<": a < b,
+        "<=": a <= b,
+        ">": a > b,
+        ">=": a >= b,
+    }[operation])
 
 
 def async(chip, a, out=None):
     if out is None:
         out = Wire(chip)
-    async = Component(
+
+    def model(parameters):
+        data = 0
+        while True:
+            if (yield ("ready", "in")):
+                data = yield ("read", "in", "int")
+            if (yield ("output_ready", "out")):
+                yield ("write", "out", data, "int")
+
+    async = _component(
         """void main(){
         int in = input("in");
         int out = output("out");
@@ -19,7 +84,7 @@ def async(chip, a, out=None):
             }
         }
     }""",
-        inline=True)
+        model=model)
     async(
         chip,
         inputs={"in": a},
@@ -107,7 +172,11 @@ def constant(chip, value, type_="int", out=None):
         endmodule
         """ % (high, low)
 
-    constant_component = VerilogComponent(
+    def model(parameters):
+        while True:
+            yield ("write", "out", value, type_)
+
+    constant_component = _component(
 
         C_file="""
             #include <stdio.h>
@@ -119,7 +188,7 @@ def constant(chip, value, type_="int", out=None):
             }
         """ % (type_, value),
         V_file=verilog_file,
-        inline=True
+        model=model
     )
     constant_component(
         chip,
@@ -158,7 +227,12 @@ def cycle(chip, args, type_="int", out=None):
         type_
     )
 
-    cycle_component = Component(c_component, inline=True)
+    def model(parameters):
+        while True:
+            for data in args:
+                yield ("write", "out", data, type_)
+
+    cycle_component = _component(c_component, model=model)
 
     cycle_component(
         chip,
@@ -171,7 +245,7 @@ def cycle(chip, args, type_="int", out=None):
 
 def report_all(chip, stream, type_="int"):
 
-    report_all_component = Component(
+    report_all_component = _component(
         """
         #include <stdio.h>
         int in = input("in");
@@ -180,7 +254,7 @@ def report_all(chip, stream, type_="int"):
                 report(fget_%s(in));
             }
         }
-    """ % type_, inline=True)
+    """ % type_)
 
     report_all_component(
         chip,
@@ -260,7 +334,13 @@ def tee(chip, a, out1=None, out2=None):
         endmodule
     """
 
-    tee_component = VerilogComponent("""
+    def model(parameters):
+        while True:
+            data = yield ("read", "in", "int")
+            yield ("write", "out1", data, "int")
+            yield ("write", "out2", data, "int")
+
+    tee_component = _component("""
         int out1 = output("out1");
         int out2 = output("out2");
         int in = input("in");
@@ -273,7 +353,7 @@ def tee(chip, a, out1=None, out2=None):
             }
         }""", 
         V_file=verilog_file,
-        inline=True)
+        model=model)
 
     if out1 is None:
         out1 = Wire(chip)
@@ -289,7 +369,13 @@ def tee(chip, a, out1=None, out2=None):
 
 
 def delay(chip, a, initial=0, type_="int", out=None):
-    delay_component = Component("""
+    def model(parameters):
+        yield ("write", "out", parameters["INITIAL"], type_)
+        while True:
+            data = yield ("read", "in", type_)
+            yield ("write", "out", data, type_)
+
+    delay_component = _component("""
         #include <stdio.h>
         int out = output("out");
         int in = input("in");
@@ -298,7 +384,7 @@ def delay(chip, a, initial=0, type_="int", out=None):
             while(1){
                 fput_%s(fget_%s(in), out);
             }
-        }""" % (type_, type_, type_), inline=True)
+        }""" % (type_, type_, type_), model=model)
     if out is None:
         out = Wire(chip)
     delay_component(
@@ -313,7 +399,14 @@ def delay(chip, a, initial=0, type_="int", out=None):
 def _arithmetic(chip, a, b, operation, type_="int", out=None):
     if out is None:
         out = Wire(chip)
-    arithmetic_component = Component("""
+    def model(parameters):
+        while True:
+            data_1 = yield ("read", "in1", type_)
+            data_2 = yield ("read", "in2", type_)
+            result = _calculate(data_1, data_2, operation, type_)
+            yield ("write", "out", result, type_)
+
+    arithmetic_component = _component("""
         #include <stdio.h>
         /* Adder component model */
         int out = output("out");
@@ -323,7 +416,7 @@ def _arithmetic(chip, a, b, operation, type_="int", out=None):
             while(1){
                 fput_%s(fget_%s(in1) %s fget_%s(in2), out);
             }
-        }""" % (type_, type_, operation, type_), inline=True)
+        }""" % (type_, type_, operation, type_), model=model)
     arithmetic_component(
         chip,
         inputs={"in1": a, "in2": b},
@@ -349,6 +442,178 @@ def div(chip, a, b, type_="int", out=None):
     return _arithmetic(chip, a, b, "/", type_, out)
 
 
+class _PipelinedModel:
+
+    """Clock by clock simulation model of a pipelined float core
+
+    Like the Verilog core, both inputs are acknowledged in the same clock, a
+    new pair of operands enters the pipeline on every clock, and each result
+    reaches the output stages clocks after its operands. The whole pipeline
+    stalls while the result at the output is not accepted.
+    """
+
+    def __init__(self, operation, stages, inputs, outputs):
+        self.operation = operation
+        self.stages = stages
+        self.inputs = inputs
+        self.outputs = outputs
+        self.max_stack = 0
+
+    def simulation_reset(self):
+        """Empty the pipeline"""
+
+        self.pipeline = [None] * self.stages
+        self.operands = {"in1": None, "in2": None}
+        self.blocked = False
+        self.op = None
+
+    def simulation_step(self):
+        """Advance the pipeline by one clock"""
+
+        out = self.outputs["out"]
+        accepted = out.src_rdy and out.dst_rdy
+        if accepted:
+            self.pipeline[-1] = None
+
+        # an input holds its operand until the other arrives
+        received = False
+        for name, input_ in self.inputs.items():
+            if input_.src_rdy and input_.dst_rdy:
+                self.operands[name] = input_.q
+                received = True
+
+        enable = self.pipeline[-1] is None
+        if enable:
+            result = None
+            if None not in self.operands.values():
+                result = float_to_bits(_calculate(
+                    chips_c.bits_to_float(self.operands["in1"]),
+                    chips_c.bits_to_float(self.operands["in2"]),
+                    self.operation,
+                    "float"))
+                self.operands = {"in1": None, "in2": None}
+            self.pipeline = [result] + self.pipeline[:-1]
+
+        for name, input_ in self.inputs.items():
+            input_.next_dst_rdy = self.operands[name] is None
+
+        if self.pipeline[-1] is not None:
+            if accepted or not out.src_rdy:
+                out.next_q = self.pipeline[-1]
+            out.next_src_rdy = True
+        else:
+            out.next_src_rdy = False
+
+        # the core is only waiting when no data is moving through it
+        if self.pipeline[-1] is not None and not enable:
+            self.blocked, self.op = True, "write"
+        elif self.pipeline.count(None) == self.stages and not received:
+            self.blocked, self.op = True, "read"
+        else:
+            self.blocked, self.op = False, None
+
+    def get_blocked_port(self):
+        """The input or output the core is blocked on, or None"""
+
+        if not self.blocked:
+            return None
+        if self.op == "write":
+            return self.outputs["out"]
+        if self.operands["in1"] is None:
+            return self.inputs["in1"]
+        return self.inputs["in2"]
+
+    def activity(self):
+        """What the core did in the last step, see Chip.get_statistics"""
+
+        if self.blocked:
+            return self.op
+        return "running"
+
+    def get_file(self):
+        """The python file containing the model"""
+
+        return self.simulation_step.im_func.func_code.co_filename
+
+    def get_line(self):
+        """The line of the model that steps the pipeline"""
+
+        return self.simulation_step.im_func.func_code.co_firstlineno
+
+
+def _pipelined(chip, a, b, operation, core, stages, out=None):
+    """A streaming float operation using a pipelined core
+
+    The core accepts an item from each input, and produces a result, on
+    every clock. stages sets the number of clocks of latency, more stages
+    allow a higher clock rate.
+    """
+
+    if out is None:
+        out = Wire(chip)
+
+    def model(parameters, inputs, outputs):
+        return _PipelinedModel(operation, stages, inputs, outputs)
+
+    verilog_file = """
+    module {name} (input_in1,input_in1_stb,input_in2,input_in2_stb,output_out_ack,clk,rst,output_out,output_out_stb,input_in1_ack,input_in2_ack,exception);
+      input [31:0] input_in1;
+      input input_in1_stb;
+      input [31:0] input_in2;
+      input input_in2_stb;
+      input output_out_ack;
+      input clk;
+      input rst;
+      output [31:0] output_out;
+      output output_out_stb;
+      output input_in1_ack;
+      output input_in2_ack;
+      output exception;
+
+      %s #(.STAGES(%u)) core(
+        .clk(clk),
+        .rst(rst),
+        .input_a(input_in1),
+        .input_a_stb(input_in1_stb),
+        .input_a_ack(input_in1_ack),
+        .input_b(input_in2),
+        .input_b_stb(input_in2_stb),
+        .input_b_ack(input_in2_ack),
+        .output_z(output_out),
+        .output_z_stb(output_out_stb),
+        .output_z_ack(output_out_ack)
+      );
+      assign exception = 0;
+    endmodule
+    """ % (core, stages)
+
+    pipelined_component = _component("""
+        #include <stdio.h>
+        int out = output("out");
+        int in1 = input("in1");
+        int in2 = input("in2");
+        void main(){
+            while(1){
+                fput_float(fget_float(in1) %s fget_float(in2), out);
+            }
+        }""" % operation, V_file=verilog_file, model=model)
+    pipelined_component(
+        chip,
+        inputs={"in1": a, "in2": b},
+        outputs={"out": out},
+        parameters={}
+    )
+    return out
+
+
+def pipelined_add(chip, a, b, stages=5, out=None):
+    return _pipelined(chip, a, b, "+", "pipelined_adder", stages, out)
+
+
+def pipelined_mul(chip, a, b, stages=4, out=None):
+    return _pipelined(chip, a, b, "*", "pipelined_multiplier", stages, out)
+
+
 def _comparison(chip, a, b, operation, type_="int", out=None):
     if out is None:
         out = Wire(chip)
@@ -362,7 +627,14 @@ def _comparison(chip, a, b, operation, type_="int", out=None):
                 fput_int(fget_%s(in1) %s fget_%s(in2), out);
             }
         }""" % (type_, operation, type_)
-    comparison = Component(code, inline=True)
+
+    def model(parameters):
+        while True:
+            data_1 = yield ("read", "in1", type_)
+            data_2 = yield ("read", "in2", type_)
+            yield ("write", "out", _compare(data_1, data_2, operation), "int")
+
+    comparison = _component(code, model=model)
     comparison(
         chip,
         inputs={"in1": a, "in2": b},
@@ -421,7 +693,17 @@ def line_arbiter(chip, streams, out=None):
     if out is None:
         out = Wire(chip)
 
-    arbiter_component = VerilogComponent(
+    def model(parameters):
+        while True:
+            for port in ["in1", "in2"]:
+                if (yield ("ready", port)):
+                    while True:
+                        data = yield ("read", port, "int")
+                        yield ("write", "out", data, "int")
+                        if data == ord("\n"):
+                            break
+
+    arbiter_component = _component(
         C_file="""int in1 = input("in1");
             int in2 = input("in2");
             int out = output("out");
@@ -563,7 +845,7 @@ def line_arbiter(chip, streams, out=None):
 
         endmodule""",
 
-        inline=True
+        model=model
     )
 
     tree_combine(chip, arbiter_component, streams, out)
@@ -592,7 +874,14 @@ def arbiter(chip, streams, out=None):
     if out is None:
         out = Wire(chip)
 
-    arbiter_component = VerilogComponent(
+    def model(parameters):
+        while True:
+            for port in ["in1", "in2"]:
+                if (yield ("ready", port)):
+                    data = yield ("read", port, "int")
+                    yield ("write", "out", data, "int")
+
+    arbiter_component = _component(
 
         C_file="""
         int out = output("out");
@@ -711,7 +1000,7 @@ def arbiter(chip, streams, out=None):
 
         endmodule""",
 
-        inline=True
+        model=model
     )
 
     tree_combine(chip, arbiter_component, streams, out)
@@ -734,7 +1023,11 @@ def discard(chip, a):
 
     """
 
-    discard_component = VerilogComponent(
+    def model(parameters):
+        while True:
+            yield ("read", "in", "int")
+
+    discard_component = _component(
 
         C_file="""/* Discard Component */
         int in = input("in");
@@ -759,7 +1052,7 @@ def discard(chip, a):
         endmodule
         """,
 
-        inline=True
+        model=model
     )
 
     discard_component(
@@ -786,7 +1079,7 @@ def assert_all(chip, a):
 
     """
 
-    assert_component = Component(
+    assert_component = _component(
 
         C_file="""/* Discard Component */
         int in = input("in");
@@ -794,9 +1087,7 @@ def assert_all(chip, a):
             while(1){
                 assert(fgetc(in));
             }
-        }""",
-
-        inline=True
+        }"""
     )
 
     assert_component(
@@ -860,7 +1151,7 @@ if __name__ == "__main__":
     chip = Chip("test_chip")
     first = [0, 1, 2, 3, 4, 5, 6]
     second = [10, 11, 12, 13, 14, 15, 16]
-    expected = [0, 10, 1, 11, 2, 12, 3, 13, 4, 15, 6, 16]
+    expected = [0, 10, 1, 11, 2, 12, 3, 13, 4, 14, 5, 15, 6, 16]
     stream_1 = cycle(chip, first)
     stream_2 = cycle(chip, second)
     stream_3 = cycle(chip, expected)
@@ -1029,6 +1320,25 @@ if __name__ == "__main__":
                        )
             test_chip(chip, type_ + " " + fname)
 
+    # Test Pipelined Arithmetic
+    for f, fname in zip([pipelined_add, pipelined_mul], ["add", "mul"]):
+        for stages in [1, 3]:
+
+            a, b, c = test_vectors[fname]
+            chip = Chip("test_chip")
+            assert_all(chip,
+                       eq(chip,
+                          f(chip,
+                            cycle(chip, a, type_="float"),
+                            cycle(chip, b, type_="float"),
+                            stages=stages,
+                            ),
+                          cycle(chip, c, type_="float"),
+                          type_="float",
+                          ),
+                       )
+            test_chip(chip, "pipelined %s %u stages" % (fname, stages))
+
     # Test Comparators
     test_vectors = {
         "eq": [
@@ -1079,3 +1389,105 @@ if __name__ == "__main__":
                           ),
                        )
             test_chip(chip, type_ + " " + fname)
+
+    # Test that the python models handshake in the same way as the C code
+    from chips.api.api import Stimulus, Response
+
+    def slow(chip, a, type_="int"):
+        """A consumer which applies back pressure"""
+
+        response = Response(chip, "out", type_)
+        slow_component = _component("""
+            #include <stdio.h>
+            int in = input("in");
+            int out = output("out");
+            void main(){
+                while(1){
+                    wait_clocks(10);
+                    fput_%s(fget_%s(in), out);
+                }
+            }""" % (type_, type_))
+        slow_component(
+            chip,
+            inputs={"in": a},
+            outputs={"out": response},
+            parameters={}
+        )
+        return response
+
+    def test_model(test_name, build, items=20):
+        print test_name,
+        results = []
+        for behavioural_models in [False, True]:
+            chip = Chip("test_chip", behavioural_models)
+            response = build(chip)
+            chip.simulation_reset()
+            while len(response) < items:
+                chip.simulation_step()
+            results.append(list(response)[:items])
+        # compare the representations, so that NaNs match
+        if map(repr, results[0]) != map(repr, results[1]):
+            print "....python model does not match C"
+            return False
+        print "....passed"
+        return True
+
+    for f, fname in zip([add, sub, mul, div, lt], ["add", "sub", "mul", "div", "lt"]):
+        for type_ in ["float", "double", "int", "long"]:
+
+            def build(chip):
+                a = Stimulus(chip, "a", type_, range(0, 100, 7))
+                b = Stimulus(chip, "b", type_, range(1, 24, 3))
+                result_type = "int" if fname == "lt" else type_
+                return slow(chip, f(chip, a, b, type_=type_), result_type)
+            test_model(type_ + " " + fname + " model", build)
+
+    for type_ in ["float", "double"]:
+
+        def build(chip):
+            a = Stimulus(chip, "a", type_, [1.5, -2.5, 0.0])
+            b = Stimulus(chip, "b", type_, [0.0, -0.0])
+            return slow(chip, div(chip, a, b, type_=type_), type_)
+        test_model(type_ + " divide by zero model", build, items=6)
+
+    for f, fname in zip([pipelined_add, pipelined_mul], ["add", "mul"]):
+
+        def build(chip):
+            a = Stimulus(chip, "a", "float", range(0, 100, 7))
+            b = Stimulus(chip, "b", "float", [0.5, -1.25, 3.0])
+            return slow(chip, f(chip, a, b), "float")
+        test_model("pipelined " + fname + " model", build)
+
+    # Test that the pipelined models produce a result on every clock
+    for f, fname in zip([pipelined_add, pipelined_mul], ["add", "mul"]):
+        for stages in [1, 5]:
+            print "pipelined %s %u stages throughput" % (fname, stages),
+            chip = Chip("test_chip")
+            a = Stimulus(chip, "a", "float", range(64), cycle=False)
+            b = Stimulus(chip, "b", "float", [0.5] * 64, cycle=False)
+            response = Response(chip, "z", "float")
+            f(chip, a, b, stages=stages, out=response)
+            chip.simulation_reset()
+            times = []
+            while len(response) < 64:
+                chip.simulation_step()
+                if len(response) > len(times):
+                    times.append(chip.time)
+            assert times[0] == stages + 2
+            assert times[-1] - times[0] == 63
+            print "....passed"
+
+    def build(chip):
+        a = Stimulus(chip, "a", "double", [1.5, 2.5, 3.5])
+        return slow(chip, delay(chip, a, 0.5, type_="double"), "double")
+    test_model("delay model", build)
+
+    def build(chip):
+        a, b = tee(chip, cycle(chip, [1, 2, 3]))
+        discard(chip, b)
+        return slow(chip, a)
+    test_model("tee model", build)
+
+    def build(chip):
+        return slow(chip, constant(chip, 3, type_="long"), "long")
+    test_model("constant model", build)
@@ -3,47 +3,87 @@ from graphviz import Digraph
 
 class BlockDiagram():
 
-    def __init__(self, chip):
+    def __init__(self, chip, statistics=False):
+        """Draw the instances of a chip and the wires between them
+
+        If statistics is true, the chip must have been simulated with
+        statistics=True, instances are annotated with the time spent running
+        and blocked, and wires with the number of transfers and stalls.
+        """
+
         self.chip = chip
 
         g = Digraph(self.chip.name, graph_attr={"rankdir": "LR"})
 
         sources = {}
         sinks = {}
+        ports = {}
 
         for instance in self.chip.instances:
 
             for port, wire in instance.inputs.iteritems():
                 sinks[str(id(wire))] = str(id(instance)) + ":" + port
+                ports[str(id(wire))] = wire
 
             for port, wire in instance.outputs.iteritems():
                 sources[str(id(wire))] = str(id(instance)) + ":" + port
+                ports[str(id(wire))] = wire
 
             inputs = "|".join(["<%s> %s" % (i, i)
                               for i in instance.inputs.keys()])
             outputs = "|".join(["<%s> %s" % (i, i)
                                for i in instance.outputs.keys()])
+            name = instance.component_name
+            if statistics:
+                name += "\\n" + self.instance_statistics(instance)
             label = "{{%s}|%s|{%s}}" % (
                 inputs,
-                instance.component_name,
+                name,
                 outputs
             )
             g.node(str(id(instance)), label=label, shape="record")
 
         for input_ in self.chip.inputs.values():
             sources[str(id(input_))] = str(id(input_))
+            ports[str(id(input_))] = input_
             g.node(str(id(input_)), label=input_.name, shape="record")
 
         for output_ in self.chip.outputs.values():
             sinks[str(id(output_))] = str(id(output_))
+            ports[str(id(output_))] = output_
             g.node(str(id(output_)), label=output_.name, shape="record")
 
         for wire, source in sources.iteritems():
             sink = sinks[wire]
-            g.edge(source, sink)
+            if statistics:
+                g.edge(source, sink,
+                       label=self.port_statistics(ports[wire]))
+            else:
+                g.edge(source, sink)
 
         self.g = g
 
+    def percent(self, count):
+        return 100.0 * count / max(self.chip.time, 1)
+
+    def instance_statistics(self, instance):
+        counts = instance.statistics
+        return "run %.0f%% read %.0f%% write %.0f%% wait %.0f%%" % tuple(
+            self.percent(counts[i])
+            for i in ["running", "read", "write", "wait"])
+
+    def port_statistics(self, port):
+        counts = port.statistics
+        label = "%u transfers\\nstb no ack %.0f%%\\nack no stb %.0f%%" % (
+            counts["transfers"],
+            self.percent(counts["stb_no_ack"]),
+            self.percent(counts["ack_no_stb"]))
+        if getattr(port, "depth", 0):
+            counts = port.source_port.statistics
+            label += "\\nfifo full %.0f%%" % self.percent(
+                counts["stb_no_ack"])
+        return label
+
     def render(self, *args, **vargs):
         return self.g.render(*args, **vargs)
 
@@ -7,6 +7,7 @@ import wx.py.editwindow
 
 from chips.utils.gui_instance import GuiInstance
 from chips.utils.gui_report import GuiReport
+from chips.utils.block_diagram import BlockDiagram
 
 image_dir = os.path.join(os.path.dirname(__file__), "icons")
 
@@ -110,6 +111,16 @@ class Debugger(wx.Frame):
             )
             report.report(report_line, 0)
 
+    def report_statistics(self, event):
+        report = GuiReport(self, "statistics report")
+        report.report("statistics report for %s after %u cycles\n" % (
+            self.chip.name, self.chip.time), 0)
+        for line in self.chip.statistics_table().splitlines():
+            report.report(line, 0)
+
+    def show_block_diagram(self, event):
+        BlockDiagram(self.chip, self.chip.statistics).view()
+
 if __name__ == "__main__":
     from chips.components.components import *
     chip = Chip("a chip")
@@ -0,0 +1,504 @@
+"""Design space exploration
+
+Build a design for every point in a grid of options, measure the clock
+cycles it takes to process a set of stimulus with the cycle accurate Python
+model, and estimate its area from the generated Verilog. The points which
+can't be made faster without making them larger form the Pareto front.
+
+An exploration is described by a JSON file:
+
+.. code-block:: javascript
+
+    {
+        "component": "filter.c",
+        "stimulus": {"samples": {"type": "int", "values": [1, 2, 3, 4]}},
+        "response": {"filtered": {"type": "int", "items": 4}},
+        "options": ["multiplier=dsp"],
+        "grid": {
+            "backend": ["area", "speed"],
+            "divide_latency": [32, 8],
+            "memory_size": [512, 1024],
+            "macro_policy": ["speed", "area"],
+            "parameters": {"UNROLL": [1, 2, 4]}
+        }
+    }
+
+The component's inputs and outputs are named after the stimulus and
+response. A chain of components is described with a list, where names which
+are neither a stimulus nor a response are wires between the components:
+
+.. code-block:: javascript
+
+    "components": [
+        {"file": "producer.c", "inputs": {"in": "samples"},
+         "outputs": {"out": "raw"}},
+        {"file": "filter.c", "inputs": {"in": "raw"},
+         "outputs": {"out": "filtered"}}
+    ]
+
+A stimulus gives its `values`, or a raw binary `file` of little endian
+values. A response gives the number of `items` to wait for, otherwise the
+simulation runs until the components stop.
+
+Each key in the grid is a list of values to try. The `backend` is area or
+speed, `depth` sets the FIFO depth of every wire, and `parameters` are
+substituted into the C code, for example to choose how far a loop is
+unrolled. Any other key is passed to the compiler as an option, so
+`macro_policy` chooses how long and double macros are inlined. Option values
+of true and false add or leave out an option without a value.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import itertools
+import subprocess
+import multiprocessing
+
+import chips
+import chips.compiler.tokens
+from chips.api.api import Chip, Component, Wire, Stimulus, Response
+from chips.compiler.exceptions import C2CHIPError, ChipsAssertionFail
+from chips.compiler.exceptions import Deadlock, StopSim
+
+# Rough cost of each resource in LUT equivalents. The estimate is only
+# intended to compare designs with each other, not to predict the result of
+# synthesis.
+area_weights = {
+    "flip_flops": 1,
+    "statements": 4,
+    "memory_bits": 1.0 / 64,
+    "multipliers": 100,
+}
+
+# Rough cost of each floating point core in LUT equivalents.
+floating_point_area = {
+    "adder": 700,
+    "multiplier": 500,
+    "divider": 900,
+    "double_adder": 1400,
+    "double_multiplier": 1100,
+    "double_divider": 1900,
+    "int_to_float": 300,
+    "float_to_int": 300,
+    "long_to_double": 500,
+    "double_to_long": 500,
+    "float_to_double": 150,
+    "double_to_float": 200,
+}
+
+# Grid keys which don't become compiler options.
+grid_keys = ["backend", "depth", "parameters"]
+
+
+def load_spec(filename):
+    """Read an exploration from a JSON file
+
+    Files named by the exploration are relative to the directory containing
+    it.
+    """
+
+    spec = json.load(open(filename))
+    directory = os.path.dirname(os.path.abspath(filename))
+    components = spec.get("components")
+    if components is None:
+        components = [{
+            "file": spec["component"],
+            "inputs": dict((i, i) for i in spec.get("stimulus", {})),
+            "outputs": dict((i, i) for i in spec.get("response", {})),
+        }]
+    for component in components:
+        component["file"] = os.path.join(directory, component["file"])
+    spec["components"] = components
+    for stimulus in spec.get("stimulus", {}).values():
+        if "file" in stimulus:
+            stimulus["file"] = os.path.join(directory, stimulus["file"])
+    return spec
+
+
+def grid_points(grid):
+    """Every combination of the values in the grid
+
+    Returns a list of dictionaries. Parameters are returned in a dictionary
+    of their own under the parameters key.
+    """
+
+    axes = [(key, values) for key, values in sorted(grid.items())
+            if key != "parameters"]
+    parameters = sorted(grid.get("parameters", {}).items())
+    names = [key for key, values in axes] + [key for key, values in parameters]
+    values = [values for key, values in axes + parameters]
+
+    points = []
+    for combination in itertools.product(*values):
+        point = dict(zip(names[:len(axes)], combination[:len(axes)]))
+        point["parameters"] = dict(
+            zip(names[len(axes):], combination[len(axes):]))
+        points.append(point)
+    return points
+
+
+def point_options(spec, point):
+    """The compile options used at a point in the grid"""
+
+    options = list(spec.get("options", []))
+    if point.get("backend", "area") == "speed":
+        options.append("speed")
+    elif point.get("backend", "area") != "area":
+        raise C2CHIPError(
+            "unknown backend %s, expected area or speed" % point["backend"])
+    for key, value in sorted(point.items()):
+        if key in grid_keys:
+            continue
+        if value is True:
+            options.append(key)
+        elif value is not False:
+            options.append("%s=%s" % (key, value))
+    return options
+
+
+def included_files(filename):
+    """A C file and the files it includes
+
+    The files are listed by the C preprocessor, if it fails the compiler will
+    report the error, so only the file itself is returned.
+    """
+
+    directory = os.path.join(
+        os.path.dirname(os.path.abspath(chips.compiler.tokens.__file__)),
+        "include")
+    pipe = subprocess.Popen(
+        ["cpp", "-M", "-nostdinc", "-isystem", directory, filename],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE)
+    dependencies, _ = pipe.communicate()
+    if pipe.returncode != 0:
+        return [filename]
+    return dependencies.replace("\\\n", " ").split()[1:]
+
+
+_chips_digest = None
+
+
+def chips_digest():
+    """A digest of the Chips sources, which changes when Chips is upgraded"""
+
+    global _chips_digest
+    if _chips_digest is None:
+        digest = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(chips.__file__))
+        for package in ["api", "compiler", "components"]:
+            for root, dirs, files in sorted(
+                    os.walk(os.path.join(directory, package))):
+                for filename in sorted(files):
+                    if os.path.splitext(filename)[1] in [".py", ".h", ".v"]:
+                        digest.update(
+                            open(os.path.join(root, filename), "rb").read())
+        _chips_digest = digest.hexdigest()
+    return _chips_digest
+
+
+def point_key(spec, point):
+    """A key which changes when anything affecting a point changes
+
+    This includes the files the components include, and the version of
+    Chips used.
+    """
+
+    digest = hashlib.sha1()
+    digest.update(json.dumps([
+        point,
+        spec.get("options", []),
+        spec["components"],
+        spec.get("stimulus", {}),
+        spec.get("response", {}),
+        spec.get("max_cycles"),
+    ], sort_keys=True))
+    digest.update(chips_digest())
+    for component in spec["components"]:
+        for filename in included_files(component["file"]):
+            digest.update(open(filename).read())
+    for stimulus in spec.get("stimulus", {}).values():
+        if "file" in stimulus:
+            digest.update(open(stimulus["file"], "rb").read())
+    return digest.hexdigest()
+
+
+def build_chip(spec, point, options):
+    """Create a chip which connects the components to the stimulus"""
+
+    chip = Chip("explore")
+    chip.set_report_sink(None)
+    ports = {}
+    for name, stimulus in spec.get("stimulus", {}).items():
+        if "file" in stimulus:
+            ports[name] = Stimulus.from_file(
+                chip, name, stimulus["type"], stimulus["file"], cycle=False)
+        else:
+            ports[name] = Stimulus(
+                chip, name, stimulus["type"], stimulus["values"], cycle=False)
+    for name, response in spec.get("response", {}).items():
+        ports[name] = Response(chip, name, response["type"])
+
+    def port(name):
+        if name not in ports:
+            ports[name] = Wire(chip, depth=point.get("depth", 0))
+        return ports[name]
+
+    for component in spec["components"]:
+        Component(component["file"], options=options)(
+            chip,
+            inputs=dict((i, port(j)) for i, j in
+                        component.get("inputs", {}).items()),
+            outputs=dict((i, port(j)) for i, j in
+                         component.get("outputs", {}).items()),
+            parameters=point.get("parameters", {}))
+    return chip
+
+
+def measure_cycles(spec, chip):
+    """Clock cycles taken to produce the expected responses
+
+    Without a number of items, the time at which the simulation stops.
+    """
+
+    responses = [(chip.outputs[name], response["items"]) for name, response
+                 in spec.get("response", {}).items() if "items" in response]
+    max_cycles = spec.get("max_cycles", 10000000)
+
+    chip.simulation_reset()
+    try:
+        while chip.time < max_cycles:
+            if responses and all(len(i) >= n for i, n in responses):
+                break
+            chip.simulation_step(detect_deadlock=True)
+        else:
+            raise C2CHIPError(
+                "responses not complete after %u cycles" % max_cycles)
+    except StopSim:
+        pass
+
+    if not responses:
+        return chip.time
+    for response, items in responses:
+        if len(response) < items:
+            raise C2CHIPError(
+                "%s received %u of %u items" % (
+                    response.name, len(response), items))
+    return max(int(response.times[items - 1]) + 1
+               for response, items in responses)
+
+
+def estimate_area(filenames):
+    """Estimate the area of generated Verilog files
+
+    Returns the number of flip-flops, of statements in the logic (with the
+    statements in unrolled loops counted once for each iteration), of memory
+    bits, of multipliers and the floating point cores instanced.
+    """
+
+    resources = {
+        "flip_flops": 0,
+        "statements": 0,
+        "memory_bits": 0,
+        "multipliers": 0,
+        "floating_point": {},
+    }
+    register = re.compile(r"^\s*(?:output\s+)?reg\s*(?:\[(\d+):0\])?\s*(\w+)\s*;")
+    memory = re.compile(r"^\s*reg\s*\[(\d+):0\]\s*\w+\s*\[(\d+):0\]\s*;")
+    instance = re.compile(r"^\s*(\w+)\s+\w+_inst\s*\(")
+    initialisation = re.compile(r"^\s*\w+\[\d+\]\s*=")
+    repeat = re.compile(r"^(\s*)repeat\s*\((\d+)\)\s*begin")
+
+    for filename in filenames:
+        iterations = 1
+        indent = None
+        initial = False
+        for line in open(filename):
+            match = memory.match(line)
+            if match:
+                resources["memory_bits"] += (
+                    (int(match.group(1)) + 1) * (int(match.group(2)) + 1))
+                continue
+            match = register.match(line)
+            if match:
+                resources["flip_flops"] += int(match.group(1) or 0) + 1
+                continue
+            match = instance.match(line)
+            if match and match.group(1) in floating_point_area:
+                cores = resources["floating_point"]
+                cores[match.group(1)] = cores.get(match.group(1), 0) + 1
+                continue
+            match = repeat.match(line)
+            if match:
+                indent, iterations = match.group(1), int(match.group(2))
+                continue
+            if indent is not None and line.rstrip() == indent + "end":
+                indent, iterations = None, 1
+                continue
+
+            # initial blocks only set up memories and simulation
+            if line.strip().startswith("initial"):
+                initial = True
+            elif line.strip().startswith("always"):
+                initial = False
+            if initial or "$" in line or initialisation.match(line):
+                continue
+            if line.rstrip().endswith(";") and "=" in line:
+                resources["statements"] += iterations
+                resources["multipliers"] += line.count(" * ") * iterations
+
+    return resources
+
+
+def area(resources):
+    """Combine the resources into a single estimate in LUT equivalents"""
+
+    total = 0
+    for key, weight in area_weights.items():
+        total += resources[key] * weight
+    for core, count in resources["floating_point"].items():
+        total += floating_point_area[core] * count
+    return int(round(total))
+
+
+def evaluate(spec, point):
+    """Build and measure the design at one point in the grid
+
+    The Verilog is generated in a temporary directory. Returns a dictionary
+    giving the point, the clock cycles, the estimated area and the resources
+    it was estimated from, or the error which prevented the point from being
+    built.
+    """
+
+    result = {"point": point, "cycles": None, "area": None,
+              "resources": None, "error": None}
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp()
+    try:
+        os.chdir(directory)
+        options = point_options(spec, point)
+        chip = build_chip(spec, point, options + ["cycle_accurate"])
+        result["cycles"] = measure_cycles(spec, chip)
+        chip = build_chip(spec, point, options)
+        chip.generate_verilog()
+        resources = estimate_area(
+            [i for i in os.listdir(".")
+             if i.endswith(".v") and i != "chips_lib.v"])
+        result["resources"] = resources
+        result["area"] = area(resources)
+    except (C2CHIPError, Deadlock) as err:
+        result["error"] = err.message
+    except ChipsAssertionFail as err:
+        result["error"] = str(err)
+    except SystemExit:
+        # the compiler has already printed the error
+        result["error"] = "compilation failed"
+    except Exception as err:
+        # a failing point mustn't lose the results of the others
+        result["error"] = "%s: %s" % (type(err).__name__, err)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    return result
+
+
+def _evaluate(arguments):
+    """evaluate, with a single argument for use by a process pool"""
+
+    return evaluate(*arguments)
+
+
+def explore(spec, jobs=None, cache=None):
+    """Evaluate every point in the grid
+
+    Points are evaluated by `jobs` processes in parallel (by default one for
+    each CPU). When a cache file is given, results are loaded from it, and
+    only points which have not been evaluated before, or whose sources, the
+    files they include or the version of Chips have changed, are evaluated.
+    Returns a list of results, and the number of points evaluated.
+    """
+
+    cached = {}
+    if cache is not None and os.path.exists(cache):
+        cached = json.load(open(cache))
+
+    points = grid_points(spec.get("grid", {}))
+    keys = [point_key(spec, point) for point in points]
+    new = [(key, point) for key, point in zip(keys, points)
+           if key not in cached]
+
+    if jobs == 1 or len(new) < 2:
+        results = map(_evaluate, [(spec, point) for key, point in new])
+    else:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = pool.map(_evaluate, [(spec, point) for key, point in new])
+        finally:
+            pool.close()
+            pool.join()
+
+    for (key, point), result in zip(new, results):
+        cached[key] = result
+
+    if cache is not None:
+        json.dump(cached, open(cache, "w"), indent=1, sort_keys=True)
+
+    return [cached[key] for key in keys], len(new)
+
+
+def pareto_front(results):
+    """The results which no other result beats on both cycles and area"""
+
+    valid = [i for i in results if i["error"] is None]
+    front = []
+    for result in valid:
+        dominated = False
+        for other in valid:
+            if (other["cycles"] <= result["cycles"] and
+                    other["area"] <= result["area"] and
+                    (other["cycles"], other["area"]) !=
+                    (result["cycles"], result["area"])):
+                dominated = True
+                break
+        if not dominated:
+            front.append(result)
+    return sorted(front, key=lambda i: (i["cycles"], i["area"]))
+
+
+def describe(point):
+    """A short description of a point in the grid"""
+
+    settings = ["%s=%s" % (key, value) for key, value in sorted(point.items())
+                if key != "parameters"]
+    settings += ["%s=%s" % (key, value) for key, value in
+                 sorted(point.get("parameters", {}).items())]
+    return " ".join(settings)
+
+
+def report(results, show_all=False, output=sys.stdout):
+    """Print the Pareto front, or every point marking the Pareto front"""
+
+    front = pareto_front(results)
+    if show_all:
+        shown = sorted(results, key=lambda i: (
+            i["error"] is not None, i["cycles"], i["area"]))
+    else:
+        shown = front
+
+    output.write("%-3s %12s %10s %s\n" % ("", "cycles", "area", "point"))
+    for result in shown:
+        marker = "*" if result in front else ""
+        if result["error"] is not None:
+            output.write("%-3s %12s %10s %s (%s)\n" % (
+                marker, "-", "-", describe(result["point"]), result["error"]))
+        else:
+            output.write("%-3s %12u %10u %s\n" % (
+                marker, result["cycles"], result["area"],
+                describe(result["point"])))
+    output.write("\n%u points, %u on the Pareto front\n" % (
+        len(results), len(front)))
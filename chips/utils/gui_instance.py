@@ -12,7 +12,7 @@ import wx.stc as stc
 from chips.compiler.types import size_of
 from chips.compiler.register_map import rregmap, frame
 import chips.compiler.profiler as profiler
-from chips.compiler.exceptions import StopSim, BreakSim
+from chips.compiler.exceptions import StopSim, BreakSim, Deadlock
 from chips_c import bits_to_float, bits_to_double
 from chips.utils.gui_report import GuiReport
 
@@ -110,7 +110,26 @@ class GuiInstance(wx.Frame):
                 wx.Bitmap(os.path.join(image_dir, "stop_disabled.png")), 
                 shortHelp="Report Code Coverage"
         )
+        self.report_statistics = toolbar.AddLabelTool(
+                wx.NewId(),
+                "report statistics",
+                wx.Bitmap(os.path.join(image_dir, "stop.png")),
+                wx.Bitmap(os.path.join(image_dir, "stop_disabled.png")),
+                shortHelp="Report Wire and Instance Statistics"
+        )
+        self.block_diagram = toolbar.AddLabelTool(
+                wx.NewId(),
+                "block diagram",
+                wx.Bitmap(os.path.join(image_dir, "stop.png")),
+                wx.Bitmap(os.path.join(image_dir, "stop_disabled.png")),
+                shortHelp="Show Block Diagram"
+        )
         self.stop.Enable(False)
+        self.report_statistics.Enable(self.parent.chip.statistics)
+        self.Bind(wx.EVT_TOOL, self.parent.report_statistics,
+                  self.report_statistics)
+        self.Bind(wx.EVT_TOOL, self.parent.show_block_diagram,
+                  self.block_diagram)
         self.Bind(wx.EVT_TOOL, self.on_reset, self.reset)
         self.Bind(wx.EVT_TOOL, self.on_tick, self.tick)
         self.Bind(wx.EVT_TOOL, self.on_over, self.over)
@@ -450,6 +469,9 @@ class GuiInstance(wx.Frame):
         except StopSim:
             return True
             pass
+        except Deadlock as deadlock:
+            wx.MessageBox(str(deadlock), "Deadlock")
+            return True
 
     def on_report_code_coverage(self, event):
         report = GuiReport(self, "Code Coverage Report")
@@ -0,0 +1,56 @@
+//Pipeline Register for the Pipelined Floating Point Cores
+//Copyright (C) Jonathan P Dawson 2013
+//
+//When REGISTERED is zero, the data passes straight through, so that the
+//number of stages in a pipeline can be chosen using parameters.
+
+module fpu_pipeline_register(
+        clk,
+        rst,
+        enable,
+        input_valid,
+        input_data,
+        output_valid,
+        output_data);
+
+  parameter WIDTH = 32;
+  parameter REGISTERED = 1;
+
+  input     clk;
+  input     rst;
+  input     enable;
+  input     input_valid;
+  input     [WIDTH-1:0] input_data;
+  output    output_valid;
+  output    [WIDTH-1:0] output_data;
+
+  generate
+    if (REGISTERED) begin
+
+      reg       s_output_valid;
+      reg       [WIDTH-1:0] s_output_data;
+
+      always @(posedge clk)
+      begin
+        if (enable) begin
+          s_output_valid <= input_valid;
+          s_output_data <= input_data;
+        end
+        if (rst == 1'b1) begin
+          s_output_valid <= 0;
+        end
+      end
+
+      assign output_valid = s_output_valid;
+      assign output_data = s_output_data;
+
+    end else begin
+
+      assign output_valid = input_valid;
+      assign output_data = input_data;
+
+    end
+  endgenerate
+
+endmodule
+
@@ -0,0 +1,207 @@
+//IEEE Floating Point Adder (Single Precision, Pipelined)
+//Copyright (C) Jonathan P Dawson 2013
+//
+//A new pair of operands can be accepted, and a result produced, on every
+//clock. The addition is divided into five steps, unpack, align, add,
+//normalise and round. STAGES (1 to 5) of the boundaries between the steps
+//are registered, so the latency is STAGES clocks. When the result is not
+//accepted, the whole pipeline stalls.
+
+module pipelined_adder(
+        input_a,
+        input_b,
+        input_a_stb,
+        input_b_stb,
+        output_z_ack,
+        clk,
+        rst,
+        output_z,
+        output_z_stb,
+        input_a_ack,
+        input_b_ack);
+
+  parameter STAGES = 5;
+
+  input     clk;
+  input     rst;
+
+  input     [31:0] input_a;
+  input     input_a_stb;
+  output    input_a_ack;
+
+  input     [31:0] input_b;
+  input     input_b_stb;
+  output    input_b_ack;
+
+  output    [31:0] output_z;
+  output    output_z_stb;
+  input     output_z_ack;
+
+  wire      enable;
+  wire      accept;
+
+  //both operands are accepted together
+  assign enable = !output_z_stb || output_z_ack;
+  assign accept = input_a_stb && input_b_stb && enable;
+  assign input_a_ack = input_b_stb && enable;
+  assign input_b_ack = input_a_stb && enable;
+
+  //unpack
+  wire      [31:0] x, y;
+  wire      x_nan, y_nan, x_inf, y_inf;
+  reg       [32:0] u_special;
+
+  //the operand with the larger magnitude is x
+  assign x = input_a[30:0] >= input_b[30:0] ? input_a : input_b;
+  assign y = input_a[30:0] >= input_b[30:0] ? input_b : input_a;
+  assign x_nan = x[30:23] == 255 && x[22:0] != 0;
+  assign y_nan = y[30:23] == 255 && y[22:0] != 0;
+  assign x_inf = x[30:23] == 255 && x[22:0] == 0;
+  assign y_inf = y[30:23] == 255 && y[22:0] == 0;
+
+  always @*
+  begin
+    if (x_nan || y_nan || (x_inf && y_inf && x[31] != y[31])) begin
+      u_special = {1'b1, 32'hffc00000};
+    end else if (x_inf) begin
+      u_special = {1'b1, x};
+    end else begin
+      u_special = 0;
+    end
+  end
+
+  wire      [98:0] u_out, a_in;
+  wire      a_valid;
+  assign u_out = {
+    u_special,
+    x[31],
+    (x[30:23] == 0 ? 8'd1 : x[30:23]),
+    (x[30:23] != 0), x[22:0],
+    y[31],
+    (y[30:23] == 0 ? 8'd1 : y[30:23]),
+    (y[30:23] != 0), y[22:0]};
+
+  fpu_pipeline_register #(.WIDTH(99), .REGISTERED(
+    (1 * STAGES) / 5 != (0 * STAGES) / 5)) unpack_register(
+    clk, rst, enable, accept, u_out, a_valid, a_in);
+
+  //align
+  wire      [32:0] a_special;
+  wire      a_x_s, a_y_s;
+  wire      [7:0] a_x_e, a_y_e, a_d;
+  wire      [23:0] a_x_m, a_y_m;
+  wire      [26:0] a_y_shifted;
+  wire      a_sticky;
+  assign {a_special, a_x_s, a_x_e, a_x_m, a_y_s, a_y_e, a_y_m} = a_in;
+  assign a_d = a_x_e - a_y_e;
+  assign a_y_shifted = a_d > 26 ? 27'd0 : {a_y_m, 3'd0} >> a_d;
+  assign a_sticky = a_d > 26 ? a_y_m != 0 :
+    ({a_y_m, 3'd0} & ~(27'h7ffffff << a_d)) != 0;
+
+  wire      [96:0] a_out, s_in;
+  wire      s_valid;
+  assign a_out = {
+    a_special,
+    a_x_s,
+    a_x_s != a_y_s,
+    a_x_e,
+    {a_x_m, 3'd0},
+    a_y_shifted | a_sticky};
+
+  fpu_pipeline_register #(.WIDTH(97), .REGISTERED(
+    (2 * STAGES) / 5 != (1 * STAGES) / 5)) align_register(
+    clk, rst, enable, a_valid, a_out, s_valid, s_in);
+
+  //add
+  wire      [32:0] s_special;
+  wire      s_x_s, s_subtract;
+  wire      [7:0] s_e;
+  wire      [26:0] s_x_m, s_y_m;
+  wire      [27:0] s_sum;
+  assign {s_special, s_x_s, s_subtract, s_e, s_x_m, s_y_m} = s_in;
+  assign s_sum = s_subtract ? s_x_m - s_y_m : s_x_m + s_y_m;
+
+  wire      [70:0] s_out, n_in;
+  wire      n_valid;
+  //an exact zero is positive unless both operands are negative
+  assign s_out = {
+    s_special,
+    (s_sum == 0 && s_subtract) ? 1'b0 : s_x_s,
+    {1'b0, s_e},
+    s_sum};
+
+  fpu_pipeline_register #(.WIDTH(71), .REGISTERED(
+    (3 * STAGES) / 5 != (2 * STAGES) / 5)) add_register(
+    clk, rst, enable, s_valid, s_out, n_valid, n_in);
+
+  //normalise
+  wire      [32:0] n_special;
+  wire      n_s;
+  wire      [8:0] n_e;
+  wire      [27:0] n_sum;
+  reg       [4:0] n_zeros;
+  reg       [8:0] n_shift;
+  reg       [26:0] n_m;
+  reg       [9:0] n_z_e;
+  integer   i;
+  assign {n_special, n_s, n_e, n_sum} = n_in;
+
+  always @*
+  begin
+    n_zeros = 27;
+    for (i = 0; i <= 26; i = i + 1) begin
+      if (n_sum[i]) begin
+        n_zeros = 26 - i;
+      end
+    end
+    //stop at the smallest exponent, leaving a denormal
+    n_shift = n_zeros < n_e ? n_zeros : n_e - 1;
+    if (n_sum[27]) begin
+      n_m = {n_sum[27:2], n_sum[1] | n_sum[0]};
+      n_z_e = n_e + 1;
+    end else begin
+      n_m = n_sum[26:0] << n_shift;
+      n_z_e = n_e - n_shift;
+    end
+  end
+
+  wire      [70:0] n_out, r_in;
+  wire      r_valid;
+  assign n_out = {n_special, n_s, n_z_e, n_m};
+
+  fpu_pipeline_register #(.WIDTH(71), .REGISTERED(
+    (4 * STAGES) / 5 != (3 * STAGES) / 5)) normalise_register(
+    clk, rst, enable, n_valid, n_out, r_valid, r_in);
+
+  //round
+  wire      [32:0] r_special;
+  wire      r_s;
+  wire      [9:0] r_e;
+  wire      [26:0] r_m;
+  wire      [24:0] r_rounded;
+  wire      [23:0] r_z_m;
+  wire      [9:0] r_z_e;
+  reg       [31:0] r_z;
+  assign {r_special, r_s, r_e, r_m} = r_in;
+  assign r_rounded = r_m[26:3] + (r_m[2] && (r_m[1] || r_m[0] || r_m[3]));
+  assign r_z_m = r_rounded[24] ? r_rounded[24:1] : r_rounded[23:0];
+  assign r_z_e = r_rounded[24] ? r_e + 1 : r_e;
+
+  always @*
+  begin
+    if (r_special[32]) begin
+      r_z = r_special[31:0];
+    end else if (r_z_e >= 255) begin
+      r_z = {r_s, 8'd255, 23'd0};
+    end else if (r_z_m[23]) begin
+      r_z = {r_s, r_z_e[7:0], r_z_m[22:0]};
+    end else begin
+      r_z = {r_s, 8'd0, r_z_m[22:0]};
+    end
+  end
+
+  fpu_pipeline_register #(.WIDTH(32), .REGISTERED(1)) round_register(
+    clk, rst, enable, r_valid, r_z, output_z_stb, output_z);
+
+endmodule
+
@@ -0,0 +1,189 @@
+//IEEE Floating Point Multiplier (Single Precision, Pipelined)
+//Copyright (C) Jonathan P Dawson 2013
+//
+//A new pair of operands can be accepted, and a result produced, on every
+//clock. The multiplication is divided into four steps, unpack, multiply,
+//normalise and round. STAGES (1 to 4) of the boundaries between the steps
+//are registered, so the latency is STAGES clocks. When the result is not
+//accepted, the whole pipeline stalls.
+
+module pipelined_multiplier(
+        input_a,
+        input_b,
+        input_a_stb,
+        input_b_stb,
+        output_z_ack,
+        clk,
+        rst,
+        output_z,
+        output_z_stb,
+        input_a_ack,
+        input_b_ack);
+
+  parameter STAGES = 4;
+
+  input     clk;
+  input     rst;
+
+  input     [31:0] input_a;
+  input     input_a_stb;
+  output    input_a_ack;
+
+  input     [31:0] input_b;
+  input     input_b_stb;
+  output    input_b_ack;
+
+  output    [31:0] output_z;
+  output    output_z_stb;
+  input     output_z_ack;
+
+  wire      enable;
+  wire      accept;
+
+  //both operands are accepted together
+  assign enable = !output_z_stb || output_z_ack;
+  assign accept = input_a_stb && input_b_stb && enable;
+  assign input_a_ack = input_b_stb && enable;
+  assign input_b_ack = input_a_stb && enable;
+
+  //unpack
+  wire      a_nan, b_nan, a_inf, b_inf, a_zero, b_zero;
+  wire      u_s;
+  wire      [7:0] u_a_e, u_b_e;
+  reg       [32:0] u_special;
+
+  assign a_nan = input_a[30:23] == 255 && input_a[22:0] != 0;
+  assign b_nan = input_b[30:23] == 255 && input_b[22:0] != 0;
+  assign a_inf = input_a[30:23] == 255 && input_a[22:0] == 0;
+  assign b_inf = input_b[30:23] == 255 && input_b[22:0] == 0;
+  assign a_zero = input_a[30:0] == 0;
+  assign b_zero = input_b[30:0] == 0;
+  assign u_s = input_a[31] ^ input_b[31];
+  assign u_a_e = input_a[30:23] == 0 ? 8'd1 : input_a[30:23];
+  assign u_b_e = input_b[30:23] == 0 ? 8'd1 : input_b[30:23];
+
+  always @*
+  begin
+    if (a_nan || b_nan || (a_inf && b_zero) || (b_inf && a_zero)) begin
+      u_special = {1'b1, 32'hffc00000};
+    end else if (a_inf || b_inf) begin
+      u_special = {1'b1, u_s, 8'd255, 23'd0};
+    end else if (a_zero || b_zero) begin
+      u_special = {1'b1, u_s, 31'd0};
+    end else begin
+      u_special = 0;
+    end
+  end
+
+  wire      [92:0] u_out, m_in;
+  wire      m_valid;
+  //the exponent of bit 47 of the product
+  assign u_out = {
+    u_special,
+    u_s,
+    {3'd0, u_a_e} + {3'd0, u_b_e} - 11'd126,
+    (input_a[30:23] != 0), input_a[22:0],
+    (input_b[30:23] != 0), input_b[22:0]};
+
+  fpu_pipeline_register #(.WIDTH(93), .REGISTERED(
+    (1 * STAGES) / 4 != (0 * STAGES) / 4)) unpack_register(
+    clk, rst, enable, accept, u_out, m_valid, m_in);
+
+  //multiply
+  wire      [32:0] m_special;
+  wire      m_s;
+  wire      [10:0] m_e;
+  wire      [23:0] m_a_m, m_b_m;
+  wire      [47:0] m_product;
+  assign {m_special, m_s, m_e, m_a_m, m_b_m} = m_in;
+  assign m_product = m_a_m * m_b_m;
+
+  wire      [92:0] m_out, n_in;
+  wire      n_valid;
+  assign m_out = {m_special, m_s, m_e, m_product};
+
+  fpu_pipeline_register #(.WIDTH(93), .REGISTERED(
+    (2 * STAGES) / 4 != (1 * STAGES) / 4)) multiply_register(
+    clk, rst, enable, m_valid, m_out, n_valid, n_in);
+
+  //normalise
+  wire      [32:0] n_special;
+  wire      n_s;
+  wire      signed [10:0] n_e;
+  wire      [47:0] n_product;
+  reg       [5:0] n_zeros;
+  reg       signed [10:0] n_shift;
+  reg       [47:0] n_m;
+  reg       n_sticky;
+  integer   i;
+  assign {n_special, n_s, n_e, n_product} = n_in;
+
+  always @*
+  begin
+    n_zeros = 48;
+    for (i = 0; i <= 47; i = i + 1) begin
+      if (n_product[i]) begin
+        n_zeros = 47 - i;
+      end
+    end
+    //stop at the smallest exponent, leaving a denormal
+    n_shift = $signed({5'd0, n_zeros}) < n_e ? $signed({5'd0, n_zeros}) : n_e - 1;
+    if (n_shift >= 0) begin
+      n_m = n_product << n_shift;
+      n_sticky = 0;
+    end else if (n_shift > -48) begin
+      n_m = n_product >> -n_shift;
+      n_sticky = (n_product & ~(48'hffffffffffff << -n_shift)) != 0;
+    end else begin
+      n_m = 0;
+      n_sticky = n_product != 0;
+    end
+  end
+
+  wire      [70:0] n_out, r_in;
+  wire      r_valid;
+  wire      [9:0] n_z_e;
+  assign n_z_e = n_e - n_shift;
+  assign n_out = {
+    n_special,
+    n_s,
+    n_z_e,
+    n_m[47:22],
+    n_m[21:0] != 0 || n_sticky};
+
+  fpu_pipeline_register #(.WIDTH(71), .REGISTERED(
+    (3 * STAGES) / 4 != (2 * STAGES) / 4)) normalise_register(
+    clk, rst, enable, n_valid, n_out, r_valid, r_in);
+
+  //round
+  wire      [32:0] r_special;
+  wire      r_s;
+  wire      [9:0] r_e;
+  wire      [26:0] r_m;
+  wire      [24:0] r_rounded;
+  wire      [23:0] r_z_m;
+  wire      [9:0] r_z_e;
+  reg       [31:0] r_z;
+  assign {r_special, r_s, r_e, r_m} = r_in;
+  assign r_rounded = r_m[26:3] + (r_m[2] && (r_m[1] || r_m[0] || r_m[3]));
+  assign r_z_m = r_rounded[24] ? r_rounded[24:1] : r_rounded[23:0];
+  assign r_z_e = r_rounded[24] ? r_e + 1 : r_e;
+
+  always @*
+  begin
+    if (r_special[32]) begin
+      r_z = r_special[31:0];
+    end else if (r_z_e >= 255) begin
+      r_z = {r_s, 8'd255, 23'd0};
+    end else if (r_z_m[23]) begin
+      r_z = {r_s, r_z_e[7:0], r_z_m[22:0]};
+    end else begin
+      r_z = {r_s, 8'd0, r_z_m[22:0]};
+    end
+  end
+
+  fpu_pipeline_register #(.WIDTH(32), .REGISTERED(1)) round_register(
+    clk, rst, enable, r_valid, r_z, output_z_stb, output_z);
+
+endmodule
+
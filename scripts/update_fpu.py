@@ -13,6 +13,12 @@ long_to_double = open(os.path.join("fpu", "long_to_double", "long_to_double.v"))
 double_to_long = open(os.path.join("fpu", "double_to_long", "double_to_long.v")).read()
 float_to_double = open(os.path.join("fpu", "float_to_double", "float_to_double.v")).read()
 double_to_float = open(os.path.join("fpu", "double_to_float", "double_to_float.v")).read()
+
+# the pipelined cores are not part of the fpu project, their sources are kept
+# in fpu_pipelined
+pipelined_adder = open(os.path.join("fpu_pipelined", "pipelined_adder", "pipelined_adder.v")).read()
+pipelined_multiplier = open(os.path.join("fpu_pipelined", "pipelined_multiplier", "pipelined_multiplier.v")).read()
+fpu_pipeline_register = open(os.path.join("fpu_pipelined", "fpu_pipeline_register", "fpu_pipeline_register.v")).read()
 output_file = open(os.path.join("chips", "compiler", "fpu.py"), "w")
 
 output_file.write("divider = \"\"\"%s\"\"\"\n"%divider)
@@ -27,3 +33,6 @@ output_file.write("long_to_double = \"\"\"%s\"\"\"\n"%long_to_double)
 output_file.write("double_to_long = \"\"\"%s\"\"\"\n"%double_to_long)
 output_file.write("float_to_double = \"\"\"%s\"\"\"\n"%float_to_double)
 output_file.write("double_to_float = \"\"\"%s\"\"\"\n"%double_to_float)
+output_file.write("pipelined_adder = \"\"\"%s\"\"\"\n"%pipelined_adder)
+output_file.write("pipelined_multiplier = \"\"\"%s\"\"\"\n"%pipelined_multiplier)
+output_file.write("fpu_pipeline_register = \"\"\"%s\"\"\"\n"%fpu_pipeline_register)
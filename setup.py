@@ -58,6 +58,7 @@ setup(name="Chips",
       },
       scripts=[
           "c2verilog",
-          "csim"
+          "csim",
+          "chips-explore"
       ]
 )
@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 
 from chips.api.api import *
+from chips.utils.explore import load_spec, explore, pareto_front, report
+from chips.utils.explore import included_files, point_key
+import os
 import sys
+import numpy
 
 
 my_chip = Chip("interconnect")
@@ -55,3 +59,575 @@ Component("test_suite/long_producer.c")(my_chip, inputs={}, outputs={"z":wire})
 Component("test_suite/long_consumer.c")(my_chip, inputs={"a":wire}, outputs={})
 my_chip.simulation_reset()
 my_chip.simulation_run()
+
+echo = """
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        fputc(fgetc(in), out);
+    }
+}
+"""
+
+data = numpy.arange(10, dtype=numpy.float32) / 4
+my_chip = Chip("stimulus")
+stimulus = Stimulus.from_array(my_chip, "in", "float", data, cycle=False)
+response = Response(my_chip, "out", "float")
+Component(echo, inline=True)(my_chip, inputs={"in":stimulus}, outputs={"out":response})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert list(response) == list(data)
+
+data = numpy.arange(-5, 5, dtype=numpy.int64) * 10000000000
+data.tofile("stimulus.bin")
+my_chip = Chip("stimulus")
+stimulus = Stimulus.from_file(my_chip, "in", "long", "stimulus.bin", cycle=False)
+response = Response(my_chip, "out", "long")
+Component(echo, inline=True)(my_chip, inputs={"in":stimulus}, outputs={"out":response})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert list(response) == [int(i) & 0xffffffffffffffff for i in data]
+
+data = numpy.arange(100, dtype=numpy.int32)
+received = []
+my_chip = Chip("response")
+stimulus = Stimulus.from_array(my_chip, "in", "int", data, cycle=False)
+wire_a, wire_b, wire_c = Wire(my_chip), Wire(my_chip), Wire(my_chip)
+everything = Response(my_chip, "out_a", "int")
+history = Response(my_chip, "out_b", "int", history=10)
+streamed = Response(my_chip, "out_c", "int", filename="response.bin")
+called = Response(my_chip, "out_d", "int", callback=received.append)
+fan_out = """
+int in = input("in");
+int a = output("a");
+int b = output("b");
+void main(){
+    int data;
+    while(1){
+        data = fgetc(in);
+        fputc(data, a);
+        fputc(data, b);
+    }
+}
+"""
+Component(fan_out, inline=True)(my_chip, inputs={"in":stimulus}, outputs={"a":wire_a, "b":wire_b})
+Component(fan_out, inline=True)(my_chip, inputs={"in":wire_a}, outputs={"a":everything, "b":history})
+Component(fan_out, inline=True)(my_chip, inputs={"in":wire_b}, outputs={"a":streamed, "b":called})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert list(everything) == range(100)
+assert all(numpy.diff(everything.times) > 0)
+assert list(history) == range(90, 100)
+assert len(history.times) == 10 and all(numpy.diff(history.times) > 0)
+assert history.count == 100
+assert list(streamed.values) == range(100)
+assert list(numpy.fromfile("response.bin", "<i4")) == range(100)
+assert received == range(100)
+assert len(called) == 0 and called.count == 100
+assert everything.values[5] == 5 and everything.times[0] < everything.times[5]
+assert streamed.file_.closed
+old_file = streamed.file_
+my_chip.simulation_reset()
+assert old_file.closed and not streamed.file_.closed
+my_chip.simulation_run()
+assert streamed.file_.closed
+
+def moving_sum(parameters):
+    window = numpy.zeros(parameters["taps"], dtype=numpy.int64)
+    while True:
+        window[1:] = window[:-1]
+        window[0] = yield ("read", "in", "int")
+        yield ("wait", 3)
+        yield ("write", "out", window.sum(), "long")
+
+data = numpy.arange(50, dtype=numpy.int32)
+my_chip = Chip("python_component")
+stimulus = Stimulus.from_array(my_chip, "in", "int", data, cycle=False)
+response = Response(my_chip, "out", "long")
+wire = Wire(my_chip)
+PythonComponent(moving_sum)(my_chip, inputs={"in":stimulus}, outputs={"out":wire}, parameters={"taps":4})
+Component("""
+#include <stdio.h>
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        fput_long(fget_long(in) * 2, out);
+    }
+}
+""", inline=True)(my_chip, inputs={"in":wire}, outputs={"out":response})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+expected = numpy.convolve(data, numpy.ones(4, dtype=numpy.int64))[:50] * 2
+assert list(response) == list(expected)
+try:
+    my_chip.generate_verilog()
+    assert False
+except C2CHIPError:
+    pass
+
+def echo_model(parameters):
+    while True:
+        data = yield ("read", "in", "int")
+        yield ("write", "out", data, "int")
+
+python_echo = PythonComponent(echo_model, V_file="""
+module {name} (clk,rst,exception,input_in,input_in_stb,input_in_ack,output_out,output_out_stb,output_out_ack);
+  input clk;
+  input rst;
+  output exception;
+  input [31:0] input_in;
+  input input_in_stb;
+  output input_in_ack;
+  output [31:0] output_out;
+  output output_out_stb;
+  input output_out_ack;
+  assign output_out = input_in;
+  assign output_out_stb = input_in_stb;
+  assign input_in_ack = output_out_ack;
+  assign exception = 0;
+endmodule
+""", inline=True)
+my_chip = Chip("python_echo")
+stimulus = Stimulus(my_chip, "in", "int", range(10), cycle=False)
+response = Response(my_chip, "out", "int")
+python_echo(my_chip, inputs={"in":stimulus}, outputs={"out":response})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert list(response) == range(10)
+my_chip.generate_verilog()
+
+data = numpy.linspace(-3, 3, 7)
+longs = [-5, 1 << 40, 7, -(1 << 50), 3, 0, 99]
+my_chip = Chip("wide")
+doubles_in = Stimulus.from_array(my_chip, "in", "double", data, cycle=False, width=64)
+longs_in = Stimulus(my_chip, "lin", "long", longs, cycle=False, width=64)
+doubles_out = Response(my_chip, "out", "double", width=64)
+longs_out = Response(my_chip, "lout", "long", width=64)
+wire = Wire(my_chip, width=64)
+Component("""
+#include <stdio.h>
+int in = input("in", 64);
+int out = output("out", 64);
+int lin = input("lin", 64);
+int lout = output("lout", 64);
+void main(){
+    while(1){
+        fput_double64(fget_double64(in) * 2.0, out);
+        fputc64(fgetc64(lin) + 1, lout);
+    }
+}
+""", inline=True)(my_chip, inputs={"in":doubles_in, "lin":longs_in}, outputs={"out":wire, "lout":longs_out})
+def double_echo_model(parameters):
+    while True:
+        data = yield ("read", "in", "double")
+        yield ("write", "out", data, "double")
+
+PythonComponent(double_echo_model)(my_chip, inputs={"in":wire}, outputs={"out":doubles_out})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert list(doubles_out) == list(data * 2)
+assert list(longs_out.values.view(numpy.int64)) == [i + 1 for i in longs]
+
+def bursty_chip(depth):
+    my_chip = Chip("fifo")
+    stimulus = Stimulus(my_chip, "in", "int", range(64), cycle=False)
+    response = Response(my_chip, "out", "int")
+    wire = Wire(my_chip, depth=depth)
+    Component("""
+    int in = input("in");
+    int out = output("out");
+    void main(){
+        int i;
+        while(1){
+            wait_clocks(1000);
+            for(i=0; i<8; i++) fputc(fgetc(in), out);
+        }
+    }
+    """, inline=True)(my_chip, inputs={"in":stimulus}, outputs={"out":wire})
+    Component("""
+    int in = input("in");
+    int out = output("out");
+    void main(){
+        while(1){
+            wait_clocks(200);
+            fputc(fgetc(in), out);
+        }
+    }
+    """, inline=True)(my_chip, inputs={"in":wire}, outputs={"out":response})
+    my_chip.simulation_reset()
+    my_chip.simulation_run()
+    assert list(response) == range(64)
+    return my_chip, wire
+
+unbuffered, wire = bursty_chip(0)
+buffered, wire = bursty_chip(8)
+assert buffered.time < unbuffered.time
+assert wire.high_water == 8
+buffered.report_fifos()
+buffered.generate_verilog()
+
+my_chip = Chip("statistics", statistics=True)
+stimulus = Stimulus(my_chip, "in", "int", range(16), cycle=False)
+response = Response(my_chip, "out", "int")
+wire = Wire(my_chip)
+producer = Component("""
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        fputc(fgetc(in), out);
+    }
+}
+""", inline=True)(my_chip, inputs={"in":stimulus}, outputs={"out":wire})
+consumer = Component("""
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        wait_clocks(10);
+        fputc(fgetc(in), out);
+    }
+}
+""", inline=True)(my_chip, inputs={"in":wire}, outputs={"out":response})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert list(response) == range(16)
+statistics = my_chip.get_statistics()
+for counts in statistics["ports"].values():
+    assert sum(counts.values()) == statistics["time"]
+wire_counts = statistics["ports"][wire.name]
+assert wire_counts["transfers"] == 16
+assert wire_counts["stb_no_ack"] > wire_counts["ack_no_stb"]
+producer_counts = statistics["instances"]["%s_%s" % (producer.component_name, id(producer))]
+consumer_counts = statistics["instances"]["%s_%s" % (consumer.component_name, id(consumer))]
+assert producer_counts["write"] > producer_counts["read"]
+assert consumer_counts["wait"] > consumer_counts["read"]
+my_chip.report_statistics()
+try:
+    unbuffered.get_statistics()
+    assert False
+except C2CHIPError:
+    pass
+
+my_chip = Chip("deadlock")
+wire_a = Wire(my_chip)
+wire_b = Wire(my_chip)
+loop = Component("""
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        fputc(fgetc(in), out);
+    }
+}
+""", inline=True)
+loop(my_chip, inputs={"in":wire_a}, outputs={"out":wire_b})
+loop(my_chip, inputs={"in":wire_b}, outputs={"out":wire_a})
+my_chip.simulation_reset()
+#stepping the simulation leaves the processes waiting
+while my_chip.time < 100:
+    my_chip.simulation_step()
+try:
+    my_chip.simulation_step(detect_deadlock=True)
+    assert False
+except Deadlock as deadlock:
+    assert deadlock.time == 100
+my_chip.simulation_reset()
+try:
+    my_chip.simulation_run()
+    assert False
+except Deadlock as deadlock:
+    print deadlock
+    assert len(deadlock.blocked) == 2
+    assert my_chip.time < 30
+    for instance, filename, lineno, wire in deadlock.blocked:
+        assert lineno == 5
+        assert wire.startswith("reading from wire_")
+
+my_chip = Chip("queues")
+samples = QueueInput(my_chip, "samples", "long")
+results = QueueOutput(my_chip, "results", "long", capacity=4)
+Component("""
+#include <stdio.h>
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        fput_long(fget_long(in) * 3, out);
+    }
+}
+""", inline=True)(my_chip, inputs={"in":samples}, outputs={"out":results})
+my_chip.simulation_reset()
+received = []
+batches = 0
+for batch in my_chip.simulation_batches(1000):
+    batches += 1
+    assert len(results) <= 4
+    while len(results):
+        received.append(results.get())
+    if batches <= 10:
+        samples.extend(range(-10 * batches, -10 * batches + 10))
+    else:
+        samples.close()
+assert received == [3 * i for j in range(1, 11) for i in range(-10 * j, -10 * j + 10)]
+assert batches > 10
+
+my_chip = Chip("reports")
+reporter = Component("""
+void main(){
+    int i;
+    for(i=0; i<3; i++){
+        report(i - 1);
+    }
+    report(0.5f);
+    report(-5l);
+}
+""", inline=True)(my_chip, inputs={}, outputs={})
+reports = ReportBuffer()
+my_chip.set_report_sink(reports)
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert reports.value == [-1, 0, 1, 0.5, -5]
+assert reports.type_ == ["int", "int", "int", "float", "long"]
+assert reports.line == [5, 5, 5, 7, 8]
+assert set(reports.instance) == set(["%s_%s" % (reporter.component_name, id(reporter))])
+assert reports.time == sorted(reports.time)
+assert len(list(reports)) == 5
+my_chip.set_report_sink(None)
+my_chip.simulation_reset()
+my_chip.simulation_run()
+assert len(reports) == 5
+
+def reversing_chip(block):
+    my_chip = Chip("blocks")
+    stimulus = Stimulus(my_chip, "in", "int", range(32), cycle=False)
+    response = Response(my_chip, "out", "int")
+    wire = Wire(my_chip)
+    if block:
+        read, write = "fread_block(in, data, 8);", "fwrite_block(out, data, 8);"
+    else:
+        read = "for(i=0; i<8; i++) data[i] = fgetc(in);"
+        write = "for(i=0; i<8; i++) fputc(data[i], out);"
+    Component("""
+    int in = input("in");
+    int out = output("out");
+    void main(){
+        int data[8];
+        int i, x;
+        while(1){
+            %s
+            for(i=0; i<4; i++){
+                x = data[i]; data[i] = data[7 - i]; data[7 - i] = x;
+            }
+            %s
+        }
+    }
+    """ % (read, write), inline=True, options=["cycle_accurate"])(
+        my_chip, inputs={"in":stimulus}, outputs={"out":wire})
+    Component("""
+    int in = input("in");
+    int out = output("out");
+    void main(){
+        int data[4];
+        while(1){
+            fread_block(in, data, 4);
+            fwrite_block(out, data, 4);
+        }
+    }
+    """, inline=True, options=["speed", "cycle_accurate"])(
+        my_chip, inputs={"in":wire}, outputs={"out":response})
+    my_chip.simulation_reset()
+    my_chip.simulation_run()
+    assert list(response) == [i ^ 7 for i in range(32)]
+    return my_chip
+
+my_chip = reversing_chip(False)
+time = my_chip.time
+my_chip = reversing_chip(True)
+assert my_chip.time < time
+my_chip.generate_verilog()
+my_chip.generate_testbench()
+my_chip.compile_iverilog()
+
+my_chip = Chip("mixed")
+wire = Wire(my_chip)
+Component("test_suite/producer.c", options=["speed"])(my_chip, inputs={}, outputs={"z":wire})
+Component("test_suite/consumer.c")(my_chip, inputs={"a":wire}, outputs={})
+my_chip.simulation_reset()
+my_chip.simulation_run()
+my_chip.generate_verilog()
+my_chip.generate_testbench()
+my_chip.compile_iverilog()
+
+def timed_chip(options, clocks):
+    my_chip = Chip("timed")
+    Component("""
+    int fib(int x){
+        if(x < 2) return x;
+        return fib(x - 1) + fib(x - 2);
+    }
+    void main(){
+        unsigned t0, t1;
+        t0 = timer_low();
+        assert(fib(8) == 21);
+        t1 = timer_low();
+        assert(t1 - t0 == %u);
+    }
+    """ % clocks, inline=True, options=options + ["cycle_accurate"])(
+        my_chip, inputs={}, outputs={})
+    my_chip.simulation_reset()
+    my_chip.simulation_run()
+    return my_chip.time
+
+assert timed_chip(["speed"], 2277) < timed_chip([], 3885)
+
+def pooled_chip(shared_fpu):
+    my_chip = Chip("pooled", shared_fpu=shared_fpu)
+    response = Response(my_chip, "results", "float")
+    divider = Component("""
+    int out = output("out");
+    void main(){
+        float x = 1.0f;
+        int i;
+        for(i=0; i<8; i++){
+            x = x / 2.0f;
+        }
+        fputc(float_to_bits(x), out);
+    }
+    """, inline=True, options=["cycle_accurate"])
+    wires = [Wire(my_chip) for i in range(3)]
+    for wire in wires[:2]:
+        divider(my_chip, inputs={}, outputs={"out":wire})
+    Component("""
+    int out = output("out");
+    void main(){
+        float x = 3.0f;
+        fputc(float_to_bits(x * 0.5f), out);
+    }
+    """, inline=True, options=["speed", "cycle_accurate"])(my_chip, inputs={}, outputs={"out":wires[2]})
+    Component("""
+    int a = input("a");
+    int b = input("b");
+    int c = input("c");
+    int out = output("out");
+    void main(){
+        fputc(fgetc(a), out);
+        fputc(fgetc(b), out);
+        fputc(fgetc(c), out);
+    }
+    """, inline=True)(my_chip, inputs={"a":wires[0], "b":wires[1], "c":wires[2]}, outputs={"out":response})
+    my_chip.simulation_reset()
+    my_chip.simulation_run()
+    assert list(response) == [1.0 / 256, 1.0 / 256, 1.5]
+    return my_chip
+
+my_chip = pooled_chip(False)
+time = my_chip.time
+my_chip = pooled_chip(True)
+assert my_chip.time > time
+pool = my_chip.get_pool_statistics()
+assert pool["divider"]["operations"] == 16
+assert pool["divider"]["waiting"] > 0
+assert pool["multiplier"]["operations"] == 1
+assert 0 < pool["divider"]["utilisation"] <= 1
+my_chip.report_pool_statistics()
+my_chip.generate_verilog()
+verilog = open("pooled.v").read()
+assert verilog.count("divider divider_pool_inst") == 1
+assert "multiplier multiplier_pool_inst" in verilog
+my_chip.generate_testbench()
+my_chip.compile_iverilog()
+
+open("scale.c", "w").write("""
+int in = input("in");
+int out = output("out");
+void main(){
+    int x, y, i;
+    while(1){
+        x = fgetc(in);
+        y = 0;
+        for(i=0; i<UNROLL; i++){
+            y += x / 3;
+        }
+        fputc(y + x * 5, out);
+    }
+}
+""")
+open("scale.json", "w").write("""{
+    "component": "scale.c",
+    "stimulus": {"in": {"type": "int", "values": [1, 2, 3, 4, 5, 6, 7, 8]}},
+    "response": {"out": {"type": "int", "items": 8}},
+    "grid": {
+        "backend": ["area", "speed"],
+        "divider": ["radix2", "radix16"],
+        "parameters": {"UNROLL": [1]}
+    }
+}""")
+spec = load_spec("scale.json")
+if os.path.exists("scale.cache.json"):
+    os.remove("scale.cache.json")
+results, evaluated = explore(spec, jobs=1, cache="scale.cache.json")
+assert evaluated == 4
+assert all(i["error"] is None for i in results)
+cycles = dict(((i["point"]["backend"], i["point"]["divider"]), i["cycles"]) for i in results)
+assert cycles["area", "radix16"] < cycles["area", "radix2"]
+assert cycles["speed", "radix2"] < cycles["area", "radix2"]
+assert pareto_front(results)
+report(results, show_all=True)
+results, evaluated = explore(spec, cache="scale.cache.json")
+assert evaluated == 0
+assert len(results) == 4
+os.remove("scale.cache.json")
+
+open("failing.c", "w").write("""
+int in = input("in");
+int out = output("out");
+void main(){
+    assert(K != 2);
+    while(1){
+        fputc(fgetc(in) * K, out);
+    }
+}
+""")
+open("failing.json", "w").write("""{
+    "component": "failing.c",
+    "stimulus": {"in": {"type": "int", "values": [1, 2, 3]}},
+    "response": {"out": {"type": "int", "items": 3}},
+    "grid": {"parameters": {"K": [1, 2, 3]}}
+}""")
+spec = load_spec("failing.json")
+if os.path.exists("failing.cache.json"):
+    os.remove("failing.cache.json")
+for jobs in [1, 2]:
+    results, evaluated = explore(spec, jobs=jobs, cache="failing.cache.json")
+    errors = dict((i["point"]["parameters"]["K"], i["error"]) for i in results)
+    assert errors[1] is None and errors[3] is None
+    assert errors[2].startswith("Assertion failed")
+    assert os.path.exists("failing.cache.json")
+    os.remove("failing.cache.json")
+
+open("gain.h", "w").write("#define GAIN 5\n")
+open("gain.c", "w").write("""
+#include <stdio.h>
+#include "gain.h"
+int in = input("in");
+int out = output("out");
+void main(){
+    while(1){
+        fputc(fgetc(in) * GAIN, out);
+    }
+}
+""")
+open("gain.json", "w").write("""{
+    "component": "gain.c",
+    "stimulus": {"in": {"type": "int", "values": [1, 2, 3]}},
+    "response": {"out": {"type": "int", "items": 3}}
+}""")
+spec = load_spec("gain.json")
+files = [os.path.basename(i) for i in included_files("gain.c")]
+assert files[0] == "gain.c" and "gain.h" in files and "stdio.h" in files
+key = point_key(spec, {"parameters": {}})
+open("gain.h", "w").write("#define GAIN 6\n")
+assert point_key(spec, {"parameters": {}}) != key